@@ -0,0 +1,90 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(BASE_DIR, 'src'))
+
+# Domyślny katalog roboczy benchmarków (baza SQLite, magazyn paczek)
+BENCH_DIR = os.path.join(BASE_DIR, 'data', 'bench')
+
+
+# Lokalna baza benchmarków - jedyna, którą seed czyści domyślnie
+BENCH_DATABASE_URL = f"sqlite:///{os.path.join(BENCH_DIR, 'bench.db')}"
+
+
+# Konfiguracja środowiska przed importem aplikacji (create_app i utils czytają zmienne przy imporcie).
+# DATABASE_URL z otoczenia (.env, powłoka) jest ignorowany - inną bazę wskazuje się tylko jawnie
+# przez --database-url. Paczki i limity zawsze lokalne (katalog benchmarków, memory://).
+def configure_environment(database_url=None):
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    os.environ['DATABASE_URL'] = database_url or BENCH_DATABASE_URL
+    os.environ['BLOB_STORE_URI'] = os.path.join(BENCH_DIR, 'blobs')
+    os.environ['UPLOAD_STAGING_PATH'] = os.path.join(BENCH_DIR, 'uploads')
+    os.environ['RATELIMIT_STORAGE_URI'] = 'memory://'
+    os.environ.pop('METRICS_DIR', None)
+
+    # Prawdziwa ścieżka szyfrowania sekretów TOTP (bez klucza utils zwraca tekst jawny)
+    if not os.environ.get('TOTP_ENCRYPTION_KEY'):
+        from cryptography.fernet import Fernet
+        os.environ['TOTP_ENCRYPTION_KEY'] = Fernet.generate_key().decode()
+
+def is_bench_database():
+    return os.environ.get('DATABASE_URL') == BENCH_DATABASE_URL
+
+
+# --- STATYSTYKI ---
+
+# Percentyl metodą najbliższej rangi (próbki posortowane rosnąco)
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = max(0, min(len(sorted_samples) - 1, int(round(fraction * len(sorted_samples) + 0.5)) - 1))
+    return sorted_samples[index]
+
+# Podsumowanie czasów pojedynczych operacji (s) i czasu całego przebiegu
+def summarize(samples, elapsed, errors=0):
+    ordered = sorted(samples)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p90_ms": round(percentile(ordered, 0.90) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+# --- WYNIKI ---
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+# Metadane przebiegu - pozwalają porównywać wyniki tylko między zgodnymi konfiguracjami
+def run_metadata(**extra):
+    meta = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    meta.update(extra)
+    return meta
+
+def write_results(results, path=None):
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if path:
+        with open(path, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
@@ -0,0 +1,142 @@
+import argparse
+import json
+from benchmarks import configure_environment, run_metadata, write_results
+
+
+# --- POLECENIA ---
+
+def cmd_seed(args):
+    from benchmarks.seed import seed, parse_payload_sizes
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        _, seeded = seed(args.users, args.messages, parse_payload_sizes(args.payload_sizes), args.seed, reset=args.reset)
+    app.extensions['hashing_pool'].shutdown()
+    print(f"Utworzono {seeded['users']} użytkowników i {seeded['messages']} wiadomości "
+          f"({seeded['payload_bytes']} B szyfrogramów).")
+
+def cmd_micro(args):
+    from benchmarks.micro import run_micro
+
+    results = run_micro(repeat=args.repeat, argon2=not args.skip_argon2)
+    write_results({"meta": run_metadata(suite="micro"), "results": results}, args.output)
+
+def cmd_load(args):
+    from benchmarks.load import run_load
+    from benchmarks.seed import parse_payload_sizes
+
+    meta, results = run_load(
+        users=args.users,
+        messages=args.messages,
+        payload_sizes=parse_payload_sizes(args.payload_sizes),
+        requests=args.requests,
+        login_requests=args.login_requests,
+        concurrency=args.concurrency,
+        operations=args.operations.split(','),
+        rng_seed=args.seed,
+        reset=args.reset,
+    )
+    write_results({"meta": run_metadata(suite="load", **meta), "results": results}, args.output)
+
+def cmd_ratelimit(args):
+    from benchmarks.ratelimit import run_ratelimit
+
+    meta, results = run_ratelimit(
+        requests=args.requests,
+        workers=args.workers,
+        threads=args.threads,
+        clients=args.clients,
+        latency=args.latency_ms / 1000,
+        overshoot=args.overshoot,
+        duration=args.duration,
+    )
+    write_results({"meta": run_metadata(suite="ratelimit", **meta), "results": results}, args.output)
+
+def cmd_startup(args):
+    from benchmarks.startup import run_startup
+
+    meta, results = run_startup(workers=args.workers, schema=not args.skip_schema)
+    write_results({"meta": run_metadata(suite="startup", **meta), "results": results}, args.output)
+
+# Porównanie dwóch plików wyników: zmiana względna każdej metryki (nowy / bazowy)
+def cmd_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.candidate) as f:
+        candidate = json.load(f)["results"]
+
+    for name in sorted(set(baseline) & set(candidate)):
+        parts = []
+        for metric, old in baseline[name].items():
+            new = candidate[name].get(metric)
+            if not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or not old:
+                continue
+            parts.append(f"{metric} {old} -> {new} ({(new / old - 1) * 100:+.1f}%)")
+        print(f"{name}: " + "; ".join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Benchmarki aplikacji ODAS")
+    parser.add_argument('--database-url', help="Baza docelowa (domyślnie lokalny SQLite w data/bench; "
+                        "DATABASE_URL z otoczenia jest ignorowany)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_seed_options(sub):
+        sub.add_argument('--users', type=int, default=50)
+        sub.add_argument('--messages', type=int, default=2000)
+        sub.add_argument('--payload-sizes', help="Rozkład rozmiarów szyfrogramu, np. 256:0.6,4096:0.3,65536:0.1")
+        sub.add_argument('--seed', type=int, default=1234, help="Ziarno generatora (powtarzalne dane)")
+        sub.add_argument('--reset', action=argparse.BooleanOptionalAction, default=None,
+                         help="Usuń istniejące tabele (domyślnie tylko w lokalnej bazie benchmarków)")
+
+    seed_parser = commands.add_parser('seed', help="Syntetyczni użytkownicy i wiadomości")
+    add_seed_options(seed_parser)
+    seed_parser.set_defaults(func=cmd_seed)
+
+    micro_parser = commands.add_parser('micro', help="Mikrobenchmarki Base64, Fernet i Argon2")
+    micro_parser.add_argument('--repeat', type=int, default=5)
+    micro_parser.add_argument('--skip-argon2', action='store_true')
+    micro_parser.add_argument('--output', help="Plik JSON z wynikami (domyślnie stdout)")
+    micro_parser.set_defaults(func=cmd_micro)
+
+    load_parser = commands.add_parser('load', help="Obciążenie w procesie: login, send, inbox, outbox")
+    add_seed_options(load_parser)
+    load_parser.add_argument('--requests', type=int, default=200, help="Żądań na scenariusz")
+    load_parser.add_argument('--login-requests', type=int, default=40, help="Logowań (Argon2 jest kosztowny)")
+    load_parser.add_argument('--concurrency', type=int, default=4)
+    load_parser.add_argument('--operations', default='login,send,inbox,outbox')
+    load_parser.add_argument('--output', help="Plik JSON z wynikami (domyślnie stdout)")
+    load_parser.set_defaults(func=cmd_load)
+
+    ratelimit_parser = commands.add_parser('ratelimit', help="Magazyn limitów: tryb dokładny i hybrydowy na atrapie Redis")
+    ratelimit_parser.add_argument('--requests', type=int, default=20000)
+    ratelimit_parser.add_argument('--workers', type=int, default=4, help="Procesy (osobne magazyny, wspólny Redis)")
+    ratelimit_parser.add_argument('--threads', type=int, default=2, help="Wątków na proces")
+    ratelimit_parser.add_argument('--clients', type=int, default=50,
+                                  help="Minimalna liczba adresów klientów (zwiększana, by klient nie przekroczył limitu)")
+    ratelimit_parser.add_argument('--latency-ms', type=float, default=0.5, help="Opóźnienie round trip do Redis")
+    ratelimit_parser.add_argument('--overshoot', type=float, default=0.02)
+    ratelimit_parser.add_argument('--duration', type=float, default=5.0, help="Czas przebiegu ruchu steady (s)")
+    ratelimit_parser.add_argument('--output', help="Plik JSON z wynikami (domyślnie stdout)")
+    ratelimit_parser.set_defaults(func=cmd_ratelimit)
+
+    startup_parser = commands.add_parser('startup', help="Zimny start i pamięć workerów: lazy-apps i preload")
+    startup_parser.add_argument('--workers', type=int, default=4)
+    startup_parser.add_argument('--skip-schema', action='store_true', help="Bez pomiaru inicjalizacji schematu")
+    startup_parser.add_argument('--output', help="Plik JSON z wynikami (domyślnie stdout)")
+    startup_parser.set_defaults(func=cmd_startup)
+
+    compare_parser = commands.add_parser('compare', help="Porównanie dwóch plików wyników")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    # Zmienne środowiskowe muszą być ustawione przed importem aplikacji
+    configure_environment(args.database_url)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import base64
+import random
+import threading
+import time
+from collections import Counter
+import pyotp
+from app import create_app, limiter
+from app.models import db
+from benchmarks import summarize
+from benchmarks.seed import seed, DEFAULT_PAYLOAD_SIZES
+
+# Kolejność scenariuszy w raporcie
+OPERATIONS = ('login', 'send', 'inbox', 'outbox')
+
+# Minimalny zapas (s) do końca okna TOTP przy rozpoczęciu logowania
+LOGIN_TOTP_MARGIN = 8
+
+
+# Pełne logowanie dwuetapowe (hasło + TOTP) przez API; zwraca (kod błędu lub None, czas w s)
+def _login(client, credentials):
+    # Kod TOTP wygenerowany tuż przed końcem 30-sekundowego okna mógłby wygasnąć w trakcie
+    # weryfikacji Argon2 - oczekiwanie na nowe okno odbywa się poza pomiarem
+    remaining = 30 - time.time() % 30
+    if remaining < LOGIN_TOTP_MARGIN:
+        time.sleep(remaining)
+
+    start = time.perf_counter()
+    first = client.post('/api/login-verify', json={
+        "username": credentials["username"],
+        "password_hash": credentials["password_token"],
+    })
+    if first.status_code != 200:
+        return first.status_code, time.perf_counter() - start
+    second = client.post('/api/login-verify', json={
+        "username": credentials["username"],
+        "password_hash": credentials["password_token"],
+        "totp_code": pyotp.TOTP(credentials["totp_secret"]).now(),
+    })
+    return (None if second.status_code == 200 else second.status_code), time.perf_counter() - start
+
+
+# Sterownik obciążenia w procesie: wątki z własnymi klientami testowymi Flask wykonują
+# żądania przez pełny stos aplikacji (routing, sesje, ORM, magazyn paczek, pula Argon2)
+class LoadDriver:
+
+    def __init__(self, app, credentials, payload_sizes, concurrency=4, rng_seed=1234):
+        self.app = app
+        self.credentials = credentials
+        self.sizes, self.weights = zip(*payload_sizes.items())
+        self.concurrency = concurrency
+        self.rng_seed = rng_seed
+
+    def _worker(self, operation, count, worker_index, samples, errors, ready):
+        rng = random.Random(self.rng_seed + worker_index)
+        client = self.app.test_client()
+
+        # Scenariusze inne niż login działają na zalogowanej sesji - logowanie przed startem pomiaru
+        setup_error = None
+        if operation != 'login':
+            me = self.credentials[worker_index % len(self.credentials)]
+            setup_error, _ = _login(client, me)
+        ready.wait()
+        if setup_error:
+            errors.extend([f"login_{setup_error}"] * count)
+            return
+
+        for _ in range(count):
+            if operation == 'login':
+                error, elapsed = _login(self.app.test_client(), rng.choice(self.credentials))
+            else:
+                start = time.perf_counter()
+                error = self._request(client, operation, rng)
+                elapsed = time.perf_counter() - start
+            samples.append(elapsed)
+            if error:
+                errors.append(str(error))
+
+    # Zwraca kod odpowiedzi, jeśli żądanie się nie powiodło, w przeciwnym razie None
+    def _request(self, client, operation, rng):
+        if operation == 'send':
+            receiver = rng.choice(self.credentials)
+            payload = rng.randbytes(rng.choices(self.sizes, self.weights)[0])
+            response = client.post('/api/messages/send', json={
+                "receiver_id": receiver["id"],
+                "encrypted_payload": base64.b64encode(payload).decode(),
+                "iv": base64.b64encode(rng.randbytes(12)).decode(),
+                "signature": base64.b64encode(rng.randbytes(64)).decode(),
+            })
+            return None if response.status_code == 201 else response.status_code
+        response = client.get(f'/api/messages/{operation}')
+        response.get_data()
+        return None if response.status_code == 200 else response.status_code
+
+    # Wykonuje `requests` żądań danego scenariusza rozłożonych na wątki
+    def run(self, operation, requests):
+        samples = []
+        errors = []
+        per_worker = [requests // self.concurrency + (1 if i < requests % self.concurrency else 0)
+                      for i in range(self.concurrency)]
+        counts = [count for count in per_worker if count]
+        ready = threading.Barrier(len(counts) + 1)
+        threads = [
+            threading.Thread(target=self._worker, args=(operation, count, i, samples, errors, ready))
+            for i, count in enumerate(counts)
+        ]
+        for thread in threads:
+            thread.start()
+        ready.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        summary = summarize(samples, time.perf_counter() - start, errors=len(errors))
+        if errors:
+            summary["error_codes"] = dict(Counter(errors))
+        return summary
+
+
+# Przygotowanie aplikacji i danych, następnie pomiar kolejnych scenariuszy
+def run_load(users=50, messages=2000, payload_sizes=None, requests=200, login_requests=40,
+             concurrency=4, operations=OPERATIONS, rng_seed=1234, reset=None):
+    payload_sizes = payload_sizes or dict(DEFAULT_PAYLOAD_SIZES)
+    app = create_app()
+    # Limity żądań mierzyłyby limiter, a nie aplikację
+    limiter.enabled = False
+
+    with app.app_context():
+        seed_start = time.perf_counter()
+        credentials, seeded = seed(users, messages, payload_sizes, rng_seed, reset=reset)
+        seeded["seconds"] = round(time.perf_counter() - seed_start, 2)
+        dialect = db.engine.dialect.name
+
+    driver = LoadDriver(app, credentials, payload_sizes, concurrency, rng_seed)
+    results = {}
+    for operation in operations:
+        results[operation] = driver.run(operation, login_requests if operation == 'login' else requests)
+
+    app.extensions['hashing_pool'].shutdown()
+    return {"database": dialect, "concurrency": concurrency, "seed": seeded}, results
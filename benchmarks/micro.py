@@ -0,0 +1,54 @@
+import base64
+import os
+import statistics
+import timeit
+from app import utils
+from app.hashing import HashingPool, _hash, _verify
+
+
+# Czas jednej operacji (µs): najlepszy i mediana z kilku serii po `number` wywołań.
+# Bez podanego `number` liczba wywołań dobierana jest tak, by seria trwała ~0.2 s.
+def _measure(func, repeat=5, number=None):
+    timer = timeit.Timer(func)
+    if number is None:
+        number, _ = timer.autorange()
+    runs = [elapsed / number for elapsed in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "iterations": number * repeat,
+        "best_us": round(min(runs) * 1e6, 3),
+        "median_us": round(statistics.median(runs) * 1e6, 3),
+    }
+
+
+def run_micro(repeat=5, argon2=True):
+    small = base64.b64encode(os.urandom(32)).decode()
+    large = base64.b64encode(os.urandom(750000)).decode()
+    invalid = small[:-2] + '*='
+    plain_secret = 'JBSWY3DPEHPK3PXP' * 2
+    encrypted_secret = utils.encrypt_secret(plain_secret)
+
+    cases = {
+        "validate_base64_key_32B": lambda: utils.validate_base64(small),
+        "validate_base64_payload_750KB": lambda: utils.validate_base64(large, (1, 1000000)),
+        "validate_base64_invalid": lambda: utils.validate_base64(invalid),
+        "encrypt_secret": lambda: utils.encrypt_secret(plain_secret),
+        "decrypt_secret": lambda: utils.decrypt_secret(encrypted_secret),
+    }
+
+    results = {name: _measure(func, repeat) for name, func in cases.items()}
+
+    if argon2:
+        password_hash = _hash(small)
+        results["argon2_hash_inline"] = _measure(lambda: _hash(small), repeat, number=2)
+        results["argon2_verify_inline"] = _measure(lambda: _verify(password_hash, small), repeat, number=2)
+
+        # Ścieżka produkcyjna: pula procesów z kontrolą kolejki (narzut IPC i serializacji)
+        pool = HashingPool(workers=2, max_queue=16, timeout=30)
+        try:
+            pool.verify(password_hash, small)
+            results["argon2_verify_pool"] = _measure(lambda: pool.verify(password_hash, small), repeat, number=2)
+            results["argon2_verify_dummy_pool"] = _measure(lambda: pool.verify_dummy(small), repeat, number=2)
+        finally:
+            pool.shutdown()
+
+    return results
@@ -0,0 +1,254 @@
+import math
+import threading
+import time
+from fnmatch import fnmatchcase
+from limits import parse
+from limits.strategies import FixedWindowRateLimiter
+from app.ratelimit import HybridRedisStorage
+from benchmarks import summarize
+
+# Limity sprawdzane przy jednym żądaniu w aplikacji. Limit endpointu (limiter.limit) zastępuje
+# domyślne, więc żądanie sprawdza albo komplet domyślnych, albo jeden limit endpointu.
+REQUEST_LIMITS = {
+    "default": ("2000 per day", "1000 per hour"),
+    "per_minute_600": ("600 per minute",),
+    "per_minute_120": ("120 per minute",),
+    "per_minute_30": ("30 per minute",),
+    "per_minute_5": ("5 per minute",),
+}
+
+# Klient wykorzystuje najwyżej taką część limitu - ruch poniżej limitów, a nie odrzucenia,
+# które po przekroczeniu limitu zapadają lokalnie i zawyżałyby zysk
+CLIENT_LIMIT_SHARE = 0.9
+
+# Ruch: burst - wszystkie żądania klienta jak najszybciej (ładowanie strony, skrypty),
+# steady - żądania klienta rozłożone równomiernie w czasie przebiegu z tempem
+# CLIENT_LIMIT_SHARE najniższego limitu (na sekundę)
+TRAFFIC = ("burst", "steady")
+
+
+# Redis w procesie z opóźnieniem sieci: każde polecenie lub potok kosztuje jeden round trip
+class FakeRedis:
+
+    def __init__(self, latency=0.0005):
+        self.latency = latency
+        self.data = {}
+        self.round_trips = 0
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _alive(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry
+
+    def _incrby(self, key, amount):
+        entry = self._alive(key)
+        if entry is None:
+            entry = self.data[key] = [0, None]
+        entry[0] += amount
+        return entry[0]
+
+    def _pttl(self, key):
+        entry = self._alive(key)
+        if entry is None:
+            return -2
+        return -1 if entry[1] is None else int((entry[1] - time.time()) * 1000)
+
+    # Odpowiednik INCR_EXPIRE_SCRIPT
+    def _incr_expire(self, key, amount, expiry):
+        count = self._incrby(key, amount)
+        ttl = self._pttl(key)
+        if count == amount or ttl < 0:
+            self.data[key][1] = time.time() + expiry
+            ttl = expiry * 1000
+        return [count, ttl]
+
+    def _get(self, key):
+        entry = self._alive(key)
+        return None if entry is None else str(entry[0]).encode()
+
+    def _delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    def _call(self, name, *args, **kwargs):
+        with self._lock:
+            return getattr(self, name)(*args, **kwargs)
+
+    def pttl(self, key):
+        self._round_trip()
+        return self._call('_pttl', key)
+
+    def get(self, key):
+        self._round_trip()
+        return self._call('_get', key)
+
+    def delete(self, *keys):
+        self._round_trip()
+        return self._call('_delete', *keys)
+
+    def ping(self):
+        self._round_trip()
+        return True
+
+    def scan_iter(self, match='*', count=None):
+        self._round_trip()
+        with self._lock:
+            return [key for key in list(self.data) if fnmatchcase(key, match)]
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def register_script(self, script):
+        return FakeScript(self)
+
+
+# Skrypt Lua magazynu - rozpoznawany jest tylko INCR_EXPIRE_SCRIPT
+class FakeScript:
+
+    def __init__(self, server):
+        self.server = server
+
+    def __call__(self, keys=(), args=(), client=None):
+        if isinstance(client, FakePipeline):
+            client.commands.append(('_incr_expire', (keys[0], *args), {}))
+            return client
+        self.server._round_trip()
+        return self.server._call('_incr_expire', keys[0], *args)
+
+
+class FakePipeline:
+
+    def __init__(self, server):
+        self.server = server
+        self.commands = []
+
+    def execute(self):
+        self.server._round_trip()
+        with self.server._lock:
+            return [getattr(self.server, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+# --- SCENARIUSZE ---
+
+# `workers` procesów uWSGI (osobne magazyny, wspólny Redis) po `threads` wątków; każde żądanie
+# sprawdza komplet `limits` dla jednego z `clients` adresów. Z `duration` kolejne żądania
+# wątku są rozłożone równo na `duration` sekund zamiast wysyłane bez przerw.
+def _throughput(limits, overshoot, requests, workers, threads, clients, latency, duration=None):
+    server = FakeRedis(latency)
+    storages = [HybridRedisStorage('hybrid+redis://bench', overshoot=overshoot, client=server) for _ in range(workers)]
+    limiters = [FixedWindowRateLimiter(storage) for storage in storages]
+    items = [parse(limit) for limit in limits]
+
+    per_thread = max(1, requests // (workers * threads))
+    interval = duration / per_thread if duration else 0.0
+    samples = []
+    rejected = [0]
+    lock = threading.Lock()
+    barrier = threading.Barrier(workers * threads + 1)
+
+    def run(worker, thread):
+        limiter = limiters[worker]
+        local, denied = [], 0
+        barrier.wait()
+        begin = time.perf_counter()
+        for i in range(per_thread):
+            if interval:
+                delay = begin + i * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            # Kolejne żądania klienta trafiają do kolejnych workerów, jak za balanserem
+            client = f"10.0.0.{(i * workers * threads + worker * threads + thread) % clients}"
+            start = time.perf_counter()
+            allowed = all(limiter.hit(item, 'bench', client, 'endpoint') for item in items)
+            local.append(time.perf_counter() - start)
+            denied += not allowed
+        with lock:
+            samples.extend(local)
+            rejected[0] += denied
+
+    pool = [threading.Thread(target=run, args=(w, t)) for w in range(workers) for t in range(threads)]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    result = summarize(samples, elapsed)
+    result["clients"] = clients
+    result["rejected"] = rejected[0]
+    result["redis_round_trips"] = server.round_trips
+    result["round_trips_per_request"] = round(server.round_trips / max(1, len(samples)), 4)
+    return result
+
+# Dokładność: wszyscy workerzy bombardują jeden klucz z limitem `limit`; ile żądań przeszło
+def _accuracy(overshoot, limit, attempts, workers, latency):
+    server = FakeRedis(latency)
+    storages = [HybridRedisStorage('hybrid+redis://bench', overshoot=overshoot, client=server) for _ in range(workers)]
+    item = parse(limit)
+    admitted = [0]
+    lock = threading.Lock()
+
+    def run(storage):
+        limiter = FixedWindowRateLimiter(storage)
+        passed = sum(limiter.hit(item, 'bench', 'shared') for _ in range(attempts // workers))
+        with lock:
+            admitted[0] += passed
+
+    pool = [threading.Thread(target=run, args=(storage,)) for storage in storages]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    return {
+        "limit": item.amount,
+        "attempts": attempts,
+        "admitted": admitted[0],
+        "overshoot": admitted[0] - item.amount,
+        "redis_round_trips": server.round_trips,
+    }
+
+
+# Liczba klientów, przy której żaden nie przekracza CLIENT_LIMIT_SHARE limitów
+def _client_count(limits, requests, clients, duration=None):
+    needed = 1
+    for limit in limits:
+        item = parse(limit)
+        allowed = item.amount * CLIENT_LIMIT_SHARE
+        if duration:
+            # Tempo stałe: udział limitu na sekundę razy czas przebiegu
+            allowed = allowed / item.get_expiry() * duration
+        needed = max(needed, math.ceil(requests / allowed))
+    return max(clients, needed)
+
+# Porównanie trybu dokładnego (overshoot=0: round trip na każde trafienie, jak RedisStorage)
+# z hybrydowym przy zadanym opóźnieniu Redis, osobno dla każdego zestawu limitów aplikacji
+# i obu modeli ruchu. Przy ruchu steady klient wraca do workera rzadziej niż co sync_interval,
+# więc decyzje lokalne zdarzają się tylko dzięki zbiorczej synchronizacji innych kluczy.
+def run_ratelimit(requests=20000, workers=4, threads=2, clients=50, latency=0.0005, overshoot=0.02, duration=5.0):
+    results = {}
+    scenario_clients = {}
+    for scenario, limits in REQUEST_LIMITS.items():
+        for traffic in TRAFFIC:
+            run_duration = duration if traffic == "steady" else None
+            count = scenario_clients[f"{scenario}_{traffic}"] = _client_count(limits, requests, clients, run_duration)
+            for mode, value in (("exact", 0.0), ("hybrid", overshoot)):
+                results[f"{scenario}_{traffic}_{mode}"] = _throughput(
+                    limits, value, requests, workers, threads, count, latency, run_duration
+                )
+    for mode, value in (("exact", 0.0), ("hybrid", overshoot)):
+        results[f"{mode}_accuracy"] = _accuracy(value, "1000 per hour", 3000, workers, latency)
+    meta = {"requests": requests, "workers": workers, "threads": threads, "clients": scenario_clients,
+            "latency_ms": latency * 1000, "overshoot": overshoot, "duration_seconds": duration,
+            "limits": {scenario: list(limits) for scenario, limits in REQUEST_LIMITS.items()}}
+    return meta, results
@@ -0,0 +1,121 @@
+import base64
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+from argon2 import PasswordHasher
+import pyotp
+from sqlalchemy import insert, select
+from app.models import db, User, Message, UnreadCounter
+from app.blobstore import get_blob_store
+from app.mailbox import record_changes
+from app import utils
+from benchmarks import is_bench_database
+
+# Domyślny rozkład rozmiarów szyfrogramu (bajty: waga) - głównie krótkie wiadomości
+DEFAULT_PAYLOAD_SIZES = {256: 0.55, 2048: 0.30, 32768: 0.12, 500000: 0.03}
+
+# Wspólny token hasła wszystkich kont syntetycznych - jeden hash Argon2 zamiast N
+BENCH_PASSWORD_TOKEN = base64.b64encode(b'benchmark-password-token-000000').decode()
+
+# Liczba wierszy wstawianych jednym INSERT
+INSERT_BATCH_SIZE = 1000
+
+
+# Parsuje rozkład w postaci "256:0.6,4096:0.3,65536:0.1"
+def parse_payload_sizes(spec):
+    if not spec:
+        return dict(DEFAULT_PAYLOAD_SIZES)
+    sizes = {}
+    for part in spec.split(','):
+        size, weight = part.split(':')
+        sizes[int(size)] = float(weight)
+    return sizes
+
+def _b64(rng, size):
+    return base64.b64encode(rng.randbytes(size)).decode()
+
+
+# Tworzy użytkowników i wiadomości przez modele aplikacji. Zwraca listę danych logowania
+# (username, token hasła, sekret TOTP) dla sterownika obciążenia. Wymaga kontekstu aplikacji.
+# Bez jawnego reset tabele są usuwane tylko w lokalnej bazie benchmarków.
+def seed(users=50, messages=2000, payload_sizes=None, rng_seed=1234, reset=None):
+    rng = random.Random(rng_seed)
+    payload_sizes = payload_sizes or dict(DEFAULT_PAYLOAD_SIZES)
+
+    if reset is None:
+        reset = is_bench_database()
+    if reset:
+        db.drop_all()
+    db.create_all()
+    if not reset and db.session.scalar(select(User.id).where(User.username.startswith(f"bench_{rng_seed}_")).limit(1)):
+        raise RuntimeError(f"Baza zawiera już dane benchmarku z ziarnem {rng_seed} - użyj --reset albo innego --seed")
+
+    password_hash = PasswordHasher().hash(BENCH_PASSWORD_TOKEN)
+    credentials = []
+    user_rows = []
+    for i in range(users):
+        username = f"bench_{rng_seed}_{i:05d}"
+        totp_secret = pyotp.random_base32()
+        credentials.append({"username": username, "password_token": BENCH_PASSWORD_TOKEN, "totp_secret": totp_secret})
+        # Rozmiary jak w kliencie: klucze X25519/Ed25519 (32 B), klucze prywatne opakowane AES-GCM
+        user_rows.append({
+            "username": username,
+            "password_hash": password_hash,
+            "totp_secret": utils.encrypt_secret(totp_secret),
+            "kdf_salt": _b64(rng, 16),
+            "pub_key_x25519": _b64(rng, 32),
+            "pub_key_ed25519": _b64(rng, 32),
+            "wrapped_priv_key_x25519": _b64(rng, 12 + 48 + 16),
+            "wrapped_priv_key_ed25519": _b64(rng, 12 + 48 + 16),
+        })
+
+    user_ids = []
+    for start in range(0, len(user_rows), INSERT_BATCH_SIZE):
+        user_ids.extend(db.session.scalars(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            user_rows[start:start + INSERT_BATCH_SIZE]
+        ))
+    for user_id, entry in zip(user_ids, credentials):
+        entry["id"] = user_id
+
+    # Jawne znaczniki czasu rosnące w ostatnich 30 dniach (deterministyczne stronicowanie
+    # również na SQLite, gdzie domyślne now() ma rozdzielczość sekundy)
+    store = get_blob_store()
+    sizes, weights = zip(*payload_sizes.items())
+    start_ts = datetime.now() - timedelta(days=30)
+    step = timedelta(days=30) / max(messages, 1)
+    unread = Counter()
+    total_bytes = 0
+
+    for start in range(0, messages, INSERT_BATCH_SIZE):
+        rows = []
+        for i in range(start, min(start + INSERT_BATCH_SIZE, messages)):
+            sender_id, receiver_id = rng.sample(user_ids, 2) if len(user_ids) > 1 else (user_ids[0], user_ids[0])
+            payload = rng.randbytes(rng.choices(sizes, weights)[0])
+            is_read = rng.random() < 0.5
+            rows.append({
+                "sender_id": sender_id,
+                "receiver_id": receiver_id,
+                "payload_ref": store.put(payload),
+                "payload_size": len(payload),
+                "iv": _b64(rng, 12),
+                "signature": _b64(rng, 64),
+                "timestamp": start_ts + step * i,
+                "is_read": is_read,
+            })
+            total_bytes += len(payload)
+            if not is_read:
+                unread[receiver_id] += 1
+
+        ids = db.session.scalars(
+            insert(Message).returning(Message.id, sort_by_parameter_order=True), rows
+        ).all()
+        record_changes([(row["sender_id"], row["receiver_id"], msg_id) for row, msg_id in zip(rows, ids)], 'added')
+        db.session.commit()
+
+    db.session.execute(insert(UnreadCounter), [
+        {"user_id": user_id, "unread": unread.get(user_id, 0)} for user_id in user_ids
+    ])
+    db.session.commit()
+
+    return credentials, {"users": users, "messages": messages, "payload_bytes": total_bytes}
@@ -0,0 +1,150 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from benchmarks import BASE_DIR, BENCH_DIR
+
+SRC_DIR = os.path.join(BASE_DIR, 'src')
+
+# Worker bez preloadu (--lazy-apps): każdy proces importuje i buduje aplikację sam
+LAZY_WORKER = """
+import sys
+sys.path.insert(0, {src!r})
+from app import create_app
+from app.warmup import warm_up, warm_worker
+app = create_app()
+warm_up(app)
+warm_worker(app)
+print('ready', flush=True)
+sys.stdin.read()
+"""
+
+# Master z preloadem: aplikacja budowana i rozgrzewana raz, workery przez fork() jak w uWSGI
+PRELOAD_MASTER = """
+import json, os, sys, time
+sys.path.insert(0, {src!r})
+start = time.perf_counter()
+from app import create_app
+from app.warmup import warm_up, warm_worker, memory_usage
+app = create_app()
+warm_up(app)
+master_ready = time.perf_counter() - start
+
+children = []
+for _ in range({workers}):
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        warm_worker(app)
+        os.write(write_end, b'.')
+        os.close(write_end)
+        time.sleep(3600)
+        os._exit(0)
+    os.close(write_end)
+    children.append((pid, read_end))
+for pid, read_end in children:
+    os.read(read_end, 1)
+all_ready = time.perf_counter() - start
+
+print(json.dumps({{
+    "master_ready_seconds": master_ready,
+    "all_ready_seconds": all_ready,
+    "master": memory_usage(),
+    "workers": [memory_usage(pid) for pid, _ in children],
+}}), flush=True)
+sys.stdin.read()
+for pid, _ in children:
+    os.kill(pid, 9)
+    os.waitpid(pid, 0)
+"""
+
+# Inicjalizacja schematu na osobnej bazie: pełne utworzenie, potem start przy bieżącej wersji
+SCHEMA_CHECK = """
+import json, sys
+sys.path.insert(0, {src!r})
+from app import create_app
+from app.schema import ensure_schema, drop_schema
+app = create_app()
+with app.app_context():
+    drop_schema()
+    created = ensure_schema()
+    current = ensure_schema()
+app.extensions['hashing_pool'].shutdown()
+print(json.dumps({{"created_ms": created["seconds"] * 1000, "current_ms": current["seconds"] * 1000,
+                  "current_action": current["action"]}}))
+"""
+
+
+def _mb(value):
+    return round(value / 1048576, 2)
+
+# Średnie i suma pamięci workerów (MiB)
+def _memory_summary(samples):
+    summary = {}
+    for key in ('rss_bytes', 'pss_bytes', 'uss_bytes'):
+        values = [sample.get(key, 0) for sample in samples]
+        name = key.replace('_bytes', '')
+        summary[f"{name}_mb_avg"] = _mb(sum(values) / len(values)) if values else 0.0
+        summary[f"{name}_mb_total"] = _mb(sum(values))
+    return summary
+
+# Argon2 weryfikowany w procesie workera (HASH_POOL_WORKERS=0) - procesy puli nie wchodzą
+# do pomiaru pamięci i nie przeżywają zakończenia workerów
+def _python(code, **env):
+    return subprocess.Popen([sys.executable, '-c', code], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            text=True, cwd=BASE_DIR, env=dict(os.environ, HASH_POOL_WORKERS='0', **env))
+
+
+def _run_lazy(workers):
+    from app.warmup import memory_usage
+
+    start = time.perf_counter()
+    processes = [_python(LAZY_WORKER.format(src=SRC_DIR)) for _ in range(workers)]
+    ready = []
+    try:
+        for process in processes:
+            if process.stdout.readline().strip() != 'ready':
+                raise RuntimeError("Worker nie wystartował")
+            ready.append(time.perf_counter() - start)
+        samples = [memory_usage(process.pid) for process in processes]
+    finally:
+        for process in processes:
+            process.communicate(input='')
+
+    result = {"workers": workers, "all_ready_seconds": round(max(ready), 3),
+              "first_ready_seconds": round(min(ready), 3)}
+    result.update(_memory_summary(samples))
+    return result
+
+def _run_preload(workers):
+    process = _python(PRELOAD_MASTER.format(src=SRC_DIR, workers=workers))
+    try:
+        report = json.loads(process.stdout.readline())
+    finally:
+        process.communicate(input='')
+
+    result = {"workers": workers, "all_ready_seconds": round(report["all_ready_seconds"], 3),
+              "master_ready_seconds": round(report["master_ready_seconds"], 3),
+              "master_rss_mb": _mb(report["master"].get("rss_bytes", 0))}
+    result.update(_memory_summary(report["workers"]))
+    return result
+
+def _run_schema():
+    process = _python(SCHEMA_CHECK.format(src=SRC_DIR), DATABASE_URL=f"sqlite:///{os.path.join(BENCH_DIR, 'schema.db')}")
+    output, _ = process.communicate(input='')
+    report = json.loads(output.strip().splitlines()[-1])
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in report.items()}
+
+
+# Zimny start i pamięć workerów: osobne budowanie aplikacji w każdym procesie (lazy-apps)
+# wobec preloadu z fork(); pomiar pamięci przy wszystkich workerach działających jednocześnie
+def run_startup(workers=4, schema=True):
+    results = {
+        "lazy_apps": _run_lazy(workers),
+        "preload": _run_preload(workers),
+    }
+    if schema:
+        results["schema_bootstrap"] = _run_schema()
+    return {"workers": workers}, results
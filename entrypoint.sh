@@ -27,10 +27,16 @@ for i in range(max_retries):
 exit(1)
 "
 
-# 2. Hard Reset Bazy Danych (Drop & Create)
-echo "Czyszczenie i inicjalizacja bazy danych (init_db.py)..."
+# 2. Schemat bazy danych (wersjonowany, idempotentny - dane zachowane między restartami)
+echo "Inicjalizacja schematu bazy danych (init_db.py)..."
 pixi run db-init
 
-# 3. Start aplikacji
+# 3. Metryki poprzedniego uruchomienia (pliki workerów o nieaktualnych PID)
+if [ -n "$METRICS_DIR" ]; then
+    rm -rf "$METRICS_DIR"
+    mkdir -p "$METRICS_DIR"
+fi
+
+# 4. Start aplikacji
 echo "Startuję aplikację..."
 exec "$@"
\ No newline at end of file
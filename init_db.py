@@ -12,18 +12,36 @@ sys.path.insert(0, os.path.join(BASE_DIR, 'src'))
 try:
     from wsgi import app
     from app.models import db
-    
-    print("Inicjalizacja bazy danych (tryb: create-drop)...")
+    from app.schema import ensure_schema, drop_schema
+    from app.retention import is_partitioned
+
     with app.app_context():
 
-        # Ususnięcie istniejących tabel
-        db.drop_all()
-        print("Stare tabele zostały usunięte.")
-        
-        # Stworzenie tabel na nowo
-        db.create_all()
-        print("Nowe tabele zostały utworzone pomyślnie.")
-        
+        # Usunięcie danych tylko na wyraźne żądanie (środowisko deweloperskie)
+        if '--reset' in sys.argv[1:]:
+            drop_schema()
+            print("Stare tabele zostały usunięte.")
+
+        # Schemat wersjonowany: przy bieżącej wersji bez zmian w bazie (dane zachowane)
+        partitioning = app.config['MESSAGE_PARTITIONING'] and db.engine.dialect.name == 'postgresql'
+        result = ensure_schema(partitioning=partitioning)
+
+        if result['action'] == 'current':
+            print(f"Schemat bazy aktualny (wersja {result['version']}).")
+        elif result['action'] == 'created':
+            print(f"Utworzono schemat bazy w wersji {result['version']}.")
+        else:
+            print(f"Schemat zaktualizowany z wersji {result['from_version']} do {result['version']}.")
+        if result['partitions']:
+            print(f"Tabela message partycjonowana miesięcznie: {', '.join(result['partitions'])}.")
+
+        if partitioning:
+            with db.engine.connect() as connection:
+                if not is_partitioned(connection):
+                    print("Uwaga: tabela message istnieje bez partycji - MESSAGE_PARTITIONING "
+                          "dotyczy tylko nowych baz (init_db.py --reset).")
+        print(f"Czas inicjalizacji schematu: {result['seconds'] * 1000:.1f} ms.")
+
 except Exception as e:
     print(f"Błąd podczas inicjalizacji bazy: {e}")
-    sys.exit(1)
\ No newline at end of file
+    sys.exit(1)
@@ -2,8 +2,20 @@
 import os
 from flask import Flask
 from flask.cli import load_dotenv
-from .models import db, User
+from .models import db
+from .database import engine_options, init_engine_events
+from .metrics import init_metrics
 from .routes import init_routes
+from .commands import init_commands
+from .blobstore import create_blob_store
+from .uploads import ChunkStaging
+from .hashing import HashingPool
+from .directory import KeyDirectory
+from .identity import IdentityCache
+from .events import EventHub, create_broker, event_stream_enabled
+from .sessions import create_session_interface
+from .fragments import FragmentCache
+from .ratelimit import HybridRedisStorage  # rejestruje schemat hybrid+redis:// w limits
 from flask_login import LoginManager
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -12,12 +24,27 @@ load_dotenv('../../.env')
 
 login_manager = LoginManager()
 login_manager.login_view = 'index'
+# SPA nie wyświetla komunikatów flash - bez tego każde anonimowe żądanie do chronionego
+# endpointu zakładałoby sesję w magazynie
+login_manager.login_message = None
 
 redis_uri = os.environ.get("RATELIMIT_STORAGE_URI", "memory://")
 
+# RATELIMIT_HYBRID=1 - liczniki limitów w pamięci workera, synchronizowane z Redis zbiorczo.
+# Nadwyżka: ułamek limitu, który worker może przyjąć bez pytania Redis.
+limiter_storage_uri = redis_uri
+limiter_storage_options = {}
+if os.getenv('RATELIMIT_HYBRID', '0').lower() in ('1', 'true', 'yes') and redis_uri.startswith(('redis://', 'rediss://')):
+    limiter_storage_uri = 'hybrid+' + redis_uri
+    limiter_storage_options = {
+        'overshoot': float(os.getenv('RATELIMIT_HYBRID_OVERSHOOT', 0.02)),
+        'sync_interval': float(os.getenv('RATELIMIT_HYBRID_SYNC_INTERVAL', 1.0)),
+    }
+
 limiter = Limiter(
     key_func=get_remote_address,
-    storage_uri=redis_uri,
+    storage_uri=limiter_storage_uri,
+    storage_options=limiter_storage_options,
     default_limits=["2000 per day", "1000 per hour"]
 )
 
@@ -31,10 +58,99 @@ def create_app():
     # Konfiguracja bazy danych PostgreSQL
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Pula połączeń: rozmiar, przepełnienie, recykling, sprawdzanie przed użyciem, limit zapytań.
+    # DB_PGBOUNCER=1 - aplikacja za PgBouncerem w trybie transakcyjnym (bez własnej puli)
+    app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 5))
+    app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    app.config['DB_POOL_TIMEOUT'] = float(os.getenv('DB_POOL_TIMEOUT', 30))
+    app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    app.config['DB_POOL_PRE_PING'] = os.getenv('DB_POOL_PRE_PING', '1').lower() in ('1', 'true', 'yes')
+    app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))
+    app.config['DB_PGBOUNCER'] = os.getenv('DB_PGBOUNCER', '0').lower() in ('1', 'true', 'yes')
+    # Połączenia otwierane przez każdy worker uWSGI przed przyjęciem ruchu (app.warmup)
+    app.config['DB_WARM_CONNECTIONS'] = int(os.getenv('DB_WARM_CONNECTIONS', 2))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+
     app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'domyslny-klucz-bezpieczenstwa')
 
+    # Magazyn zaszyfrowanych paczek wiadomości (poza tabelą Message)
+    app.config['BLOB_STORE_URI'] = os.getenv(
+        'BLOB_STORE_URI', os.path.normpath(os.path.join(app.root_path, '../../data/blobs'))
+    )
+    # Okres karencji (s): obiekt bez odwołań zapisany później nie jest usuwany (wysyłka w toku)
+    app.config['BLOB_GC_GRACE_SECONDS'] = int(os.getenv('BLOB_GC_GRACE_SECONDS', 3600))
+    # Prefiks lokalizacji 'internal' w nginx - pobieranie paczek przez X-Accel-Redirect
+    app.config['BLOB_ACCEL_PREFIX'] = os.getenv('BLOB_ACCEL_PREFIX')
+    # Katalog roboczy wysyłek porcjowanych (dużych załączników)
+    app.config['UPLOAD_STAGING_PATH'] = os.getenv(
+        'UPLOAD_STAGING_PATH', os.path.normpath(os.path.join(app.root_path, '../../data/uploads'))
+    )
+
+    # Pula procesów Argon2: liczba procesów, limit kolejki, limit oczekiwania (s)
+    app.config['HASH_POOL_WORKERS'] = int(os.getenv('HASH_POOL_WORKERS', 2))
+    app.config['HASH_POOL_QUEUE'] = int(os.getenv('HASH_POOL_QUEUE', 16))
+    app.config['HASH_POOL_TIMEOUT'] = float(os.getenv('HASH_POOL_TIMEOUT', 10))
+
+    # Bufor katalogu kluczy publicznych (opcjonalnie współdzielony przez Redis)
+    app.config['KEY_CACHE_SIZE'] = int(os.getenv('KEY_CACHE_SIZE', 4096))
+    app.config['KEY_CACHE_TTL'] = int(os.getenv('KEY_CACHE_TTL', 300))
+    # Brak użytkownika buforowany lokalnie krótko - rejestracja w innym workerze unieważnia
+    # tylko jego bufor i Redis, a nowe konto musi być szybko widoczne dla nadawców
+    app.config['KEY_CACHE_NEGATIVE_TTL'] = int(os.getenv('KEY_CACHE_NEGATIVE_TTL', 5))
+    app.config['KEY_CACHE_REDIS_URI'] = os.getenv('KEY_CACHE_REDIS_URI', redis_uri)
+
+    # Bufor tożsamości sesji (user_loader): unieważnienia rozsyłane przez Redis pub/sub,
+    # krótki TTL ogranicza nieaktualność, gdy Redis nie jest skonfigurowany
+    app.config['IDENTITY_CACHE_TTL'] = int(os.getenv('IDENTITY_CACHE_TTL', 60))
+    app.config['IDENTITY_CACHE_REDIS_URI'] = os.getenv('IDENTITY_CACHE_REDIS_URI', redis_uri)
+
+    # Sesje po stronie serwera: w ciasteczku tylko identyfikator, dane w Redis; TTL liczony
+    # od ostatniego żądania. Bez Redis sesja w podpisanym ciasteczku (cookie://) - wspólna
+    # dla wszystkich workerów; memory:// dopuszczalne tylko w pojedynczym procesie
+    app.config['SESSION_STORE_URI'] = os.getenv(
+        'SESSION_STORE_URI', redis_uri if redis_uri.startswith(('redis://', 'rediss://')) else 'cookie://'
+    )
+    app.config['SESSION_TTL'] = int(os.getenv('SESSION_TTL', 86400))
+
+    # Broker powiadomień o nowych wiadomościach (Redis pub/sub lub memory://)
+    app.config['EVENTS_BROKER_URI'] = os.getenv('EVENTS_BROKER_URI', redis_uri)
+    # Strumień SSE (auto - tylko na workerze gevent/asyncio; wątkowy uWSGI dostaje 204)
+    app.config['EVENT_STREAM_ENABLED'] = event_stream_enabled(os.getenv('EVENT_STREAM', 'auto'))
+
+    # Retencja wiadomości (dni, 0 - bez limitu) i partycjonowanie miesięczne tabeli message
+    app.config['MESSAGE_RETENTION_DAYS'] = int(os.getenv('MESSAGE_RETENTION_DAYS', 0))
+    app.config['MESSAGE_PARTITIONING'] = os.getenv('MESSAGE_PARTITIONING', '0').lower() in ('1', 'true', 'yes')
+
+    # Katalog współdzielony przez workery uWSGI na potrzeby agregacji metryk (/metrics)
+    app.config['METRICS_DIR'] = os.getenv('METRICS_DIR')
+    app.config['METRICS_FLUSH_SECONDS'] = float(os.getenv('METRICS_FLUSH_SECONDS', 1.0))
+
     # Inicjalizacja bazy danych
     db.init_app(app)
+    with app.app_context():
+        init_engine_events(db.engine, app.config)
+        init_metrics(app, db.engine)
+    app.extensions['blob_store'] = create_blob_store(app.config['BLOB_STORE_URI'])
+    app.extensions['chunk_staging'] = ChunkStaging(app.config['UPLOAD_STAGING_PATH'])
+    app.extensions['key_directory'] = KeyDirectory(
+        maxsize=app.config['KEY_CACHE_SIZE'],
+        ttl=app.config['KEY_CACHE_TTL'],
+        negative_ttl=app.config['KEY_CACHE_NEGATIVE_TTL'],
+        redis_uri=app.config['KEY_CACHE_REDIS_URI']
+    )
+    app.extensions['identity_cache'] = IdentityCache(
+        ttl=app.config['IDENTITY_CACHE_TTL'],
+        redis_uri=app.config['IDENTITY_CACHE_REDIS_URI']
+    )
+    app.extensions['event_hub'] = EventHub(create_broker(app.config['EVENTS_BROKER_URI']))
+    app.extensions['fragment_cache'] = FragmentCache(app)
+    app.session_interface = create_session_interface(app.config['SESSION_STORE_URI'], ttl=app.config['SESSION_TTL'])
+    app.extensions['hashing_pool'] = HashingPool(
+        workers=app.config['HASH_POOL_WORKERS'],
+        max_queue=app.config['HASH_POOL_QUEUE'],
+        timeout=app.config['HASH_POOL_TIMEOUT']
+    )
     
     login_manager.init_app(app)  # Inicjalizacja managera logowania
     limiter.init_app(app)  # Inicjalizacja limitera żądań
@@ -42,9 +158,12 @@ def create_app():
     # Callback do załadowania użytkownika z sesji
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))  # Pobranie użytkownika z bazy po ID
+        return app.extensions['identity_cache'].load(int(user_id))  # Lekka tożsamość z bufora lub bazy
 
     # Rejestracja endpointów
     init_routes(app, limiter) 
+
+    # Rejestracja poleceń CLI (flask ...)
+    init_commands(app)
     
     return app
\ No newline at end of file
@@ -0,0 +1,304 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import secrets
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from flask import current_app
+from app.models import Message
+
+# Klucz obiektu to heksadecymalny skrót SHA-256 treści
+_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+# Przekroczenie limitu rozmiaru przy zapisie strumieniowym
+class BlobTooLarge(ValueError):
+    pass
+
+
+# --- INTERFEJS MAGAZYNU ---
+
+# Magazyn obiektów adresowanych treścią. Interfejs odpowiada modelowi S3
+# (put/get/delete/exists na kluczach), więc backend obiektowy może go zastąpić.
+#
+# Obiekty są współdzielone (deduplikacja), a zapis następuje przed zatwierdzeniem wiersza
+# wiadomości. Dlatego obiekt bez odwołań usuwa się dopiero po okresie karencji od ostatniego
+# zapisu: put() istniejącego obiektu odświeża jego czas modyfikacji, więc wysyłka w toku
+# (także ta, która dopiero zatwierdzi wiersz) chroni go przed usunięciem.
+class BlobStore(ABC):
+
+    # Zapisuje dane i zwraca ich klucz (SHA-256). Identyczna treść jest deduplikowana.
+    @abstractmethod
+    def put(self, data: bytes) -> str:
+        ...
+
+    # Zapisuje wiele obiektów naraz (wysyłka zbiorcza); zwraca klucze w kolejności danych.
+    # Backendy mogą zsynchronizować zapis raz na całą partię zamiast raz na obiekt.
+    def put_many(self, items) -> list:
+        return [self.put(data) for data in items]
+
+    # Zapisuje dane z iteratora porcji bajtów, licząc skrót i rozmiar na bieżąco.
+    # Zwraca (klucz, rozmiar); przekroczenie max_size przerywa zapis wyjątkiem BlobTooLarge.
+    def put_stream(self, chunks, max_size=None):
+        data = bytearray()
+        for chunk in chunks:
+            data += chunk
+            if max_size is not None and len(data) > max_size:
+                raise BlobTooLarge()
+        return self.put(bytes(data)), len(data)
+
+    # Zwraca pełną zawartość obiektu
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        ...
+
+    # Usuwa obiekt (brak obiektu nie jest błędem)
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    # Usuwa obiekt, jeśli nie był zapisywany przez ostatnie max_age sekund; zwraca, czy usunięto
+    @abstractmethod
+    def delete_stale(self, key: str, max_age: float) -> bool:
+        ...
+
+    # Klucze obiektów niezapisywanych przez ostatnie max_age sekund (kandydaci do sprzątania)
+    @abstractmethod
+    def iter_stale(self, max_age: float):
+        ...
+
+    # Ścieżka pliku dla backendów lokalnych (sendfile / X-Accel-Redirect), inaczej None
+    def local_path(self, key: str):
+        return None
+
+    # Waliduje klucz - chroni przed path traversal przy budowaniu ścieżek
+    @staticmethod
+    def check_key(key):
+        if not isinstance(key, str) or not _KEY_PATTERN.match(key):
+            raise ValueError("Niepoprawny klucz obiektu")
+        return key
+
+
+# --- BACKEND LOKALNY ---
+
+# Magazyn na lokalnym systemie plików: <root>/<ab>/<cd>/<sha256>
+class LocalBlobStore(BlobStore):
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    # Względna ścieżka obiektu (używana też jako sufiks URI X-Accel-Redirect)
+    def relative_path(self, key):
+        key = self.check_key(key)
+        return f"{key[:2]}/{key[2:4]}/{key}"
+
+    def local_path(self, key):
+        return os.path.join(self.root, self.relative_path(key))
+
+    # Odświeża czas modyfikacji istniejącego obiektu; False, jeśli obiektu nie ma
+    # (również gdy właśnie został usunięty - wtedy zapis tworzy go od nowa)
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def put(self, data):
+        return self.put_many([data])[0]
+
+    # Obiekty trafiają najpierw do plików tymczasowych bez fsync; potem pliki są synchronizowane
+    # jeden po drugim, atomowo podmieniane i na końcu synchronizowany jest każdy katalog raz.
+    # Partia czeka na dysk jednym przebiegiem zamiast przeplatać zapis z fsync każdego obiektu.
+    def put_many(self, items):
+        keys = []
+        pending = {}
+        try:
+            for data in items:
+                key = hashlib.sha256(data).hexdigest()
+                keys.append(key)
+                path = self.local_path(key)
+                if key in pending or self._touch(path):
+                    continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+                pending[key] = tmp_path
+                with os.fdopen(fd, 'wb') as tmp:
+                    tmp.write(data)
+
+            for tmp_path in pending.values():
+                self._fsync(tmp_path)
+            # Zapis do pliku tymczasowego i atomowe podmienienie - brak częściowych obiektów
+            written = list(pending)
+            for key in written:
+                os.replace(pending.pop(key), self.local_path(key))
+            for directory in {os.path.dirname(self.local_path(key)) for key in written}:
+                self._fsync(directory)
+        except Exception:
+            for tmp_path in pending.values():
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            raise
+        return keys
+
+    @staticmethod
+    def _fsync(path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # Strumień trafia wprost do pliku tymczasowego - w pamięci jest najwyżej jedna porcja
+    def put_stream(self, chunks, max_size=None):
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise BlobTooLarge()
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+
+            key = digest.hexdigest()
+            path = self.local_path(key)
+            if self._touch(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return key, size
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, key):
+        with open(self.local_path(key), 'rb') as f:
+            return f.read()
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, key):
+        return os.path.exists(self.local_path(key))
+
+    # Obiekt jest najpierw atomowo przenoszony pod nazwę tymczasową, a wiek sprawdzany po
+    # przeniesieniu: równoległy put() albo odświeżył go wcześniej (obiekt wraca na miejsce),
+    # albo nie znalazł pliku i zapisał go od nowa.
+    def delete_stale(self, key, max_age):
+        path = self.local_path(key)
+        doomed = f"{path}.del-{secrets.token_hex(4)}"
+        try:
+            os.rename(path, doomed)
+        except FileNotFoundError:
+            return False
+        if os.path.getmtime(doomed) >= time.time() - max_age:
+            os.replace(doomed, path)
+            return False
+        os.remove(doomed)
+        return True
+
+    def iter_stale(self, max_age):
+        threshold = time.time() - max_age
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if _KEY_PATTERN.match(name) and os.path.getmtime(os.path.join(dirpath, name)) < threshold:
+                    yield name
+
+
+# --- KONFIGURACJA ---
+
+# Tworzy magazyn na podstawie URI (file:///ścieżka lub sama ścieżka)
+def create_blob_store(uri):
+    if uri.startswith('file://'):
+        return LocalBlobStore(uri[len('file://'):])
+    if '://' in uri:
+        raise ValueError(f"Nieobsługiwany backend magazynu obiektów: {uri.split('://')[0]}")
+    return LocalBlobStore(uri)
+
+# Magazyn skonfigurowany dla bieżącej aplikacji
+def get_blob_store() -> BlobStore:
+    return current_app.extensions['blob_store']
+
+# Zwraca zaszyfrowaną paczkę wiadomości w Base64 (z magazynu lub ze starego zapisu w wierszu)
+def payload_base64(msg):
+    if msg.payload_ref:
+        return base64.b64encode(get_blob_store().get(msg.payload_ref)).decode('ascii')
+    return msg.encrypted_payload
+
+# Dekoduje paczkę zapisaną w wierszu (sprzed migracji); None, jeśli Base64 jest uszkodzony
+def legacy_payload_bytes(msg):
+    try:
+        return base64.b64decode(msg.encrypted_payload)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+# Surowe bajty paczki (format binarny odpowiedzi, bez narzutu Base64). Uszkodzona paczka
+# w wierszu daje pustą treść - klient pokazuje ją jak każdą nieodszyfrowaną wiadomość,
+# zamiast błędu całej listy
+def payload_bytes(msg):
+    if msg.payload_ref:
+        return get_blob_store().get(msg.payload_ref)
+    raw = legacy_payload_bytes(msg)
+    if raw is None:
+        current_app.logger.error(f"Błąd paczki danych wiadomości {msg.id}: niepoprawny Base64")
+        return b''
+    return raw
+
+# Usuwa obiekt z magazynu, jeśli żadna wiadomość już się do niego nie odwołuje.
+# Wywoływane po zatwierdzeniu transakcji usuwającej wiadomość.
+def release_blob(key):
+    release_blobs([key])
+
+# Zbiorcza wersja release_blob - odwołania sprawdzane jednym zapytaniem IN.
+# Obiekty zapisane w okresie karencji (BLOB_GC_GRACE_SECONDS) zostają - mogą należeć do
+# wysyłki jeszcze niezatwierdzonej; usuwa je później gc_blobs. Zwraca liczbę usuniętych obiektów.
+def release_blobs(keys, grace=None):
+    keys = {key for key in keys if key}
+    if not keys:
+        return 0
+    grace = current_app.config['BLOB_GC_GRACE_SECONDS'] if grace is None else grace
+    try:
+        referenced = {
+            row.payload_ref for row in
+            Message.query.with_entities(Message.payload_ref).filter(Message.payload_ref.in_(keys)).distinct()
+        }
+        store = get_blob_store()
+        return sum(store.delete_stale(key, grace) for key in keys - referenced)
+    except Exception as e:
+        # Osierocony obiekt nie wpływa na poprawność - logujemy i kontynuujemy
+        current_app.logger.error(f"Błąd zwalniania obiektów: {str(e)}")
+        return 0
+
+# Sprzątanie obiektów bez odwołań starszych niż okres karencji: zwolnionych w karencji
+# i osieroconych przez wysyłki wycofane po zapisie do magazynu. Zwraca liczbę usuniętych.
+def gc_blobs(grace=None, batch_size=1000):
+    grace = current_app.config['BLOB_GC_GRACE_SECONDS'] if grace is None else grace
+    removed = 0
+    batch = []
+    for key in get_blob_store().iter_stale(grace):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            removed += release_blobs(batch, grace)
+            batch = []
+    if batch:
+        removed += release_blobs(batch, grace)
+    return removed
@@ -0,0 +1,61 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Znacznik braku wpisu - pozwala buforować również wynik "nie istnieje"
+MISSING = object()
+
+
+# Bufor LRU z czasem życia wpisów, lokalny dla procesu workera
+class TTLCache:
+
+    def __init__(self, maxsize=4096, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # Zwraca zapisaną wartość albo MISSING, gdy wpisu nie ma lub wygasł
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    # Opcjonalny ttl nadpisuje domyślny czas życia dla tego wpisu
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Klient Redis dla URI redis://...; None dla innych schematów (np. memory://)
+def redis_client(uri):
+    if not uri or not uri.startswith(('redis://', 'rediss://')):
+        return None
+    import redis
+    return redis.Redis.from_url(uri)
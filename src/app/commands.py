@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+import click
+from app.models import db, User, Message, PendingUpload, UnreadCounter
+from app.blobstore import get_blob_store, gc_blobs, legacy_payload_bytes
+from app.uploads import get_chunk_staging
+from app.retention import enforce_retention, retention_preview, ensure_partitions, is_partitioned
+from app.mailbox import create_unread_counters
+
+def init_commands(app):
+
+    # === MIGRACJE DANYCH ===
+
+    # Przeniesienie paczek zapisanych w wierszach (Base64) do magazynu obiektów, partiami.
+    # Wiersze z uszkodzonym Base64 są pomijane (zostają w tabeli) - partie idą po id,
+    # więc taki wiersz nie blokuje kolejnych ani następnych uruchomień.
+    @app.cli.command('migrate-blobs')
+    @click.option('--batch-size', default=500, show_default=True, help="Liczba wiadomości na transakcję")
+    def migrate_blobs(batch_size):
+        store = get_blob_store()
+        moved = 0
+        skipped = 0
+        freed_chars = 0
+        last_id = 0
+
+        while True:
+            batch = Message.query.options(db.undefer_group('payload'))\
+                .filter(Message.payload_ref.is_(None), Message.id > last_id)\
+                .order_by(Message.id)\
+                .limit(batch_size).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            for msg in batch:
+                raw = legacy_payload_bytes(msg)
+                if raw is None:
+                    app.logger.error(f"Błąd migracji paczki wiadomości {msg.id}: niepoprawny Base64, pominięto")
+                    skipped += 1
+                    continue
+                msg.payload_ref = store.put(raw)
+                msg.payload_size = len(raw)
+                freed_chars += len(msg.encrypted_payload)
+                msg.encrypted_payload = None
+                moved += 1
+
+            # Zatwierdzenie po każdej partii - krótkie transakcje i ograniczona pamięć
+            db.session.commit()
+            db.session.expunge_all()
+            click.echo(f"Przeniesiono {moved} wiadomości...")
+
+        click.echo(f"Migracja zakończona: {moved} wiadomości, zwolniono ~{freed_chars} B z tabeli message.")
+        if skipped:
+            click.echo(f"Pominięto {skipped} wiadomości z uszkodzoną paczką (szczegóły w logu).")
+
+    # === PORZĄDKOWANIE ===
+
+    # Usunięcie porzuconych wysyłek porcjowanych (wiersze i porcje na dysku)
+    @app.cli.command('purge-uploads')
+    @click.option('--max-age-hours', default=24, show_default=True, help="Wiek porzuconej wysyłki")
+    def purge_uploads(max_age_hours):
+        staging = get_chunk_staging()
+        cutoff = datetime.now() - timedelta(hours=max_age_hours)
+
+        stale = PendingUpload.query.filter(PendingUpload.created_at < cutoff).all()
+        for upload in stale:
+            staging.discard(upload.id)
+            db.session.delete(upload)
+        db.session.commit()
+
+        # Katalogi bez odpowiadającego wiersza (np. po awarii w trakcie finalizacji)
+        orphans = staging.purge_stale(max_age_hours * 3600)
+        click.echo(f"Usunięto {len(stale)} porzuconych wysyłek i {orphans} osieroconych katalogów.")
+
+    # Usunięcie obiektów magazynu bez odwołań, niezapisywanych dłużej niż okres karencji
+    @app.cli.command('gc-blobs')
+    @click.option('--grace-seconds', type=int, default=None, help="Okres karencji (domyślnie BLOB_GC_GRACE_SECONDS)")
+    def gc_blobs_command(grace_seconds):
+        removed = gc_blobs(grace_seconds)
+        click.echo(f"Usunięto {removed} obiektów bez odwołań.")
+
+    # Przeliczenie liczników nieprzeczytanych z tabeli message, partiami użytkowników
+    @app.cli.command('repair-unread')
+    @click.option('--batch-size', default=500, show_default=True, help="Liczba użytkowników na transakcję")
+    def repair_unread(batch_size):
+        counters = UnreadCounter.__table__
+        last_id = 0
+        repaired = 0
+
+        while True:
+            user_ids = [row.id for row in User.query.with_entities(User.id)
+                        .filter(User.id > last_id).order_by(User.id).limit(batch_size)]
+            if not user_ids:
+                break
+
+            # Brakujące liczniki tworzone z zerem, następnie jeden UPDATE z podzapytaniem
+            existing = {row.user_id for row in UnreadCounter.query.with_entities(UnreadCounter.user_id)
+                        .filter(UnreadCounter.user_id.in_(user_ids))}
+            create_unread_counters([{"user_id": user_id, "unread": 0} for user_id in user_ids if user_id not in existing])
+
+            recount = db.session.query(db.func.count(Message.id))\
+                .filter(Message.receiver_id == counters.c.user_id, ~Message.is_read)\
+                .scalar_subquery()
+            db.session.execute(
+                counters.update().where(counters.c.user_id.in_(user_ids)).values(unread=recount)
+            )
+            db.session.commit()
+
+            last_id = user_ids[-1]
+            repaired += len(user_ids)
+            click.echo(f"Przeliczono liczniki {repaired} użytkowników...")
+
+        click.echo(f"Naprawa zakończona: {repaired} liczników.")
+
+    # === RETENCJA WIADOMOŚCI ===
+
+    # Usunięcie wiadomości starszych niż okres retencji: całe partycje (jeśli tabela jest
+    # partycjonowana), a pozostałe wiersze małymi partiami w osobnych transakcjach
+    @app.cli.command('purge-messages')
+    @click.option('--days', type=int, default=None, help="Okres retencji (domyślnie MESSAGE_RETENTION_DAYS)")
+    @click.option('--batch-size', default=1000, show_default=True, help="Liczba wiadomości na transakcję")
+    @click.option('--pause', default=0.0, show_default=True, help="Przerwa między partiami (s)")
+    @click.option('--detach-only', is_flag=True, help="Odłącz wygasłe partycje bez usuwania (archiwum)")
+    @click.option('--dry-run', is_flag=True, help="Tylko raport, bez zmian")
+    def purge_messages(days, batch_size, pause, detach_only, dry_run):
+        days = days if days is not None else app.config['MESSAGE_RETENTION_DAYS']
+        if not days or days <= 0:
+            raise click.UsageError("Retencja wyłączona - podaj --days lub ustaw MESSAGE_RETENTION_DAYS")
+        cutoff = datetime.now() - timedelta(days=days)
+
+        if dry_run:
+            preview = retention_preview(cutoff)
+            click.echo(f"Do usunięcia: {preview['rows']} wiadomości ({preview['payload_bytes']} B paczek), "
+                       f"{preview['changes']} wpisów dziennika zmian, "
+                       f"partycje: {', '.join(preview['partitions']) or 'brak'}.")
+            return
+
+        report = enforce_retention(cutoff, batch_size=batch_size, pause=pause, drop=not detach_only, progress=click.echo)
+        click.echo(
+            f"Retencja zakończona: {report['rows']} wiadomości, {report['payload_bytes']} B paczek "
+            f"({report['blobs_released']} obiektów zwolnionych), {report['table_bytes']} B tabel, "
+            f"{report['changes']} wpisów dziennika zmian, "
+            f"partycje: {', '.join(report['partitions']) or 'brak'}."
+        )
+
+    # Założenie partycji miesięcznych na kolejne miesiące (uruchamiane okresowo, np. z crona)
+    @app.cli.command('message-partitions')
+    @click.option('--months-ahead', default=3, show_default=True, help="Liczba miesięcy w przód")
+    def message_partitions(months_ahead):
+        with db.engine.begin() as connection:
+            if not is_partitioned(connection):
+                click.echo("Tabela message nie jest partycjonowana (MESSAGE_PARTITIONING).")
+                return
+            created = ensure_partitions(connection, months_ahead=months_ahead)
+        click.echo(f"Utworzono partycje: {', '.join(created) or 'brak (wszystkie istnieją)'}.")
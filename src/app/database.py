@@ -0,0 +1,153 @@
+import threading
+import time
+import weakref
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, NullPool
+
+
+# --- STATYSTYKI PULI ---
+
+# Liczniki puli połączeń jednego procesu: pobrania, czas oczekiwania na połączenie, czas
+# trzymania połączeń, wejścia w przepełnienie (pula powiększona ponad pool_size) i timeouty.
+class PoolStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._overflowing = False
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.hold_seconds_total = 0.0
+        self.hold_seconds_max = 0.0
+        self.overflow_events = 0
+        self.timeouts = 0
+
+    # Przepełnienie liczone raz na epizod: od pobrania, które zastało połączenia ponad
+    # pool_size, do pierwszego pobrania, które już ich nie zastało
+    def record_checkout(self, overflowed):
+        with self._lock:
+            self.checkouts += 1
+            if overflowed and not self._overflowing:
+                self.overflow_events += 1
+            self._overflowing = overflowed
+
+    def record_wait(self, waited, timed_out=False):
+        with self._lock:
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            if timed_out:
+                self.timeouts += 1
+
+    def record_checkin(self, held):
+        with self._lock:
+            self.hold_seconds_total += held
+            self.hold_seconds_max = max(self.hold_seconds_max, held)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+                "hold_seconds_total": self.hold_seconds_total,
+                "hold_seconds_max": self.hold_seconds_max,
+                "overflow_events": self.overflow_events,
+                "timeouts": self.timeouts,
+            }
+
+
+# Statystyki puli każdego silnika (przeżywają odtworzenie puli przy engine.dispose())
+_pool_stats = weakref.WeakKeyDictionary()
+
+def pool_stats(engine):
+    return _pool_stats.get(engine)
+
+# Nasłuch zdarzeń puli na poziomie silnika - przechodzi na pulę odtworzoną po forku.
+# Pula nie ma zdarzenia przed pobraniem połączenia, więc czas oczekiwania (kolejka puli,
+# otwarcie połączenia ponad pulę, pre-ping) i timeouty mierzy opakowanie raw_connection
+# silnika - każde engine.connect() i sesja ORM pobierają połączenie przez nie.
+def init_pool_events(engine):
+    if not isinstance(engine.pool, QueuePool) or engine in _pool_stats:
+        return
+    stats = _pool_stats[engine] = PoolStats()
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            connection = raw_connection(*args, **kwargs)
+        except PoolTimeoutError:
+            stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        stats.record_wait(time.perf_counter() - start)
+        return connection
+
+    engine.raw_connection = timed_raw_connection
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checked_out_at'] = time.perf_counter()
+        stats.record_checkout(engine.pool.overflow() > 0)
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop('checked_out_at', None)
+        if checked_out_at is not None:
+            stats.record_checkin(time.perf_counter() - checked_out_at)
+
+
+# Bieżący stan puli silnika: wykorzystanie i liczniki
+def pool_status(engine):
+    pool = engine.pool
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        })
+    stats = pool_stats(engine)
+    if stats is not None:
+        status.update(stats.snapshot())
+    return status
+
+
+# --- KONFIGURACJA SILNIKA ---
+
+# Opcje create_engine (SQLALCHEMY_ENGINE_OPTIONS) na podstawie konfiguracji aplikacji.
+# Tryb PgBouncer (pooling transakcyjny): połączenia trzyma PgBouncer, aplikacja używa NullPool
+# i nie ustawia parametrów sesji w pakiecie startowym - PgBouncer by je pominął lub odrzucił.
+def engine_options(config):
+    uri = config.get('SQLALCHEMY_DATABASE_URI') or ''
+    if not uri.startswith('postgresql'):
+        return {}
+
+    if config['DB_PGBOUNCER']:
+        return {"poolclass": NullPool}
+
+    options = {
+        "poolclass": QueuePool,
+        "pool_size": config['DB_POOL_SIZE'],
+        "max_overflow": config['DB_MAX_OVERFLOW'],
+        "pool_timeout": config['DB_POOL_TIMEOUT'],
+        "pool_recycle": config['DB_POOL_RECYCLE'],
+        "pool_pre_ping": config['DB_POOL_PRE_PING'],
+    }
+    if config['DB_STATEMENT_TIMEOUT_MS']:
+        options["connect_args"] = {"options": f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"}
+    return options
+
+# Zdarzenia silnika: statystyki puli, a w trybie PgBouncer limit czasu zapytań ustawiany
+# per transakcja (SET LOCAL), więc nie przechodzi na kolejnych klientów współdzielących połączenie
+def init_engine_events(engine, config):
+    init_pool_events(engine)
+
+    statement_timeout = config['DB_STATEMENT_TIMEOUT_MS']
+    if engine.dialect.name != 'postgresql' or not config['DB_PGBOUNCER'] or not statement_timeout:
+        return
+
+    @event.listens_for(engine, 'begin')
+    def set_statement_timeout(connection):
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(statement_timeout)}")
@@ -0,0 +1,136 @@
+import json
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import User
+from app.cache import TTLCache, MISSING, redis_client
+
+# Kolumny użytkownika udostępniane przez katalog kluczy (bez hasha hasła i sekretu TOTP)
+DIRECTORY_FIELDS = (
+    'id', 'username', 'pub_key_x25519', 'pub_key_ed25519',
+    'kdf_salt', 'wrapped_priv_key_x25519', 'wrapped_priv_key_ed25519'
+)
+
+
+# Katalog kluczy publicznych: lokalny LRU z TTL -> opcjonalnie Redis -> PostgreSQL.
+# Zmiany w tabeli user unieważniają wpisy po zatwierdzeniu transakcji. Brak użytkownika
+# jest buforowany lokalnie tylko przez negative_ttl sekund: unieważnienie nie dociera do
+# buforów innych workerów, a nowo zarejestrowane konto nie może być dla nich "nieistniejące"
+# przez pełny TTL.
+class KeyDirectory:
+
+    def __init__(self, maxsize=4096, ttl=300, redis_uri=None, negative_ttl=5):
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.redis = redis_client(redis_uri)
+
+    @staticmethod
+    def _redis_key(username):
+        return f"keydir:{username}"
+
+    # Zwraca wpis (słownik DIRECTORY_FIELDS) albo None dla nieistniejącego użytkownika
+    def get(self, username):
+        return self.get_many([username]).get(username)
+
+    # Rozwiązuje wiele nazw naraz - brakujące w buforach pobierane jednym zapytaniem IN
+    def get_many(self, usernames):
+        result = {}
+        pending = []
+        for username in dict.fromkeys(usernames):
+            cached = self.local.get(username)
+            if cached is MISSING:
+                pending.append(username)
+            else:
+                result[username] = cached
+
+        if pending and self.redis is not None:
+            try:
+                values = self.redis.mget([self._redis_key(name) for name in pending])
+            except Exception as e:
+                current_app.logger.error(f"Błąd odczytu katalogu kluczy z Redis: {str(e)}")
+                values = [None] * len(pending)
+            still_pending = []
+            for username, raw in zip(pending, values):
+                if raw is None:
+                    still_pending.append(username)
+                    continue
+                entry = json.loads(raw)
+                self.local.set(username, entry, ttl=self._ttl_for(entry))
+                result[username] = entry
+            pending = still_pending
+
+        if pending:
+            columns = [getattr(User, field) for field in DIRECTORY_FIELDS]
+            rows = User.query.with_entities(*columns).filter(User.username.in_(pending)).all()
+            found = {row.username: dict(zip(DIRECTORY_FIELDS, row)) for row in rows}
+
+            for username in pending:
+                entry = found.get(username)
+                self._store(username, entry)
+                result[username] = entry
+
+        return result
+
+    # Wpis negatywny żyje krótko także w Redis: odczyt z bazy sprzed rejestracji zapisany
+    # po jej unieważnieniu nie ukryje konta na pełny TTL
+    def _ttl_for(self, entry):
+        return self.negative_ttl if entry is None else self.ttl
+
+    def _store(self, username, entry):
+        ttl = self._ttl_for(entry)
+        self.local.set(username, entry, ttl=ttl)
+        if self.redis is not None:
+            try:
+                self.redis.set(self._redis_key(username), json.dumps(entry), ex=ttl)
+            except Exception as e:
+                current_app.logger.error(f"Błąd zapisu katalogu kluczy w Redis: {str(e)}")
+
+    # Usuwa wpisy z bufora lokalnego i współdzielonego (inne workery odczytają świeże dane
+    # z Redis/bazy najpóźniej po wygaśnięciu TTL swojego bufora lokalnego)
+    def invalidate(self, *usernames):
+        for username in usernames:
+            self.local.delete(username)
+        if self.redis is not None and usernames:
+            try:
+                self.redis.delete(*[self._redis_key(name) for name in usernames])
+            except Exception as e:
+                current_app.logger.error(f"Błąd unieważniania katalogu kluczy w Redis: {str(e)}")
+
+
+# Katalog skonfigurowany dla bieżącej aplikacji
+def get_key_directory() -> KeyDirectory:
+    return current_app.extensions['key_directory']
+
+
+# --- UNIEWAŻNIANIE PRZY ZMIANACH W TABELI USER ---
+
+# Zbiera nazwy zmienionych użytkowników w sesji
+def _mark_dirty(target, username):
+    session = Session.object_session(target)
+    if session is not None and username:
+        session.info.setdefault('keydir_dirty', set()).add(username)
+
+def _mark_user_dirty(mapper, connection, target):
+    _mark_dirty(target, target.username)
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(User, _event_name, _mark_user_dirty)
+
+# Przy zmianie nazwy unieważniana jest też poprzednia (active_history wczytuje starą wartość)
+@event.listens_for(User.username, 'set', active_history=True)
+def _mark_username_change(target, value, oldvalue, initiator):
+    if isinstance(oldvalue, str) and oldvalue != value:
+        _mark_dirty(target, oldvalue)
+
+# Unieważnienie dopiero po zatwierdzeniu - inaczej równoległe żądanie mogłoby
+# ponownie zbuforować stan sprzed zmiany
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    dirty = session.info.pop('keydir_dirty', None)
+    if dirty and has_app_context() and 'key_directory' in current_app.extensions:
+        get_key_directory().invalidate(*dirty)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('keydir_dirty', None)
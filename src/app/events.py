@@ -0,0 +1,172 @@
+import json
+import os
+import queue
+import threading
+import time
+from flask import current_app
+from app.cache import redis_client
+
+# Kanały powiadomień mają postać mailbox:<user_id>
+CHANNEL_PREFIX = 'mailbox:'
+
+
+# --- BROKERY ---
+
+# Broker w pamięci procesu - testy i konfiguracja bez Redis (memory://)
+class MemoryBroker:
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def publish(self, channel, data):
+        self._queue.put((channel, data))
+
+    # Blokujący iterator par (kanał, dane) dla wątku huba
+    def listen(self):
+        while True:
+            yield self._queue.get()
+
+
+# Broker Redis pub/sub - zdarzenia z dowolnego workera trafiają do wszystkich hubów
+class RedisBroker:
+
+    def __init__(self, uri):
+        self.client = redis_client(uri)
+
+    def publish(self, channel, data):
+        self.client.publish(channel, data)
+
+    def listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(CHANNEL_PREFIX + '*')
+        try:
+            for message in pubsub.listen():
+                channel = message['channel']
+                data = message['data']
+                yield (
+                    channel.decode() if isinstance(channel, bytes) else channel,
+                    data.decode() if isinstance(data, bytes) else data
+                )
+        finally:
+            pubsub.close()
+
+# Tworzy broker na podstawie URI (redis://... lub memory://)
+def create_broker(uri):
+    if uri and uri.startswith(('redis://', 'rediss://')):
+        return RedisBroker(uri)
+    return MemoryBroker()
+
+
+# --- HUB ---
+
+# Rozsyłanie zdarzeń w obrębie procesu: jedna subskrypcja brokera na worker,
+# a pod nią dowolnie wiele kolejek subskrybentów (strumieni SSE).
+class EventHub:
+
+    def __init__(self, broker, subscriber_queue_size=100):
+        self.broker = broker
+        self.subscriber_queue_size = subscriber_queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+
+    # Wątek nasłuchu uruchamiany leniwie w każdym procesie workera (po forku uWSGI)
+    def _ensure_listener(self):
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._thread_pid != os.getpid() or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen_forever, name='event-hub', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def _listen_forever(self):
+        while True:
+            try:
+                for channel, data in self.broker.listen():
+                    self._dispatch(channel, data)
+            except Exception:
+                # Utrata połączenia z brokerem - ponowna subskrypcja po krótkiej przerwie
+                time.sleep(1)
+
+    def _dispatch(self, channel, data):
+        if not channel.startswith(CHANNEL_PREFIX):
+            return
+        try:
+            user_id = int(channel[len(CHANNEL_PREFIX):])
+        except ValueError:
+            return
+
+        with self._lock:
+            targets = list(self._subscribers.get(user_id, ()))
+        for target in targets:
+            try:
+                target.put_nowait(data)
+            except queue.Full:
+                # Wolny klient - zdarzenie pomijane, klient i tak odświeży skrzynkę
+                pass
+
+    def subscribe(self, user_id):
+        self._ensure_listener()
+        subscriber = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, user_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_id, event):
+        self.broker.publish(f"{CHANNEL_PREFIX}{user_id}", json.dumps(event))
+
+
+# --- TRYB WORKERA ---
+
+# Worker asynchroniczny (gevent, async/asyncio uWSGI): otwarty strumień kosztuje greenlet,
+# a nie jeden z kilku wątków workera
+def async_worker():
+    try:
+        import uwsgi
+        options = uwsgi.opt
+    except ImportError:
+        options = {}
+    for name in ('gevent', 'async', 'asyncio'):
+        if options.get(name) or options.get(name.encode()):
+            return True
+    try:
+        from gevent import monkey
+        return monkey.is_module_patched('socket')
+    except ImportError:
+        return False
+
+# Strumień SSE: on/off albo auto - włączony tylko na workerze asynchronicznym. Na workerze
+# wątkowym (--processes 4 --threads 2) każde połączenie blokowałoby wątek do SSE_MAX_SECONDS.
+def event_stream_enabled(mode):
+    mode = (mode or 'auto').lower()
+    if mode in ('1', 'on', 'true', 'yes'):
+        return True
+    if mode in ('0', 'off', 'false', 'no'):
+        return False
+    return async_worker()
+
+
+# Hub skonfigurowany dla bieżącej aplikacji
+def get_event_hub() -> EventHub:
+    return current_app.extensions['event_hub']
+
+# Powiadomienie odbiorcy o nowej wiadomości; błąd brokera nie wpływa na wysyłkę
+def notify_new_message(receiver_id, msg_id):
+    try:
+        get_event_hub().publish(receiver_id, {"type": "new_message", "id": msg_id})
+    except Exception as e:
+        current_app.logger.error(f"Błąd publikacji zdarzenia dla user_{receiver_id}: {str(e)}")
@@ -0,0 +1,55 @@
+import hashlib
+import json
+from flask import current_app
+
+# Widoki SPA wstrzykiwane dynamicznie (templates/fragments/<nazwa>.html)
+FRAGMENT_NAMES = ('login', 'register', 'dashboard', 'inbox', 'outbox', 'send')
+
+# Czas buforowania adresów z wersją (?v=) - treść pod takim adresem nigdy się nie zmienia
+IMMUTABLE_MAX_AGE = 31536000
+
+
+def _etag(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+# Fragmenty renderowane raz przy starcie aplikacji i trzymane w pamięci wraz z ETag.
+# Szablony są statyczne, więc treść zmienia się tylko przy wdrożeniu nowej wersji.
+class FragmentCache:
+
+    def __init__(self, app):
+        self.fragments = {}
+        self.etags = {}
+        with app.app_context():
+            for name in FRAGMENT_NAMES:
+                body = app.jinja_env.get_template(f'fragments/{name}.html').render().encode('utf-8')
+                self.fragments[name] = body
+                self.etags[name] = _etag(body)
+
+        # Paczka wszystkich fragmentów - jedno żądanie przy pierwszym ładowaniu SPA
+        self.bundle = json.dumps(
+            {name: body.decode('utf-8') for name, body in self.fragments.items()},
+            separators=(',', ':'), ensure_ascii=False
+        ).encode('utf-8')
+        self.bundle_etag = _etag(self.bundle)
+
+        # Wersja zestawu fragmentów (parametr ?v= w adresach wersjonowanych)
+        self.version = self.bundle_etag[:16]
+
+    def get(self, name):
+        return self.fragments.get(name), self.etags.get(name)
+
+
+# Bufor skonfigurowany dla bieżącej aplikacji
+def get_fragment_cache() -> FragmentCache:
+    return current_app.extensions['fragment_cache']
+
+# Nagłówki buforowania: adres z bieżącą wersją - długi max-age i immutable,
+# bez wersji - rewalidacja przy każdym użyciu (ETag i 304 Not Modified)
+def cache_headers(response, etag, requested_version):
+    response.set_etag(etag)
+    if requested_version and requested_version == get_fragment_cache().version:
+        response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,141 @@
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError, VerificationError, InvalidHashError
+from flask import current_app
+
+ph = PasswordHasher()
+
+
+# Kolejka puli jest pełna lub wynik nie nadszedł w czasie - żądanie należy odrzucić (503)
+class PoolSaturated(Exception):
+    pass
+
+
+# --- FUNKCJE WYKONYWANE W PROCESACH PULI ---
+
+def _hash(password):
+    return ph.hash(password)
+
+def _verify(password_hash, password):
+    try:
+        return ph.verify(password_hash, password)
+    except (VerifyMismatchError, VerificationError, InvalidHashError):
+        return False
+
+
+# --- PULA ---
+
+# Dedykowana pula procesów dla Argon2 z ograniczoną kolejką (admission control).
+# Wątki workera uWSGI nie liczą hashy same, a przy nasyceniu żądania są
+# odrzucane natychmiast zamiast blokować pozostałe endpointy.
+class HashingPool:
+
+    def __init__(self, workers=2, max_queue=16, timeout=10.0):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+        # Liczba zadań w toku (oczekujące + wykonywane) ograniczona semaforem
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+
+        # Metryki
+        self.in_flight = 0
+        self.calls = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+        # Hash referencyjny dla nieistniejących użytkowników - weryfikowany zamiast
+        # liczenia nowego hasha, koszt czasowy taki sam jak przy prawdziwym koncie
+        self.dummy_hash = ph.hash(secrets.token_hex(16))
+
+    # Executor tworzony leniwie w każdym procesie workera (po forku uWSGI)
+    def _get_executor(self):
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    context = multiprocessing.get_context('forkserver')
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PoolSaturated()
+
+        with self._lock:
+            self.in_flight += 1
+        start = time.perf_counter()
+
+        # workers=0 - tryb bez procesów (testy, środowiska bez multiprocessing)
+        if self.workers == 0:
+            try:
+                return func(*args)
+            finally:
+                self._finish(start)
+
+        try:
+            future = self._get_executor().submit(func, *args)
+        except Exception:
+            self._finish(start)
+            raise
+        # Miejsce w kolejce zwalnia zakończenie zadania, nie powrót żądania - zadanie, na które
+        # przestano czekać, nadal zajmuje proces puli i musi się liczyć do limitu
+        future.add_done_callback(lambda _: self._finish(start))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # Zadanie jeszcze w kolejce executora jest anulowane (wywołuje callback od razu)
+            future.cancel()
+            raise PoolSaturated()
+
+    def _finish(self, start):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.in_flight -= 1
+            self.calls += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+        self._slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, password)
+
+    def verify(self, password_hash, password):
+        return self._run(_verify, password_hash, password)
+
+    # Weryfikacja względem hasha referencyjnego - wynik zawsze fałszywy
+    def verify_dummy(self, password):
+        self._run(_verify, self.dummy_hash, password)
+        return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self.in_flight,
+                "queue_limit": self.max_queue,
+                "calls": self.calls,
+                "rejected": self.rejected,
+                "avg_seconds": self.total_seconds / self.calls if self.calls else 0.0,
+                "max_seconds": self.max_seconds,
+            }
+
+    def shutdown(self):
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+
+# Pula skonfigurowana dla bieżącej aplikacji
+def get_hashing_pool() -> HashingPool:
+    return current_app.extensions['hashing_pool']
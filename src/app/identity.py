@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+import time
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import User
+from app.cache import TTLCache, MISSING, redis_client
+
+# Kanał Redis pub/sub z listą id użytkowników do usunięcia z buforów wszystkich workerów
+INVALIDATE_CHANNEL = 'identity:invalidate'
+
+
+# Lekka tożsamość sesji - tylko dane potrzebne endpointom API, bez zaszyfrowanych
+# kluczy prywatnych, hasha hasła i sekretu TOTP
+class SessionIdentity(UserMixin):
+
+    def __init__(self, id, username, pub_key_x25519, pub_key_ed25519):
+        self.id = id
+        self.username = username
+        self.pub_key_x25519 = pub_key_x25519
+        self.pub_key_ed25519 = pub_key_ed25519
+
+
+# Bufor tożsamości per worker - większość żądań API nie odpytuje tabeli user. Z Redis
+# unieważnienie (zmiana lub usunięcie konta) rozsyłane jest przez pub/sub do buforów
+# wszystkich workerów; TTL ogranicza nieaktualność, gdyby komunikat przepadł (np. przy
+# ponownym łączeniu z Redis). Bez Redis każdy worker unieważnia tylko swój bufor.
+class IdentityCache:
+
+    def __init__(self, maxsize=4096, ttl=60, redis_uri=None):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.redis = redis_client(redis_uri)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+
+    # Zwraca tożsamość użytkownika albo None, gdy konto nie istnieje
+    def load(self, user_id):
+        self._ensure_listener()
+        identity = self.cache.get(user_id)
+        if identity is not MISSING:
+            return identity
+
+        row = User.query.with_entities(
+            User.id, User.username, User.pub_key_x25519, User.pub_key_ed25519
+        ).filter(User.id == user_id).first()
+
+        # Nieistniejące konto nie jest buforowane - sesja i tak zostanie odrzucona
+        if row is None:
+            return None
+        identity = SessionIdentity(*row)
+        self.cache.set(user_id, identity)
+        return identity
+
+    def invalidate(self, *user_ids):
+        self._evict(user_ids)
+        if self.redis is not None and user_ids:
+            try:
+                self.redis.publish(INVALIDATE_CHANNEL, json.dumps(list(user_ids)))
+            except Exception as e:
+                current_app.logger.error(f"Błąd rozsyłania unieważnienia tożsamości: {str(e)}")
+
+    def _evict(self, user_ids):
+        for user_id in user_ids:
+            self.cache.delete(user_id)
+
+    # Wątek subskrypcji uruchamiany leniwie w każdym procesie workera (po forku uWSGI)
+    def _ensure_listener(self):
+        if self.redis is None:
+            return
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._thread_pid != os.getpid() or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen_forever, name='identity-invalidate', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def _listen_forever(self):
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(INVALIDATE_CHANNEL)
+                # Komunikaty sprzed (ponownej) subskrypcji mogły przepaść - bufor od nowa
+                self.cache.clear()
+                for message in pubsub.listen():
+                    try:
+                        self._evict(json.loads(message['data']))
+                    except (TypeError, ValueError):
+                        continue
+            except Exception:
+                # Utrata połączenia z Redis - ponowna subskrypcja po krótkiej przerwie
+                time.sleep(1)
+            finally:
+                pubsub.close()
+
+
+# Bufor skonfigurowany dla bieżącej aplikacji
+def get_identity_cache() -> IdentityCache:
+    return current_app.extensions['identity_cache']
+
+
+# --- UNIEWAŻNIANIE PRZY ZMIANACH W TABELI USER ---
+
+def _mark_identity_dirty(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('identity_dirty', set()).add(target.id)
+
+for _event_name in ('after_update', 'after_delete'):
+    event.listen(User, _event_name, _mark_identity_dirty)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    dirty = session.info.pop('identity_dirty', None)
+    if dirty and has_app_context() and 'identity_cache' in current_app.extensions:
+        get_identity_cache().invalidate(*dirty)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('identity_dirty', None)
@@ -0,0 +1,168 @@
+from collections import Counter
+from sqlalchemy import insert, update, bindparam, select, tuple_, event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import db, User, Message, MailboxChange, MailboxVersion, UnreadCounter
+
+# Maksymalna liczba wpisów dziennika zwracana w jednej odpowiedzi synchronizacji
+SYNC_CHANGES_LIMIT = 1000
+
+# Wersja danych użytkowników widocznych w listach (nazwy, klucze publiczne) - część ETag
+PEERS_VERSION_KEY = (0, 'peers')
+
+# Kolumny użytkownika serializowane w listach skrzynek
+PEER_FIELDS = ('username', 'pub_key_x25519', 'pub_key_ed25519')
+
+
+# INSERT ... ON CONFLICT (PostgreSQL i SQLite)
+def dialect_insert(table, connection=None):
+    bind = connection if connection is not None else db.session.get_bind()
+    return (postgresql.insert if bind.dialect.name == 'postgresql' else sqlite.insert)(table)
+
+
+# --- REJESTROWANIE ZMIAN ---
+# Wpisy dodawane są w tej samej transakcji co zmiana wiadomości
+
+# Nowa wiadomość: skrzynka odbiorcza odbiorcy i nadawcza nadawcy
+def record_added(sender_id, receiver_id, message_id):
+    record_changes([(sender_id, receiver_id, message_id)], 'added')
+
+def record_deleted(sender_id, receiver_id, message_id):
+    record_changes([(sender_id, receiver_id, message_id)], 'deleted')
+
+def record_read(sender_id, receiver_id, message_id):
+    record_changes([(sender_id, receiver_id, message_id)], 'read')
+
+# Zbiorczy zapis zmian dla listy (sender_id, receiver_id, message_id): podbicie wersji
+# skrzynek jednym upsertem, potem wpisy dziennika jednym INSERT
+def record_changes(messages, kind):
+    rows = []
+    for sender_id, receiver_id, message_id in messages:
+        rows.append({"user_id": receiver_id, "box": 'inbox', "kind": kind, "message_id": message_id})
+        rows.append({"user_id": sender_id, "box": 'outbox', "kind": kind, "message_id": message_id})
+    if not rows:
+        return
+
+    counts = Counter((row["user_id"], row["box"]) for row in rows)
+    versions = bump_versions(db.session.connection(), counts)
+    # Kolejne wersje skrzynki w kolejności wpisów (ostatni dostaje bieżącą wersję)
+    for row in reversed(rows):
+        key = (row["user_id"], row["box"])
+        row["version"] = versions[key]
+        versions[key] -= 1
+    db.session.execute(insert(MailboxChange), rows)
+
+# Podbija wersje skrzynek o podane przyrosty {(user_id, box): n}; zwraca nowe wersje.
+# Upsert blokuje wiersze do końca transakcji - równoległa zmiana tej samej skrzynki czeka
+# na zatwierdzenie, więc wersje stają się widoczne w kolejności rosnącej. Wiersze w stałym
+# porządku (user_id, box) - transakcje zmieniające kilka skrzynek nie zakleszczają się.
+def bump_versions(connection, counts):
+    table = MailboxVersion.__table__
+    statement = dialect_insert(table, connection).values([
+        {"user_id": user_id, "box": box, "version": counts[(user_id, box)]}
+        for user_id, box in sorted(counts)
+    ])
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.box],
+        set_={"version": table.c.version + statement.excluded.version}
+    ).returning(table.c.user_id, table.c.box, table.c.version)
+    return {(user_id, box): version for user_id, box, version in connection.execute(statement)}
+
+
+# --- LICZNIKI NIEPRZECZYTANYCH ---
+
+# Zmienia liczniki o podane przyrosty {user_id: delta} - jeden UPDATE (executemany)
+def adjust_unread(deltas):
+    params = [{"uid": user_id, "delta": delta} for user_id, delta in deltas.items() if delta]
+    if not params:
+        return
+    table = UnreadCounter.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.user_id == bindparam('uid'))
+        .values(unread=table.c.unread + bindparam('delta')),
+        params
+    )
+
+# Przyrosty liczników dla listy odbiorców (każde wystąpienie to jedna wiadomość)
+def unread_deltas(receiver_ids, sign=1):
+    return {user_id: sign * count for user_id, count in Counter(receiver_ids).items()}
+
+# Liczba nieprzeczytanych z licznika; brakujący licznik jest przeliczany i zapisywany.
+# ON CONFLICT DO NOTHING - równoległe żądanie mogło już utworzyć licznik.
+def unread_count(user_id):
+    counter = UnreadCounter.query.get(user_id)
+    if counter is not None:
+        return counter.unread
+
+    unread = recount_unread(user_id)
+    create_unread_counters([{"user_id": user_id, "unread": unread}])
+    db.session.commit()
+    return unread
+
+# Tworzy brakujące liczniki [{user_id, unread}]; istniejące pozostają bez zmian
+def create_unread_counters(rows):
+    if rows:
+        db.session.execute(dialect_insert(UnreadCounter.__table__).on_conflict_do_nothing(), rows)
+
+# Przeliczenie z tabeli message (skan indeksu częściowego ix_message_unread_receiver)
+def recount_unread(user_id):
+    return db.session.query(db.func.count(Message.id))\
+        .filter(Message.receiver_id == user_id, ~Message.is_read).scalar()
+
+
+# --- ODCZYT ---
+
+# Bieżąca wersja skrzynki i wersja danych użytkowników - jeden odczyt po kluczu głównym.
+# Zwraca (wersja skrzynki, wersja użytkowników).
+def mailbox_version(user_id, box):
+    rows = db.session.execute(
+        select(MailboxVersion.user_id, MailboxVersion.version)
+        .where(tuple_(MailboxVersion.user_id, MailboxVersion.box).in_([(user_id, box), PEERS_VERSION_KEY]))
+    ).all()
+    versions = {row_user_id: version for row_user_id, version in rows}
+    return versions.get(user_id, 0), versions.get(PEERS_VERSION_KEY[0], 0)
+
+# Zmiany skrzynki po kursorze since. Zwraca (zmiany, nowy kursor, czy są dalsze zmiany,
+# czy wymagana pełna synchronizacja).
+# Zmiany to słownik message_id -> zbiór rodzajów zmian w zakresie.
+def changes_since(user_id, box, since):
+    rows = db.session.query(MailboxChange.version, MailboxChange.message_id, MailboxChange.kind)\
+        .filter(MailboxChange.user_id == user_id, MailboxChange.box == box, MailboxChange.version > since)\
+        .order_by(MailboxChange.version)\
+        .limit(SYNC_CHANGES_LIMIT + 1).all()
+
+    if (not rows or rows[0][0] != since + 1) and resync_required(user_id, box, since):
+        return {}, since, False, True
+
+    has_more = len(rows) > SYNC_CHANGES_LIMIT
+    rows = rows[:SYNC_CHANGES_LIMIT]
+
+    touched = {}
+    for _, message_id, kind in rows:
+        touched.setdefault(message_id, set()).add(kind)
+
+    cursor = rows[-1][0] if rows else since
+    return touched, cursor, has_more, False
+
+# Czy zmiany po kursorze zostały już usunięte z dziennika (retencja) - klient musi wtedy
+# pobrać skrzynkę od nowa. Wersje skrzynki są kolejnymi liczbami, a retencja usuwa
+# najstarsze wpisy, więc luka zaczyna się przed najstarszym zachowanym wpisem.
+# Sprawdzane tylko, gdy pierwszy wpis po kursorze nie jest jego następnikiem.
+def resync_required(user_id, box, since):
+    oldest = db.session.query(db.func.min(MailboxChange.version))\
+        .filter(MailboxChange.user_id == user_id, MailboxChange.box == box).scalar()
+    if oldest is None:
+        # Dziennik skrzynki pusty - aktualny jest tylko kursor równy wersji skrzynki
+        return since != mailbox_version(user_id, box)[0]
+    return since + 1 < oldest
+
+
+# --- ZMIANY UŻYTKOWNIKÓW ---
+
+# Zmiana nazwy lub kluczy użytkownika zmienia treść list jego rozmówców: podbicie wersji
+# użytkowników w tej samej transakcji unieważnia ETagi wszystkich skrzynek
+@event.listens_for(User, 'after_update')
+def _bump_peers_version(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in PEER_FIELDS):
+        bump_versions(connection, {PEERS_VERSION_KEY: 1})
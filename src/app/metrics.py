@@ -0,0 +1,413 @@
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g, request, has_request_context
+from sqlalchemy import event
+from app.warmup import memory_usage
+
+# Przedziały histogramów: czas (s), rozmiar odpowiedzi (B), liczba zapytań SQL na żądanie
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 104857600)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+# Suma liczników i histogramów zakończonych workerów oraz blokada jej aktualizacji
+# (pliki w METRICS_DIR obok plików workerów)
+DEAD_TOTALS_FILE = 'dead-workers.json'
+LOCK_FILE = '.lock'
+
+
+# Rejestr metryk jednego procesu workera. Przy skonfigurowanym katalogu (METRICS_DIR) każdy
+# worker okresowo zapisuje swój stan do pliku metrics-<pid>-<start procesu>.json, a /metrics
+# sumuje pliki wszystkich workerów uWSGI. Czas startu w nazwie odróżnia nowy worker od
+# zakończonego, który miał ten sam pid. Pliki zakończonych workerów są przy eksporcie
+# doliczane do trwałej sumy (dead-workers.json) i usuwane - liczniki i histogramy w
+# Prometheusie nie maleją, a katalog nie rośnie; wskaźniki (gauge) - tylko żyjących procesów.
+# Stan zapisują żądania, wątek w tle co flush_interval (bezczynny worker) oraz atexit
+# przy zamykaniu workera - ostatnie żądania przed restartem nie przepadają.
+class Metrics:
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._definitions = {}
+        self._gauge_callbacks = {}
+        self._reset()
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self._flush_at_exit)
+
+    # Stan z procesu nadrzędnego nie jest dziedziczony po forku - inaczej byłby liczony podwójnie
+    def _reset(self):
+        self._pid = os.getpid()
+        self._start = _process_start(self._pid)
+        self._counters = {}
+        self._histograms = {}
+        self._last_flush = 0.0
+        self._flusher = None
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    # --- DEFINICJE ---
+
+    def counter(self, name, help_text):
+        self._definitions[name] = ('counter', help_text, None)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self._definitions[name] = ('histogram', help_text, tuple(buckets))
+
+    # Wskaźnik odczytywany w chwili eksportu: callback zwraca wartość dla bieżącego procesu
+    def gauge(self, name, help_text, callback):
+        self._definitions[name] = ('gauge', help_text, None)
+        self._gauge_callbacks[name] = callback
+
+    # --- ZAPIS ---
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_pid()
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        buckets = self._definitions[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_pid()
+            state = self._histograms.get(key)
+            if state is None:
+                state = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def timed(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    # --- WSPÓŁDZIELENIE MIĘDZY WORKERAMI ---
+
+    def _snapshot(self):
+        with self._lock:
+            self._check_pid()
+            counters = [[name, list(labels), value] for (name, labels), value in self._counters.items()]
+            histograms = [
+                [name, list(labels), list(state[0]), state[1], state[2]]
+                for (name, labels), state in self._histograms.items()
+            ]
+        gauges = []
+        for name, callback in self._gauge_callbacks.items():
+            try:
+                gauges.append([name, [], callback()])
+            except Exception:
+                continue
+        return {"pid": self._pid, "start": self._start, "counters": counters, "histograms": histograms,
+                "gauges": gauges}
+
+    def _filename(self):
+        return f"metrics-{self._pid}-{self._start or 0}.json"
+
+    # Wątek zapisujący stan także bez ruchu; uruchamiany leniwie w każdym procesie workera
+    # (po forku uWSGI), bo wątki procesu nadrzędnego nie przechodzą do potomnych
+    def _ensure_flusher(self):
+        with self._lock:
+            self._check_pid()
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._flush_forever, name='metrics-flush', daemon=True)
+            self._flusher.start()
+
+    def _flush_forever(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush(force=True)
+            except OSError:
+                pass
+
+    # Tylko proces, który zapisywał już stan (worker po żądaniach, nie master przed forkiem)
+    def _flush_at_exit(self):
+        if self._pid != os.getpid() or self._flusher is None:
+            return
+        try:
+            self.flush(force=True)
+        except OSError:
+            pass
+
+    # Zapis stanu procesu do katalogu współdzielonego (atomowo, nie częściej niż flush_interval)
+    def flush(self, force=False):
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = now
+        self._ensure_flusher()
+
+        with self._lock:
+            self._check_pid()
+            path = os.path.join(self.directory, self._filename())
+        # Plik tymczasowy na wątek - zapis z żądania i z wątku w tle mogą się nałożyć
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def _load_snapshots(self):
+        snapshots = [self._snapshot()]
+        if not self.directory:
+            return snapshots
+
+        own = self._filename()
+        dead = []
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith('metrics-') and filename.endswith('.json')) or filename == own:
+                continue
+            snapshot = _read_json(os.path.join(self.directory, filename))
+            if snapshot is None:
+                continue
+            if _worker_alive(snapshot['pid'], snapshot.get('start')):
+                snapshots.append(snapshot)
+            else:
+                dead.append(filename)
+
+        totals = self._fold_dead(dead) if dead else _read_json(os.path.join(self.directory, DEAD_TOTALS_FILE))
+        if totals is not None:
+            snapshots.append(totals)
+        return snapshots
+
+    # Doliczenie plików zakończonych workerów do trwałej sumy i usunięcie plików. Pod blokadą
+    # katalogu (eksport może iść równolegle w kilku workerach); nazwy doliczonych plików są
+    # zapisywane razem z sumą, więc plik nieusunięty po awarii nie zostanie doliczony drugi raz.
+    def _fold_dead(self, filenames):
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            path = os.path.join(self.directory, DEAD_TOTALS_FILE)
+            totals = _read_json(path) or {"pid": None, "counters": [], "histograms": [], "gauges": [], "folded": []}
+            folded = [name for name in totals['folded'] if os.path.exists(os.path.join(self.directory, name))]
+
+            counters, histograms = {}, {}
+            _add_snapshot(counters, histograms, totals)
+            for filename in filenames:
+                snapshot = None if filename in folded else _read_json(os.path.join(self.directory, filename))
+                if snapshot is not None:
+                    _add_snapshot(counters, histograms, snapshot)
+                    folded.append(filename)
+
+            totals = {
+                "pid": None,
+                "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+                "histograms": [[name, list(labels), *state] for (name, labels), state in histograms.items()],
+                "gauges": [],
+                "folded": folded,
+            }
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(totals, f)
+            os.replace(tmp_path, path)
+
+            for filename in folded:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except FileNotFoundError:
+                    pass
+            return totals
+
+    # --- EKSPORT ---
+
+    # Tekstowy format ekspozycji Prometheusa (0.0.4) - suma po wszystkich workerach
+    def render(self):
+        counters = {}
+        histograms = {}
+        gauges = {}
+        for snapshot in self._load_snapshots():
+            _add_snapshot(counters, histograms, snapshot)
+            for name, labels, value in snapshot['gauges']:
+                gauges[(name, (('pid', str(snapshot['pid'])),))] = value
+
+        lines = []
+        for name, (kind, help_text, buckets) in sorted(self._definitions.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            elif kind == 'gauge':
+                for (metric, labels), value in sorted(gauges.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            else:
+                for (metric, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(buckets, bucket_counts):
+                        cumulative += bucket_count
+                        bucket_labels = labels + (('le', _format_value(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+# Dodaje liczniki i histogramy zapisanego stanu do sum (klucz: nazwa i etykiety)
+def _add_snapshot(counters, histograms, snapshot):
+    for name, labels, value in snapshot['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, bucket_counts, total, count in snapshot['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        state = histograms.setdefault(key, [[0] * len(bucket_counts), 0.0, 0])
+        for i, bucket_count in enumerate(bucket_counts):
+            state[0][i] += bucket_count
+        state[1] += total
+        state[2] += count
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+# Czas startu procesu (/proc/<pid>/stat, pole 22) - odróżnia procesy o tym samym pid.
+# None poza Linuksem; wtedy o życiu workera decyduje sam pid.
+def _process_start(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return int(f.read().rsplit(')', 1)[1].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _worker_alive(pid, start):
+    if not _process_alive(pid):
+        return False
+    return start is None or _process_start(pid) == start
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels) + "}"
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return str(value)
+
+
+# Rejestr metryk bieżącej aplikacji
+def get_metrics() -> Metrics:
+    return current_app.extensions['metrics']
+
+
+# --- INSTRUMENTACJA APLIKACJI ---
+
+def init_metrics(app, engine):
+    metrics = Metrics(app.config.get('METRICS_DIR'), app.config.get('METRICS_FLUSH_SECONDS', 1.0))
+    app.extensions['metrics'] = metrics
+
+    metrics.counter('http_requests_total', 'Liczba obsłużonych żądań HTTP')
+    metrics.histogram('http_request_duration_seconds', 'Czas obsługi żądania HTTP')
+    metrics.histogram('http_response_bytes', 'Rozmiar treści odpowiedzi HTTP', BYTES_BUCKETS)
+    metrics.histogram('db_queries_per_request', 'Liczba zapytań SQL na żądanie', QUERY_COUNT_BUCKETS)
+    metrics.histogram('db_query_seconds_per_request', 'Łączny czas zapytań SQL na żądanie')
+    metrics.histogram('auth_argon2_seconds', 'Czas operacji Argon2 (z oczekiwaniem na pulę)')
+    metrics.histogram('auth_totp_seconds', 'Czas weryfikacji kodu TOTP (z odszyfrowaniem sekretu)')
+    metrics.gauge(
+        'db_pool_checked_out', 'Połączenia z bazą pobrane z puli',
+        lambda: getattr(engine.pool, 'checkedout', lambda: 0)()
+    )
+    metrics.gauge(
+        'argon2_pool_in_flight', 'Operacje Argon2 w toku lub w kolejce',
+        lambda: app.extensions['hashing_pool'].stats()['queue_depth']
+    )
+    # Pamięć workera: PSS uwzględnia strony współdzielone z masterem (preload, copy-on-write)
+    metrics.gauge(
+        'process_resident_memory_bytes', 'Pamięć rezydentna procesu (RSS)',
+        lambda: memory_usage()['rss_bytes']
+    )
+    metrics.gauge(
+        'process_proportional_memory_bytes', 'Pamięć procesu ze stronami współdzielonymi podzielonymi (PSS)',
+        lambda: memory_usage()['pss_bytes']
+    )
+
+    # Zapytania SQL liczone w kontekście żądania (g) - zdarzenia silnika, nie modele
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('metrics_query_start')
+        if not starts or not has_request_context():
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        g.metrics_queries = g.get('metrics_queries', 0) + 1
+        g.metrics_query_seconds = g.get('metrics_query_seconds', 0.0) + elapsed
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_response(response):
+        g.metrics_status = response.status_code
+        # Rozmiar znany tylko dla odpowiedzi niestrumieniowanych
+        if not response.is_streamed and response.content_length is not None:
+            g.metrics_bytes = response.content_length
+        return response
+
+    # teardown_request uruchamia się po zakończeniu strumienia (stream_with_context),
+    # więc czas i zapytania odpowiedzi strumieniowych też są uwzględnione
+    @app.teardown_request
+    def _record_request(exc):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        method = request.method
+        status = g.pop('metrics_status', 500)
+
+        metrics.inc('http_requests_total', route=route, method=method, status=str(status))
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - start, route=route, method=method)
+        if 'metrics_bytes' in g:
+            metrics.observe('http_response_bytes', g.pop('metrics_bytes'), route=route)
+        metrics.observe('db_queries_per_request', g.pop('metrics_queries', 0), route=route)
+        metrics.observe('db_query_seconds_per_request', g.pop('metrics_query_seconds', 0.0), route=route)
+
+        try:
+            metrics.flush()
+        except OSError as e:
+            app.logger.error(f"Błąd zapisu metryk: {str(e)}")
+
+    return metrics
@@ -1,3 +1,4 @@
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 
@@ -30,17 +31,95 @@ class Message(db.Model):
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
-    # Zaszyfrowana treść i załączniki (AES-GCM)
-    encrypted_payload = db.Column(db.Text, nullable=False)
+    # Zaszyfrowana treść i załączniki (AES-GCM) - binarnie w magazynie obiektów (blobstore),
+    # w wierszu tylko klucz SHA-256. Kolumna encrypted_payload przechowuje Base64 wyłącznie
+    # dla wiadomości sprzed migracji (flask migrate-blobs).
+    payload_ref = db.Column(db.String(64), nullable=True, index=True)
+
+    # Kolumny kryptograficzne są odroczone (grupa 'payload') - listy skrzynek
+    # nie pobierają ich z bazy, widoki treści ładują je jawnie przez undefer_group
+    encrypted_payload = db.deferred(db.Column(db.Text, nullable=True), group='payload')
     
     # Podpis cyfrowy (Ed25519) 
-    signature = db.Column(db.Text, nullable=False)
+    signature = db.deferred(db.Column(db.Text, nullable=False), group='payload')
     
     # Wektor inicjalizujący dla AES
-    iv = db.Column(db.Text, nullable=False)
+    iv = db.deferred(db.Column(db.Text, nullable=False), group='payload')
 
-    # Znacznik czasu wiadomości
-    timestamp = db.Column(db.DateTime, server_default=db.func.now())
+    # Rozmiar zaszyfrowanej paczki w bajtach - zapisywany przy wysyłce na potrzeby list metadanych
+    payload_size = db.Column(db.Integer, nullable=False, default=0)
+
+    # Znacznik czasu wiadomości - ustawiany po stronie aplikacji, żeby zapisany format był
+    # zgodny z wartością kursora (SQLite porównuje daty jako tekst, a CURRENT_TIMESTAMP nie
+    # ma mikrosekund); server_default zostaje dla wstawień z pominięciem ORM
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.now, server_default=db.func.now())
 
     # Flaga oznaczenia wiadomości jako przeczytaną
-    is_read = db.Column(db.Boolean, default=False)
\ No newline at end of file
+    is_read = db.Column(db.Boolean, default=False)
+
+    # Indeksy złożone pod paginację kursorową (timestamp, id) - każda strona
+    # skrzynki to skan zakresu indeksu zamiast sortowania całej skrzynki
+    __table_args__ = (
+        db.Index('ix_message_receiver_ts_id', 'receiver_id', 'timestamp', 'id'),
+        db.Index('ix_message_sender_ts_id', 'sender_id', 'timestamp', 'id'),
+        # Retencja wybiera najstarsze wiadomości po czasie; BRIN jest mały, bo wiersze
+        # trafiają do tabeli w kolejności timestamp (SQLite tworzy zwykły indeks)
+        db.Index('ix_message_timestamp', 'timestamp', postgresql_using='brin'),
+        # Indeks częściowy tylko nieprzeczytanych - tani przelicznik liczników
+        db.Index('ix_message_unread_receiver', 'receiver_id',
+                 postgresql_where=db.text('NOT is_read'), sqlite_where=db.text('NOT is_read')),
+    )
+
+class PendingUpload(db.Model):
+
+    # Wysyłka porcjowana w toku - wiadomość powstaje dopiero po złożeniu wszystkich porcji
+    id = db.Column(db.String(32), primary_key=True)
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    # Metadane kryptograficzne przyszłej wiadomości
+    signature = db.Column(db.Text, nullable=False)
+    iv = db.Column(db.Text, nullable=False)
+
+    # Podział pliku na porcje o stałym rozmiarze (ostatnia może być krótsza)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    chunk_count = db.Column(db.Integer, nullable=False)
+
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+class UnreadCounter(db.Model):
+
+    # Utrzymywana liczba nieprzeczytanych wiadomości - odczyt O(1) dla plakietki.
+    # Aktualizowana w tej samej transakcji co zmiany wiadomości (app.mailbox.adjust_unread).
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    unread = db.Column(db.Integer, nullable=False, default=0)
+
+class MailboxVersion(db.Model):
+
+    # Bieżąca wersja skrzynki (ETag, kursor since). Podbijana w transakcji zmiany pod blokadą
+    # wiersza (app.mailbox.record_changes), więc wersje jednej skrzynki widoczne są w kolejności
+    # zatwierdzania transakcji. Wiersz (0, 'peers') to wersja danych użytkowników w listach.
+    user_id = db.Column(db.Integer, primary_key=True)
+    box = db.Column(db.String(8), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+class MailboxChange(db.Model):
+
+    # Dziennik zmian skrzynek. Kursorem synchronizacji przyrostowej (since) jest wersja
+    # skrzynki z chwili zmiany - id rośnie w kolejności wstawiania, nie zatwierdzania
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+
+    # Skrzynka ('inbox' / 'outbox') i rodzaj zmiany ('added' / 'deleted' / 'read')
+    box = db.Column(db.String(8), nullable=False)
+    kind = db.Column(db.String(8), nullable=False)
+    message_id = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.BigInteger, nullable=False)
+
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    # Zmiany po kursorze to skan zakresu tego indeksu
+    __table_args__ = (
+        db.Index('ix_mailbox_change_user_box_version', 'user_id', 'box', 'version'),
+    )
\ No newline at end of file
@@ -0,0 +1,258 @@
+import atexit
+import os
+import threading
+import time
+import redis
+from limits.storage import Storage
+
+# Prefiks kluczy jak w RedisStorage z biblioteki limits - liczniki obu magazynów są zgodne
+KEY_PREFIX = 'LIMITS'
+
+# Atomowe zwiększenie licznika okna: czas życia ustawiany przez tego, kto klucz założył
+# (wynik równy przyrostowi), oraz naprawiany, gdyby klucz go nie miał
+INCR_EXPIRE_SCRIPT = """
+local count = redis.call('INCRBY', KEYS[1], ARGV[1])
+local ttl = redis.call('PTTL', KEYS[1])
+if count == tonumber(ARGV[1]) or ttl < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    ttl = tonumber(ARGV[2]) * 1000
+end
+return {count, ttl}
+"""
+
+
+# Licznik okna jednego limitu w pamięci workera
+class _Bucket:
+    __slots__ = ('limit', 'allowance', 'expiry', 'synced', 'pending', 'in_flight', 'synced_at', 'expires_at')
+
+    def __init__(self, limit, allowance, expiry):
+        self.limit = limit
+        self.allowance = allowance
+        self.expiry = expiry
+        self.synced = 0         # wartość licznika w Redis przy ostatniej synchronizacji
+        self.pending = 0        # trafienia policzone lokalnie, jeszcze niewysłane
+        self.in_flight = 0      # trafienia wysyłane właśnie do Redis
+        self.synced_at = 0.0
+        self.expires_at = 0.0   # koniec okna (czas uniksowy, jak get_expiry)
+
+    def estimate(self):
+        return self.synced + self.in_flight + self.pending
+
+
+# Limit zapisany w kluczu przez limits: .../<liczba>/<krotność>/<jednostka>
+def _limit_from_key(key):
+    try:
+        return int(key.rsplit('/', 3)[-3])
+    except (ValueError, IndexError):
+        return None
+
+
+# Magazyn limitów hybrydowy (schemat hybrid+redis://): worker decyduje lokalnie, dopóki licznik
+# jest daleko od limitu, a trafienia wysyła do Redis zbiorczo - jednym potokiem dla wszystkich
+# zmienionych kluczy. Zapytanie do Redis wypada średnio raz na `allowance` żądań danego limitu.
+#
+# allowance = floor(limit * overshoot): tyle trafień worker może przyjąć bez synchronizacji.
+# Inne workery ich nie widzą, więc w skrajnym przypadku okno przepuści do
+# (liczba workerów * allowance) żądań ponad limit. Limity z allowance < 1 (przy overshoot=0.02
+# wszystkie poniżej 50 na minutę) są zawsze liczone w Redis, dokładnie. Po przekroczeniu limitu
+# odrzucenia do końca okna zapadają lokalnie - licznik okna stałego nie maleje.
+#
+# Zysk zależy od ruchu (python -m benchmarks ratelimit). Serie żądań jednego klienta schodzą
+# do ok. 0,05 round tripu na żądanie dla limitów domyślnych, 600 i 120 na minutę. Przy ruchu
+# równomiernym klient wraca do workera rzadziej niż co sync_interval: limity domyślne nie
+# zyskują nic, 120 na minutę ok. 45%, a 600 na minutę ok. 90% round tripów.
+#
+# Zaległe trafienia wysyła też wątek w tle co sync_interval oraz atexit przy zamykaniu workera.
+class HybridRedisStorage(Storage):
+
+    STORAGE_SCHEME = ['hybrid+redis', 'hybrid+rediss']
+
+    def __init__(self, uri, wrap_exceptions=False, overshoot=0.02, sync_interval=1.0,
+                 max_batch=64, client=None, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions)
+        self.client = client if client is not None else redis.Redis.from_url(uri.split('+', 1)[1], **options)
+        self.overshoot = float(overshoot)
+        self.sync_interval = float(sync_interval)
+        self.max_batch = int(max_batch)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._pruned_at = 0.0
+        self._flusher = None
+        self._incr_expire = self.client.register_script(INCR_EXPIRE_SCRIPT)
+        self.round_trips = 0
+        self.local_hits = 0
+        atexit.register(self._flush_at_exit)
+
+    @property
+    def base_exceptions(self):
+        return redis.RedisError
+
+    def _redis_key(self, key):
+        return f"{KEY_PREFIX}:{key}"
+
+    # Liczniki sprzed fork() należą do procesu nadrzędnego
+    def _check_pid(self):
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._buckets = {}
+            self._lock = threading.Lock()
+            self._flusher = None
+
+    # Wątek wysyłający zaległe trafienia kluczy, na które nie przychodzą już żądania;
+    # uruchamiany leniwie w każdym procesie workera (po forku uWSGI)
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_forever, name='ratelimit-flush', daemon=True)
+            self._flusher.start()
+
+    def _flush_forever(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.sync_interval)
+            try:
+                self.flush()
+            except Exception:
+                # Redis niedostępny - trafienia zostają w kolejce do następnej próby
+                pass
+
+    def _flush_at_exit(self):
+        if self._pid != os.getpid():
+            return
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+    # Decyzja bez Redis: limit już przekroczony (odrzucenie pewne) albo zapas większy
+    # niż lokalny przydział, przydział niewyczerpany i stan niezbyt stary
+    def _decide_locally(self, bucket, amount, now):
+        if bucket.synced >= bucket.limit:
+            return True
+        return (bucket.pending + amount <= bucket.allowance
+                and bucket.estimate() + amount <= bucket.limit - bucket.allowance
+                and now - bucket.synced_at < self.sync_interval)
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        with self._lock:
+            self._check_pid()
+            bucket = self._buckets.get(key)
+            if bucket is not None and bucket.expires_at <= now:
+                bucket = None
+            if bucket is not None and self._decide_locally(bucket, amount, now):
+                bucket.pending += amount
+                self.local_hits += 1
+                self._ensure_flusher()
+                return bucket.estimate()
+
+            if bucket is None:
+                limit = _limit_from_key(key)
+                allowance = int(limit * self.overshoot) if limit else 0
+                bucket = self._buckets[key] = _Bucket(limit or 0, allowance, expiry)
+            bucket.pending += amount
+
+        self._sync(key)
+        with self._lock:
+            return bucket.estimate()
+
+    # Wysłanie zaległych trafień: klucz wymuszony i do max_batch innych zmienionych kluczy
+    # w jednym potoku, każdy klucz jednym wywołaniem INCR_EXPIRE_SCRIPT.
+    def _sync(self, key=None):
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            batch = []
+            if key is not None and key in self._buckets:
+                batch.append((key, self._buckets[key]))
+            for other, bucket in self._buckets.items():
+                if len(batch) >= self.max_batch:
+                    break
+                if other != key and bucket.pending and bucket.expires_at > now:
+                    batch.append((other, bucket))
+            if not batch:
+                return 0
+            deltas = []
+            for _, bucket in batch:
+                deltas.append(bucket.pending)
+                bucket.in_flight += bucket.pending
+                bucket.pending = 0
+
+        pipe = self.client.pipeline(transaction=False)
+        for (name, bucket), delta in zip(batch, deltas):
+            self._incr_expire(keys=[self._redis_key(name)], args=[delta, bucket.expiry], client=pipe)
+        try:
+            results = pipe.execute()
+        except Exception:
+            with self._lock:
+                for (_, bucket), delta in zip(batch, deltas):
+                    bucket.in_flight -= delta
+                    bucket.pending += delta
+            raise
+
+        now = time.time()
+        with self._lock:
+            self.round_trips += 1
+            for (_, bucket), delta, (count, ttl) in zip(batch, deltas, results):
+                bucket.in_flight -= delta
+                bucket.synced = int(count)
+                bucket.synced_at = now
+                bucket.expires_at = now + (ttl / 1000 if ttl and ttl > 0 else bucket.expiry)
+        return len(batch)
+
+    # Usuwanie zakończonych okien (niewysłane trafienia przepadają razem z oknem w Redis)
+    def _prune(self, now):
+        if now - self._pruned_at < self.sync_interval:
+            return
+        self._pruned_at = now
+        expired = [name for name, bucket in self._buckets.items()
+                   if 0 < bucket.expires_at <= now and not bucket.in_flight]
+        for name in expired:
+            del self._buckets[name]
+
+    # Wysłanie wszystkich zaległych trafień
+    def flush(self):
+        while self._sync():
+            pass
+
+    def get(self, key):
+        with self._lock:
+            self._check_pid()
+            bucket = self._buckets.get(key)
+            if bucket is not None and bucket.expires_at > time.time():
+                return bucket.estimate()
+        return int(self.client.get(self._redis_key(key)) or 0)
+
+    def get_expiry(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None and bucket.expires_at > time.time():
+                return bucket.expires_at
+        ttl = self.client.pttl(self._redis_key(key))
+        return time.time() + max(ttl, 0) / 1000
+
+    def check(self):
+        try:
+            return bool(self.client.ping())
+        except redis.RedisError:
+            return False
+
+    def reset(self):
+        with self._lock:
+            self._buckets = {}
+        removed = 0
+        batch = []
+        for name in self.client.scan_iter(match=f"{KEY_PREFIX}:*", count=1000):
+            batch.append(name)
+            if len(batch) >= 1000:
+                removed += self.client.delete(*batch)
+                batch = []
+        if batch:
+            removed += self.client.delete(*batch)
+        return removed
+
+    def clear(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+        self.client.delete(self._redis_key(key))
@@ -0,0 +1,246 @@
+import time
+from datetime import datetime
+from sqlalchemy import delete, select, text
+from app.models import db, Message, MailboxChange
+from app.blobstore import release_blobs
+from app.mailbox import record_changes, adjust_unread, unread_deltas
+
+# Nazwy partycji miesięcznych: message_pRRRRMM; partycja domyślna łapie wiersze spoza zakresów
+PARTITION_PREFIX = 'message_p'
+DEFAULT_PARTITION = 'message_pdefault'
+
+# Tabela message partycjonowana zakresami po timestamp (PostgreSQL). Klucz główny musi zawierać
+# kolumnę partycjonującą; dla ORM identyfikatorem nadal jest samo id (unikalne z sekwencji).
+PARTITIONED_MESSAGE_DDL = """
+CREATE TABLE message (
+    id SERIAL NOT NULL,
+    sender_id INTEGER NOT NULL REFERENCES "user" (id),
+    receiver_id INTEGER NOT NULL REFERENCES "user" (id),
+    payload_ref VARCHAR(64),
+    encrypted_payload TEXT,
+    signature TEXT NOT NULL,
+    iv TEXT NOT NULL,
+    payload_size INTEGER NOT NULL DEFAULT 0,
+    "timestamp" TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now(),
+    is_read BOOLEAN,
+    PRIMARY KEY (id, "timestamp")
+) PARTITION BY RANGE ("timestamp")
+"""
+
+
+# --- PARTYCJE ---
+
+def _month_start(value):
+    return datetime(value.year, value.month, 1)
+
+def _add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+# Czy tabela message jest partycjonowana (relkind 'p' w katalogu PostgreSQL)
+def is_partitioned(connection):
+    if connection.dialect.name != 'postgresql':
+        return False
+    relkind = connection.execute(text("SELECT relkind FROM pg_class WHERE relname = 'message'")).scalar()
+    return relkind == 'p'
+
+# Partycje miesięczne od miesiąca `start` do `months_ahead` miesięcy w przód (idempotentnie)
+def ensure_partitions(connection, start=None, months_ahead=3):
+    month = _month_start(start or datetime.now())
+    last = _add_months(_month_start(datetime.now()), months_ahead)
+    created = []
+    while month <= last:
+        name = partition_name(month)
+        exists = connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+        if exists is None:
+            connection.execute(text(
+                f"CREATE TABLE {name} PARTITION OF message "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')"
+            ))
+            created.append(name)
+        month = _add_months(month, 1)
+    return created
+
+# Schemat z partycjonowaną tabelą message: pozostałe tabele z modeli, message z DDL,
+# indeksy modelu zakładane na tabeli nadrzędnej (dziedziczą je wszystkie partycje).
+# Wykonywany na połączeniu wywołującego - w jednej transakcji z resztą inicjalizacji schematu.
+def create_partitioned_schema(connection, months_back=1, months_ahead=3):
+    others = [table for table in db.metadata.sorted_tables if table is not Message.__table__]
+    db.metadata.create_all(connection, tables=others)
+
+    if connection.execute(text("SELECT to_regclass('message')")).scalar() is not None:
+        return []
+    connection.execute(text(PARTITIONED_MESSAGE_DDL))
+    for index in Message.__table__.indexes:
+        index.create(connection)
+    connection.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF message DEFAULT"))
+    return ensure_partitions(connection, _add_months(_month_start(datetime.now()), -months_back), months_ahead)
+
+# Partycje miesięczne w całości starsze niż cutoff (górna granica <= cutoff), od najstarszej
+def expired_partitions(connection, cutoff):
+    rows = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'message' AND c.relname LIKE :pattern ORDER BY c.relname"
+    ), {"pattern": PARTITION_PREFIX + '%'}).scalars()
+
+    expired = []
+    for name in rows:
+        suffix = name[len(PARTITION_PREFIX):]
+        if not suffix.isdigit() or len(suffix) != 6:
+            continue
+        upper = _add_months(datetime(int(suffix[:4]), int(suffix[4:]), 1), 1)
+        if upper <= cutoff:
+            expired.append(name)
+    return expired
+
+
+# --- RETENCJA ---
+
+# Odłączenie (DETACH) i usunięcie całej partycji. Skutki uboczne jak przy usuwaniu wiadomości:
+# wpisy 'deleted' w dzienniku zmian, korekta liczników nieprzeczytanych i zwolnienie paczek -
+# wszystko operacjami zbiorowymi na odłączonej tabeli. Bez drop partycja zostaje jako osobna
+# tabela archiwalna razem z paczkami w magazynie.
+def purge_partition(name, drop=True):
+    session = db.session
+    session.execute(text(f"ALTER TABLE message DETACH PARTITION {name}"))
+
+    stats = session.execute(text(
+        f"SELECT count(*), coalesce(sum(payload_size), 0), pg_total_relation_size('{name}') FROM {name}"
+    )).one()
+
+    # Wersje skrzynek podbijane upsertem jak w record_changes (blokady w porządku user_id, box);
+    # wpisy skrzynki dostają kolejne wersje kończące się nową wersją skrzynki
+    session.execute(text(
+        "WITH changes AS ("
+        f"SELECT receiver_id AS user_id, 'inbox' AS box, id FROM {name} "
+        "UNION ALL "
+        f"SELECT sender_id, 'outbox', id FROM {name}"
+        "), bumped AS ("
+        "INSERT INTO mailbox_version (user_id, box, version) "
+        "SELECT user_id, box, count(*) FROM changes GROUP BY user_id, box ORDER BY user_id, box "
+        "ON CONFLICT (user_id, box) DO UPDATE SET version = mailbox_version.version + excluded.version "
+        "RETURNING user_id, box, version"
+        ") "
+        "INSERT INTO mailbox_change (user_id, box, kind, message_id, version, created_at) "
+        "SELECT c.user_id, c.box, 'deleted', c.id, b.version - count(*) OVER (PARTITION BY c.user_id, c.box) "
+        "+ row_number() OVER (PARTITION BY c.user_id, c.box ORDER BY c.id), now() "
+        "FROM changes c JOIN bumped b ON b.user_id = c.user_id AND b.box = c.box"
+    ))
+
+    unread = session.execute(text(
+        f"SELECT receiver_id, count(*) FROM {name} WHERE NOT is_read GROUP BY receiver_id"
+    )).all()
+    adjust_unread({receiver_id: -count for receiver_id, count in unread})
+
+    payload_refs = session.execute(text(
+        f"SELECT DISTINCT payload_ref FROM {name} WHERE payload_ref IS NOT NULL"
+    )).scalars().all()
+
+    if drop:
+        session.execute(text(f"DROP TABLE {name}"))
+    session.commit()
+
+    # Odwołania sprawdzane już bez odłączonej partycji
+    released = 0
+    if drop:
+        for start in range(0, len(payload_refs), 1000):
+            released += release_blobs(payload_refs[start:start + 1000])
+
+    return {"rows": stats[0], "payload_bytes": int(stats[1]), "table_bytes": int(stats[2]) if drop else 0,
+            "blobs_released": released}
+
+# Usuwanie wiadomości starszych niż cutoff małymi partiami (osobna transakcja na partię)
+def purge_batch(cutoff, batch_size):
+    expired_ids = select(Message.id).where(Message.timestamp < cutoff).limit(batch_size)
+    rows = db.session.execute(
+        # Warunek na timestamp także w DELETE - przy partycjonowaniu ogranicza skan do starych partycji
+        delete(Message).where(Message.id.in_(expired_ids), Message.timestamp < cutoff)
+        .returning(Message.id, Message.sender_id, Message.receiver_id, Message.is_read,
+                   Message.payload_ref, Message.payload_size)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not rows:
+        return None
+
+    record_changes([(row.sender_id, row.receiver_id, row.id) for row in rows], 'deleted')
+    adjust_unread(unread_deltas([row.receiver_id for row in rows if not row.is_read], sign=-1))
+    db.session.commit()
+
+    return {
+        "rows": len(rows),
+        "payload_bytes": sum(row.payload_size or 0 for row in rows),
+        "table_bytes": 0,
+        "blobs_released": release_blobs([row.payload_ref for row in rows]),
+    }
+
+# Kompaktowanie dziennika zmian skrzynek: usunięcie partii wpisów starszych niż cutoff
+# (najstarsze wpisy po kluczu głównym). Klient z kursorem sprzed usuniętych wpisów dostaje
+# przy synchronizacji odpowiedź "reset" i pobiera skrzynkę od nowa. Zwraca liczbę usuniętych.
+def purge_changes(cutoff, batch_size):
+    expired_ids = select(MailboxChange.id).where(MailboxChange.created_at < cutoff)\
+        .order_by(MailboxChange.id).limit(batch_size)
+    result = db.session.execute(
+        delete(MailboxChange).where(MailboxChange.id.in_(expired_ids))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+# Podgląd bez zmian: liczba i rozmiar wiadomości do usunięcia, wpisy dziennika zmian
+# do kompaktowania oraz wygasłe partycje
+def retention_preview(cutoff):
+    rows, payload_bytes = db.session.query(
+        db.func.count(Message.id), db.func.coalesce(db.func.sum(Message.payload_size), 0)
+    ).filter(Message.timestamp < cutoff).one()
+    changes = db.session.query(db.func.count(MailboxChange.id)).filter(MailboxChange.created_at < cutoff).scalar()
+    connection = db.session.connection()
+    partitions = expired_partitions(connection, cutoff) if is_partitioned(connection) else []
+    return {"rows": rows, "payload_bytes": int(payload_bytes), "changes": changes, "partitions": partitions}
+
+# Pełny przebieg retencji: najpierw całe wygasłe partycje, potem pozostałe wiersze partiami,
+# na końcu dziennik zmian skrzynek. Zwraca zsumowany raport
+# {rows, payload_bytes, table_bytes, blobs_released, changes, partitions}.
+def enforce_retention(cutoff, batch_size=1000, pause=0.0, drop=True, progress=None):
+    report = {"rows": 0, "payload_bytes": 0, "table_bytes": 0, "blobs_released": 0, "changes": 0, "partitions": []}
+
+    def merge(part):
+        for key in ('rows', 'payload_bytes', 'table_bytes', 'blobs_released'):
+            report[key] += part[key]
+
+    if is_partitioned(db.session.connection()):
+        names = expired_partitions(db.session.connection(), cutoff)
+        db.session.commit()
+        for name in names:
+            part = purge_partition(name, drop=drop)
+            merge(part)
+            report["partitions"].append(name)
+            if progress:
+                progress(f"Partycja {name}: {part['rows']} wiadomości")
+
+    while True:
+        part = purge_batch(cutoff, batch_size)
+        if part is None:
+            break
+        merge(part)
+        if progress:
+            progress(f"Usunięto {report['rows']} wiadomości...")
+        if pause:
+            time.sleep(pause)
+
+    # Wpisy 'deleted' dodane powyżej są nowsze niż cutoff - zostają dla synchronizujących się klientów
+    while True:
+        removed = purge_changes(cutoff, batch_size)
+        report["changes"] += removed
+        if removed < batch_size:
+            break
+        if progress:
+            progress(f"Usunięto {report['changes']} wpisów dziennika zmian...")
+        if pause:
+            time.sleep(pause)
+
+    return report
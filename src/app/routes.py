@@ -1,13 +1,279 @@
 import hashlib
-from app.models import db, User, Message
-from flask import request, jsonify, render_template, session
+import os
+import queue
+import secrets
+import time
+from app.models import db, User, Message, PendingUpload, UnreadCounter
+import base64
+from flask import request, jsonify, render_template, session, current_app, Response, stream_with_context, send_file, url_for
 from flask_login import login_user, login_required, current_user, logout_user
-from argon2 import PasswordHasher
-from argon2.exceptions import VerifyMismatchError
+from datetime import datetime
+from sqlalchemy import tuple_, insert, update, delete, exists, or_, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 import pyotp
 from app import utils
+from app.blobstore import get_blob_store, payload_base64, payload_bytes, release_blob, release_blobs, BlobTooLarge
+from app.hashing import get_hashing_pool, PoolSaturated
+from app.database import pool_status
+from app.metrics import get_metrics
+from app.warmup import memory_usage
+from app.fragments import get_fragment_cache, cache_headers, FRAGMENT_NAMES
+from app import wire
+from app.directory import get_key_directory
+from app.identity import get_identity_cache
+from app.events import get_event_hub, notify_new_message
+from app.mailbox import mailbox_version, changes_since, record_added, record_deleted, record_read, record_changes, adjust_unread, unread_deltas, unread_count
+from app.uploads import get_chunk_staging, assemble_upload, expected_chunk_size, chunk_count_for, ChunkSizeMismatch
 
-ph = PasswordHasher()
+# Limit surowego szyfrogramu - odpowiednik 1 000 000 znaków Base64 w API JSON
+MAX_PAYLOAD_BYTES = 750000
+# Paczki większe nie są osadzane w listach i odpowiedzi wiadomości (Base64 całej treści
+# w pamięci workera) - klient pobiera je osobno z /api/messages/<id>/payload
+INLINE_PAYLOAD_MAX_BYTES = 65536
+
+# Wysyłka porcjowana dużych załączników: stały rozmiar porcji i limit całości
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+MAX_UPLOAD_BYTES = 100 * 1024 * 1024
+
+# Endpointy o treści wspólnej dla wszystkich użytkowników (buforowane przez przeglądarkę)
+PUBLIC_CACHEABLE_ENDPOINTS = {'get_fragment', 'get_fragment_bundle'}
+
+# Wysyłka zbiorcza: liczba wiadomości i łączny rozmiar paczek (znaki Base64) w jednym żądaniu
+SEND_BATCH_LIMIT = 50
+SEND_BATCH_MAX_CHARS = 10000000
+
+# Strumień SSE: odstęp komentarzy podtrzymujących, maksymalny czas połączenia, opóźnienie wznowienia
+SSE_HEARTBEAT_SECONDS = 15
+SSE_MAX_SECONDS = 300
+SSE_RETRY_MS = 3000
+
+# Operacje zbiorcze: maksymalna liczba wiadomości na jedno żądanie
+BULK_LIMIT = 1000
+
+# Maksymalna liczba nazw w jednym zapytaniu o klucze publiczne
+PUBLIC_KEYS_BATCH_LIMIT = 50
+
+# Rozmiar porcji wierszy pobieranej z kursora serwerowego w trybie strumieniowym
+STREAM_BATCH_SIZE = 100
+
+# Zawęża zapytanie skrzynki do wierszy starszych niż kursor i ustala stabilny porządek.
+# Zwraca None przy niepoprawnym kursorze.
+def order_mailbox(query, cursor):
+    if cursor:
+        position = utils.decode_cursor(cursor)
+        if position is None:
+            return None
+        query = query.filter(tuple_(Message.timestamp, Message.id) < tuple_(*position))
+
+    # Stabilny porządek - id rozstrzyga remisy znaczników czasu
+    return query.order_by(Message.timestamp.desc(), Message.id.desc())
+
+# Nakłada paginację kursorową (timestamp, id) na zapytanie skrzynki.
+# Zwraca (wiersze strony, kursor następnej strony lub None) albo None przy złych parametrach.
+def paginate_mailbox(query, args):
+    limit = utils.parse_page_limit(args.get('limit'))
+    if limit is None:
+        return None
+
+    query = order_mailbox(query, args.get('cursor'))
+    if query is None:
+        return None
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        next_cursor = utils.encode_cursor(last.timestamp, last.id)
+    return rows, next_cursor
+
+# Strumieniowo serializuje wyniki zapytania do tablicy JSON zgodnej bajtowo z jsonify.
+# Wiersze czytane są kursorem serwerowym (yield_per), więc w pamięci jest najwyżej jedna porcja.
+def stream_json_array(query, serialize):
+    def generate():
+        yield "["
+        separator = ""
+        for row in query.yield_per(STREAM_BATCH_SIZE):
+            yield separator + current_app.json.dumps(serialize(row), separators=(",", ":"))
+            separator = ","
+        yield "]\n"
+
+    return Response(stream_with_context(generate()), mimetype=current_app.json.mimetype)
+
+# Buduje odpowiedź skrzynki: zmiany od kursora (?since=), strumień (?stream=1)
+# lub stronę z kursorem w X-Next-Cursor. Wersja skrzynki i wersja danych użytkowników
+# (nazwy, klucze rozmówców) służą jako ETag - niezmieniona skrzynka kosztuje 304 bez
+# zapytania o wiadomości.
+# Z serializatorem compact(row, keys) odpowiedź może być w CBOR (Accept: application/cbor).
+def mailbox_response(query, serialize, user_id, box, compact=None):
+    fmt = wire.wire_format() if compact is not None else 'json'
+    version, peers_version = mailbox_version(user_id, box)
+    query_hash = hashlib.sha256(request.query_string).hexdigest()[:16]
+    etag = f"{box}-{version}.{peers_version}-{query_hash}-{fmt}"
+
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = build_mailbox_body(query, serialize, user_id, box, compact if fmt == 'cbor' else None)
+        if response.status_code != 200:
+            return response
+
+    if compact is not None:
+        response.vary.add('Accept')
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['X-Sync-Cursor'] = str(version)
+    return response
+
+def build_mailbox_body(query, serialize, user_id, box, compact=None):
+    # Format binarny: wiersze odwołują się do wspólnej tablicy kluczy odpowiedzi
+    keys = None
+    if compact is not None:
+        keys = wire.KeyTable()
+        serialize = lambda row: compact(row, keys)
+
+    since = request.args.get('since')
+    if since is not None:
+        if not since.isdigit():
+            return error_response("Niepoprawny kursor synchronizacji", 400)
+        return sync_response(query, serialize, user_id, box, int(since), keys)
+
+    if request.args.get('stream') == '1':
+        if keys is not None:
+            return error_response("Strumień dostępny tylko w formacie JSON", 406)
+        query = order_mailbox(query, request.args.get('cursor'))
+        if query is None:
+            return error_response("Niepoprawne parametry paginacji", 400)
+        return stream_json_array(query, serialize)
+
+    page = paginate_mailbox(query, request.args)
+    if page is None:
+        return error_response("Niepoprawne parametry paginacji", 400)
+    messages, next_cursor = page
+
+    entries = [serialize(row) for row in messages]
+    if keys is None:
+        response = jsonify(entries)
+    else:
+        response = wire.cbor_response({"keys": keys.keys, "messages": entries})
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+# Synchronizacja przyrostowa: wiadomości dodane, usunięte i ze zmienionym statusem od kursora
+def sync_response(query, serialize, user_id, box, since, keys=None):
+    touched, cursor, has_more, reset = changes_since(user_id, box, since)
+
+    current = {}
+    if touched:
+        for row in query.filter(Message.id.in_(list(touched))).all():
+            current[row[0].id] = row
+
+    added, updated, deleted = [], [], []
+    for message_id, kinds in touched.items():
+        row = current.get(message_id)
+        if row is None:
+            # Wiadomość dodana i usunięta w tym samym zakresie - klient jej nie zna
+            if 'added' not in kinds:
+                deleted.append(message_id)
+        elif 'added' in kinds:
+            added.append(serialize(row))
+        else:
+            updated.append({"id": message_id, "is_read": row[0].is_read})
+
+    body = {
+        "added": added,
+        "updated": updated,
+        "deleted": deleted,
+        "cursor": str(cursor),
+        "has_more": has_more,
+        # Zmiany po kursorze usunięte przez retencję - klient pobiera skrzynkę od nowa
+        "reset": reset
+    }
+    if keys is None:
+        return jsonify(body)
+    body["keys"] = keys.keys
+    return wire.cbor_response(body)
+
+# Warunek WHERE operacji zbiorczej: lista ids lub filtr {is_read, older_than}. Wszystkie
+# warunki (także przekazane w owner_condition) trafiają do podzapytania z LIMIT, więc partia
+# obejmuje tylko wiersze, które operacja faktycznie zmieni.
+# Zwraca (warunek, pełny warunek filtra bez limitu lub None dla listy ids) albo (None, komunikat błędu).
+def bulk_condition(data, owner_condition):
+    ids = data.get('ids')
+    if ids is not None:
+        if not isinstance(ids, list) or not (1 <= len(ids) <= BULK_LIMIT) or not all(isinstance(i, int) for i in ids):
+            return None, "Niepoprawna lista wiadomości"
+        return (owner_condition & Message.id.in_(ids)), None
+
+    criteria = data.get('filter')
+    if not isinstance(criteria, dict) or not criteria:
+        return None, "Brak listy wiadomości lub filtra"
+
+    condition = owner_condition
+    if 'is_read' in criteria:
+        if not isinstance(criteria['is_read'], bool):
+            return None, "Niepoprawny filtr"
+        condition = condition & (Message.is_read == criteria['is_read'])
+    if 'older_than' in criteria:
+        try:
+            older_than = datetime.fromisoformat(str(criteria['older_than']))
+        except ValueError:
+            return None, "Niepoprawny filtr"
+        condition = condition & (Message.timestamp < older_than)
+
+    # Filtr ograniczony do BULK_LIMIT wierszy na żądanie (klient powtarza przy has_more)
+    limited_ids = db.session.query(Message.id).filter(condition).order_by(Message.id).limit(BULK_LIMIT)
+    return Message.id.in_(limited_ids.scalar_subquery()), condition
+
+# Czy po pełnej partii filtra zostały jeszcze pasujące wiersze (klient powtarza żądanie)
+def bulk_has_more(remaining, processed):
+    if remaining is None or processed < BULK_LIMIT:
+        return False
+    return db.session.query(exists().where(remaining)).scalar()
+
+def error_response(message, status):
+    response = jsonify({"error": message})
+    response.status_code = status
+    return response
+
+# Walidacja pojedynczej wiadomości w formacie JSON; zwraca komunikat błędu lub None
+def message_fields_error(item):
+    if not isinstance(item, dict):
+        return "Błąd paczki danych"
+    if not isinstance(item.get('receiver_id'), int):
+        return "Niepoprawny odbiorca"
+    if not isinstance(item.get('encrypted_payload'), str) or not (1 <= len(item['encrypted_payload']) <= 1000000):
+        return "Błąd paczki danych"
+    if not utils.validate_base64(item.get('iv'), (16, 32)) or not utils.validate_base64(item.get('signature'), (64, 128)):
+        return "Błąd paczki danych"
+    return None
+
+# Odpowiedź przy nasyconej puli Argon2 - klient ponawia po Retry-After
+def overloaded_response():
+    current_app.logger.warning(f"Pula Argon2 nasycona: {get_hashing_pool().stats()}")
+    response = jsonify({"error": "Serwer jest przeciążony, spróbuj ponownie za chwilę"})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+# Treść wiadomości w odpowiedzi: osadzona (encode: Base64 lub surowe bajty dla CBOR)
+# albo, dla dużych paczek, tylko rozmiar i adres pobrania surowego szyfrogramu
+def payload_fields(msg, encode=payload_base64):
+    if msg.payload_size and msg.payload_size > INLINE_PAYLOAD_MAX_BYTES:
+        return {"payload_size": msg.payload_size, "payload_url": url_for('get_message_payload', msg_id=msg.id)}
+    return {"encrypted_payload": encode(msg)}
+
+# Serializuje wiersz (Message, nazwa rozmówcy) listy metadanych (bez treści)
+def meta_entry(row, peer_field):
+    msg, peer_name = row
+    return {
+        "id": msg.id,
+        peer_field: peer_name,
+        "timestamp": msg.timestamp.strftime("%Y-%m-%d %H:%M"),
+        "size": msg.payload_size,
+        "is_read": msg.is_read
+    }
 
 def init_routes(app, limiter):
 
@@ -15,34 +281,88 @@ def init_routes(app, limiter):
     
     @app.after_request
     def add_security_headers(response):
+        # Odpowiedzi buforowane (fragmenty) nie mogą nieść tożsamości - trafiłyby do innej sesji
+        if request.endpoint in PUBLIC_CACHEABLE_ENDPOINTS:
+            return response
+        # Przeciążenie (np. wyczerpana pula) - bez ładowania użytkownika z bazy
+        if response.status_code == 503:
+            return response
         if current_user.is_authenticated:
             response.headers['X-User-ID'] = str(current_user.id)
         return response
 
+    # Wyczerpana pula połączeń z bazą (pool_timeout) - 503 zamiast 500, klient ponawia.
+    # Widoki przepuszczają ten wyjątek (except PoolTimeoutError: raise) przed ogólną obsługą błędów.
+    @app.errorhandler(PoolTimeoutError)
+    def handle_pool_timeout(e):
+        app.logger.warning(f"Pula połączeń z bazą wyczerpana: {pool_status(db.engine)}")
+        response = jsonify({"error": "Serwer jest przeciążony, spróbuj ponownie za chwilę"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+
+    # === DIAGNOSTYKA ===
+
+    # Stan procesu workera: dostępność bazy oraz statystyki puli połączeń i puli Argon2.
+    # Endpoint dla healthchecków wewnątrz sieci kontenerów - nginx go nie udostępnia.
+    @app.route('/healthz')
+    @limiter.exempt
+    def healthz():
+        try:
+            db.session.execute(text("SELECT 1"))
+            database_ok = True
+        except Exception as e:
+            app.logger.error(f"Błąd healthchecku bazy danych: {str(e)}")
+            database_ok = False
+
+        body = {
+            "status": "ok" if database_ok else "degraded",
+            "db_pool": pool_status(db.engine),
+            "hashing_pool": get_hashing_pool().stats(),
+            "process": {"pid": os.getpid(), **memory_usage()},
+            "startup": app.extensions.get('startup')
+        }
+        return jsonify(body), 200 if database_ok else 503
+
+    # Metryki w formacie tekstowym Prometheusa, zsumowane ze wszystkich workerów (METRICS_DIR)
+    @app.route('/metrics')
+    @limiter.exempt
+    def metrics():
+        try:
+            return Response(get_metrics().render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+        except Exception as e:
+            app.logger.error(f"Błąd eksportu metryk: {str(e)}")
+            return "Błąd eksportu metryk", 500
+
     # === WIDOKI SPA ===
 
     # Główny punkt wejścia do aplikacji
     @app.route('/')
     @limiter.limit("10 per minute")
     def index():
-        return render_template('main.html')
+        return render_template('main.html', fragments_version=get_fragment_cache().version)
 
-    # Serwowanie fragmentów HTML do wstrzyknięcia dynamicznego
+    # Serwowanie fragmentów HTML do wstrzyknięcia dynamicznego (wyrenderowane przy starcie)
     @app.route('/get-fragment/<name>')
     @limiter.limit("60 per minute")
     def get_fragment(name):
-        allowed = ['login', 'register', 'dashboard', 'inbox', 'outbox', 'send']
-        
-        # Walidacja nazwy fragmentu zapobiega próbom path traversal
-        if name not in allowed:
+        # Tylko znane nazwy - bez odwołań do systemu plików na podstawie parametru
+        if name not in FRAGMENT_NAMES:
             return "Widok nie istnieje", 404
 
-        try:
-            return render_template(f'fragments/{name}.html')
-        except Exception as e:
-            # Logujemy błąd techniczny
-            app.logger.error(f"Błąd renderowania fragmentu {name}: {str(e)}")
-            return "Błąd wewnętrzny serwera. Nie udało się pobrać widoku.", 500
+        body, etag = get_fragment_cache().get(name)
+        response = Response(body, mimetype='text/html')
+        cache_headers(response, etag, request.args.get('v'))
+        return response.make_conditional(request)
+
+    # Wszystkie fragmenty w jednej odpowiedzi JSON {nazwa: html}
+    @app.route('/get-fragments')
+    @limiter.limit("30 per minute")
+    def get_fragment_bundle():
+        cache = get_fragment_cache()
+        response = Response(cache.bundle, mimetype='application/json')
+        cache_headers(response, cache.bundle_etag, request.args.get('v'))
+        return response.make_conditional(request)
 
 
     # === API UWIERZYTELNIANIA ===
@@ -78,10 +398,13 @@ def init_routes(app, limiter):
             # Szyfrowanie totp_secret go przed zapisem
             encrypted_totp_secret = utils.encrypt_secret(plain_totp_secret)
 
-            # Przechowywanie danych w zaszyfrowanej sesji serwera
+            with get_metrics().timed('auth_argon2_seconds', op='hash'):
+                password_hash = get_hashing_pool().hash(data['password_hash'])
+
+            # Dane rejestracji w sesji po stronie serwera (w ciasteczku tylko identyfikator sesji)
             session['pending_registration'] = {
                 "username": username,
-                "password_hash": ph.hash(data['password_hash']),
+                "password_hash": password_hash,
                 "kdf_salt": data['kdf_salt'],
                 "pub_key_x25519": data['pub_key_x25519'],
                 "pub_key_ed25519": data['pub_key_ed25519'],
@@ -94,7 +417,11 @@ def init_routes(app, limiter):
                 name=username, issuer_name="ODAS_Secure_App"
             )
             return jsonify({"totp_uri": provisioning_uri}), 200
-            
+
+        except PoolSaturated:
+            return overloaded_response()
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             app.logger.error(f"Błąd inicjalizacji rejestracji: {str(e)}")
             return jsonify({"error": "Błąd serwera podczas rejestracji"}), 500
@@ -114,7 +441,10 @@ def init_routes(app, limiter):
             if not pending:
                 return jsonify({"error": "Sesja wygasła lub nie istnieje"}), 400
 
-            if pyotp.TOTP(pending['totp_secret']).verify(totp_code):
+            with get_metrics().timed('auth_totp_seconds', stage='register'):
+                totp_valid = pyotp.TOTP(pending['totp_secret']).verify(totp_code)
+
+            if totp_valid:
                 try:
                     # Blokada ponownej rejestracji tego samego loginu w oknie wyścigu
                     if User.query.filter_by(username=pending['username']).first():
@@ -122,9 +452,13 @@ def init_routes(app, limiter):
 
                     new_user = User(**pending)
                     db.session.add(new_user)
+                    db.session.flush()
+                    db.session.add(UnreadCounter(user_id=new_user.id, unread=0))
                     db.session.commit()
                     session.pop('pending_registration', None)
                     return jsonify({"status": "registered"}), 201
+                except PoolTimeoutError:
+                    raise
                 except Exception as e:
                     db.session.rollback()
                     app.logger.error(f"Krytyczny błąd zapisu użytkownika: {str(e)}")
@@ -132,6 +466,8 @@ def init_routes(app, limiter):
             
             return jsonify({"error": "Kod 2FA jest nieprawidłowy"}), 401
             
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             app.logger.error(f"Błąd finalizacji rejestracji: {str(e)}")
             return jsonify({"error": "Błąd serwera podczas rejestracji"}), 500
@@ -151,18 +487,24 @@ def init_routes(app, limiter):
 
             user = User.query.filter_by(username=username).first()
 
-            # Ochrona przed atakami czasowymi
+            # Ochrona przed atakami czasowymi - weryfikacja względem gotowego hasha referencyjnego
+            pool = get_hashing_pool()
+            metrics = get_metrics()
             if not user:
-                ph.hash("dummy_password_to_waste_time") 
+                with metrics.timed('auth_argon2_seconds', op='verify_dummy'):
+                    pool.verify_dummy(password_token)
                 return jsonify({"error": generic_error}), 401
 
-            try:
-                ph.verify(user.password_hash, password_token)
-                
-                totp_code = data.get('totp_code')
-                if not totp_code:
-                    return jsonify({"status": "2fa_required"}), 200
-                
+            with metrics.timed('auth_argon2_seconds', op='verify'):
+                password_valid = pool.verify(user.password_hash, password_token)
+            if not password_valid:
+                return jsonify({"error": generic_error}), 401
+
+            totp_code = data.get('totp_code')
+            if not totp_code:
+                return jsonify({"status": "2fa_required"}), 200
+            
+            with metrics.timed('auth_totp_seconds', stage='login'):
                 plain_totp_secret = utils.decrypt_secret(user.totp_secret)
 
                 # Zabezpieczenie na wypadek błędu deszyfrowania (np. zły klucz w .env)
@@ -172,15 +514,19 @@ def init_routes(app, limiter):
 
                 # Weryfikacja kodu przy użyciu ODSZYFROWANEGO sekretu
                 totp = pyotp.TOTP(plain_totp_secret)
-                if not totp.verify(totp_code):
-                    return jsonify({"error": "Niepoprawny kod 2FA"}), 401
+                totp_valid = totp.verify(totp_code)
 
-                login_user(user)
-                return jsonify({"status": "ok", "message": "Zalogowano"})
-                
-            except VerifyMismatchError:
-                return jsonify({"error": generic_error}), 401
-                
+            if not totp_valid:
+                return jsonify({"error": "Niepoprawny kod 2FA"}), 401
+
+            login_user(user)
+            session.regenerate()
+            return jsonify({"status": "ok", "message": "Zalogowano"})
+
+        except PoolSaturated:
+            return overloaded_response()
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             app.logger.error(f"Błąd logowania: {str(e)}")
             return jsonify({"error": "Błąd serwera podczas logowania"}), 500
@@ -189,7 +535,9 @@ def init_routes(app, limiter):
     @app.route('/logout')
     @login_required
     def logout():
+        get_identity_cache().invalidate(current_user.id)
         logout_user()
+        session.regenerate()
         return jsonify({"status": "logged_out"}), 200
 
 
@@ -201,27 +549,67 @@ def init_routes(app, limiter):
     def get_public_key(username):
         try:
             target_name = str(username).strip()
-            user = User.query.filter_by(username=target_name).first()
+            user = get_key_directory().get(target_name)
             
             if not user:
                 return jsonify({"error": "Odbiorca nie istnieje"}), 404
                 
             return jsonify({
-                "id": user.id,
-                "pub_key_x25519": user.pub_key_x25519,
-                "pub_key_ed25519": user.pub_key_ed25519
+                "id": user['id'],
+                "pub_key_x25519": user['pub_key_x25519'],
+                "pub_key_ed25519": user['pub_key_ed25519']
             })
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             app.logger.error(f"Błąd pobierania klucza publicznego: {str(e)}")
             return jsonify({"error": "Błąd serwera"}), 500
 
+    # Pobieranie kluczy publicznych wielu odbiorców jednym żądaniem
+    @app.route('/api/public-keys', methods=['POST'])
+    @login_required
+    @limiter.limit("60 per minute")
+    def get_public_keys():
+        try:
+            data = request.get_json() or {}
+            usernames = data.get('usernames')
+
+            # Walidacja listy nazw (limit długości listy i pojedynczej nazwy)
+            if not isinstance(usernames, list) or not (1 <= len(usernames) <= PUBLIC_KEYS_BATCH_LIMIT):
+                return jsonify({"error": "Niepoprawna lista odbiorców"}), 400
+            if not all(isinstance(name, str) and 1 <= len(name.strip()) <= 32 for name in usernames):
+                return jsonify({"error": "Niepoprawna lista odbiorców"}), 400
+
+            names = [name.strip() for name in usernames]
+            entries = get_key_directory().get_many(names)
+
+            keys = {}
+            missing = []
+            for name in dict.fromkeys(names):
+                user = entries.get(name)
+                if not user:
+                    missing.append(name)
+                    continue
+                keys[name] = {
+                    "id": user['id'],
+                    "pub_key_x25519": user['pub_key_x25519'],
+                    "pub_key_ed25519": user['pub_key_ed25519']
+                }
+
+            return jsonify({"keys": keys, "missing": missing})
+        except PoolTimeoutError:
+            raise
+        except Exception as e:
+            app.logger.error(f"Błąd pobierania kluczy publicznych: {str(e)}")
+            return jsonify({"error": "Błąd serwera"}), 500
+
     # Pobieranie soli KDF dla użytkownika (obsługa dummy user)
     @app.route('/api/user-data/<username>')
     @limiter.limit("20 per minute")
     def get_user_data(username):
         try:
             username = str(username).strip()
-            user = User.query.filter_by(username=username).first()
+            user = get_key_directory().get(username)
             
             if not user:
                 # Generowanie deterministycznej soli zapobiega enumeracji użytkowników
@@ -235,11 +623,13 @@ def init_routes(app, limiter):
                 })
 
             return jsonify({
-                "id": user.id,
-                "kdf_salt": user.kdf_salt,
-                "wrapped_priv_key_x25519": user.wrapped_priv_key_x25519,
-                "wrapped_priv_key_ed25519": user.wrapped_priv_key_ed25519
+                "id": user['id'],
+                "kdf_salt": user['kdf_salt'],
+                "wrapped_priv_key_x25519": user['wrapped_priv_key_x25519'],
+                "wrapped_priv_key_ed25519": user['wrapped_priv_key_ed25519']
             })
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             app.logger.error(f"Błąd pobierania danych użytkownika: {str(e)}")
             return jsonify({"error": "Błąd serwera"}), 500
@@ -250,18 +640,27 @@ def init_routes(app, limiter):
     @limiter.limit("30 per minute")
     def send_message():
         try:
-            data = request.get_json() or {}
-            
+            # Ścieżka binarna: szyfrogram w ciele żądania, odbiorca/IV/podpis w nagłówkach
+            binary = request.mimetype == 'application/octet-stream'
+            if binary:
+                data = {"iv": request.headers.get('X-IV'), "signature": request.headers.get('X-Signature')}
+                receiver_header = request.headers.get('X-Receiver-Id', '')
+                receiver_id = int(receiver_header) if receiver_header.isdigit() else None
+            else:
+                data = request.get_json() or {}
+                receiver_id = data.get('receiver_id')
+
             # Walidacja danych wejściowych
-            receiver_id = data.get('receiver_id')
             if not isinstance(receiver_id, int):
                 return jsonify({"error": "Niepoprawny odbiorca"}), 400
 
             # Sender_id z sesji
             sender_id = current_user.id
 
-            # Walidacja kryptograficzna paczki
-            if not utils.validate_base64(data.get('encrypted_payload'), (1, 1000000)):
+            # Walidacja kryptograficzna paczki (w trybie binarnym długość sprawdzana przy zapisie)
+            # Jednokrotne, ścisłe dekodowanie - złe dopełnienie to błąd klienta (400), nie serwera
+            raw_payload = None if binary else utils.decode_base64(data.get('encrypted_payload'), (1, 1000000))
+            if not binary and raw_payload is None:
                 return jsonify({"error": "Błąd paczki danych"}), 400
             if not utils.validate_base64(data.get('iv'), (16, 32)) or not utils.validate_base64(data.get('signature'), (64, 128)):
                 app.logger.error("Niepoprawny format IV lub podpisu")
@@ -270,22 +669,164 @@ def init_routes(app, limiter):
             if not User.query.get(receiver_id):
                 return jsonify({"error": "Odbiorca nie istnieje"}), 404
 
+            store = get_blob_store()
+            if binary:
+                # Odrzucenie na podstawie deklarowanej długości, zanim ciało zostanie odczytane
+                if request.content_length is not None and request.content_length > MAX_PAYLOAD_BYTES:
+                    return jsonify({"error": "Paczka danych jest zbyt duża"}), 413
+
+                # Strumieniowy zapis ciała do magazynu z bieżącą kontrolą długości
+                try:
+                    payload_ref, payload_size = store.put_stream(
+                        utils.iter_stream(request.stream), MAX_PAYLOAD_BYTES
+                    )
+                except BlobTooLarge:
+                    return jsonify({"error": "Paczka danych jest zbyt duża"}), 413
+                if payload_size == 0:
+                    release_blob(payload_ref)
+                    return jsonify({"error": "Błąd paczki danych"}), 400
+            else:
+                # Zapis surowego szyfrogramu (bez narzutu Base64) w magazynie obiektów
+                payload_ref = store.put(raw_payload)
+                payload_size = len(raw_payload)
+
             new_msg = Message(
                 sender_id=sender_id,
                 receiver_id=receiver_id,
-                encrypted_payload=data['encrypted_payload'],
+                payload_ref=payload_ref,
                 iv=data['iv'],
-                signature=data['signature']
+                signature=data['signature'],
+                payload_size=payload_size
             )
             db.session.add(new_msg)
+            db.session.flush()
+            record_added(sender_id, receiver_id, new_msg.id)
+            adjust_unread({receiver_id: 1})
             db.session.commit()
+            notify_new_message(receiver_id, new_msg.id)
             return jsonify({"status": "sent"}), 201
         
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             db.session.rollback()
             app.logger.error(f"Błąd wysyłania: {str(e)}")
             return jsonify({"error": "Nie udało się wysłać wiadomości (Błąd serwera)"}), 500
 
+    # Wysyłka wielu wiadomości (np. do wielu odbiorców) w jednej transakcji
+    @app.route('/api/messages/send-batch', methods=['POST'])
+    @login_required
+    @limiter.limit("30 per minute")
+    def send_message_batch():
+        try:
+            data = request.get_json() or {}
+            items = data.get('messages')
+
+            if not isinstance(items, list) or not (1 <= len(items) <= SEND_BATCH_LIMIT):
+                return jsonify({"error": "Niepoprawna lista wiadomości"}), 400
+
+            # Status dla każdej pozycji w kolejności żądania
+            results = [None] * len(items)
+            valid = []
+            total_chars = 0
+            for index, item in enumerate(items):
+                error = message_fields_error(item)
+                if error:
+                    results[index] = {"index": index, "status": "error", "error": error}
+                    continue
+                total_chars += len(item['encrypted_payload'])
+                valid.append((index, item))
+
+            if total_chars > SEND_BATCH_MAX_CHARS:
+                return jsonify({"error": "Paczka danych jest zbyt duża"}), 413
+
+            # Weryfikacja wszystkich odbiorców jednym zapytaniem IN
+            receiver_ids = {item['receiver_id'] for _, item in valid}
+            existing = {row.id for row in User.query.with_entities(User.id).filter(User.id.in_(receiver_ids))} if receiver_ids else set()
+
+            rows = []
+            row_indexes = []
+            payloads = []
+            for index, item in valid:
+                if item['receiver_id'] not in existing:
+                    results[index] = {"index": index, "status": "error", "error": "Odbiorca nie istnieje"}
+                    continue
+                # Niepoprawny Base64 odrzuca tylko tę pozycję, nie całą partię
+                raw_payload = utils.decode_base64(item['encrypted_payload'], (1, 1000000))
+                if raw_payload is None:
+                    results[index] = {"index": index, "status": "error", "error": "Błąd paczki danych"}
+                    continue
+                payloads.append(raw_payload)
+                rows.append({
+                    "sender_id": current_user.id,
+                    "receiver_id": item['receiver_id'],
+                    "iv": item['iv'],
+                    "signature": item['signature'],
+                    "payload_size": len(raw_payload),
+                    "is_read": False
+                })
+                row_indexes.append(index)
+
+            # Paczki zapisywane razem (jedna synchronizacja dysku), potem jeden wielowierszowy
+            # INSERT i jeden commit na całą partię
+            if rows:
+                for row, ref in zip(rows, get_blob_store().put_many(payloads)):
+                    row['payload_ref'] = ref
+                new_ids = db.session.scalars(
+                    insert(Message).returning(Message.id, sort_by_parameter_order=True), rows
+                ).all()
+                record_changes(
+                    [(current_user.id, row['receiver_id'], msg_id) for row, msg_id in zip(rows, new_ids)], 'added'
+                )
+                adjust_unread(unread_deltas(row['receiver_id'] for row in rows))
+                db.session.commit()
+                for index, msg_id, row in zip(row_indexes, new_ids, rows):
+                    results[index] = {"index": index, "status": "sent", "id": msg_id}
+                    notify_new_message(row['receiver_id'], msg_id)
+
+            return jsonify({"results": results}), 200
+
+        except PoolTimeoutError:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Błąd wysyłki zbiorczej: {str(e)}")
+            return jsonify({"error": "Nie udało się wysłać wiadomości (Błąd serwera)"}), 500
+
+    # Strumień zdarzeń (SSE) o nowych wiadomościach - zastępuje odpytywanie skrzynki
+    @app.route('/api/messages/stream')
+    @login_required
+    @limiter.limit("10 per minute")
+    def message_stream():
+        # Bez workera asynchronicznego strumień jest wyłączony: 204 kończy ponawianie
+        # połączenia przez EventSource, a klient przechodzi na cykliczne ?since=
+        if not current_app.config['EVENT_STREAM_ENABLED']:
+            return Response(status=204)
+
+        user_id = current_user.id
+        hub = get_event_hub()
+        subscriber = hub.subscribe(user_id)
+
+        def generate():
+            try:
+                # Klient (EventSource) wznawia połączenie po zamknięciu strumienia
+                yield f"retry: {SSE_RETRY_MS}\n\n"
+                deadline = time.monotonic() + SSE_MAX_SECONDS
+                while time.monotonic() < deadline:
+                    try:
+                        data = subscriber.get(timeout=SSE_HEARTBEAT_SECONDS)
+                        yield f"event: message\ndata: {data}\n\n"
+                    except queue.Empty:
+                        # Komentarz SSE utrzymuje połączenie przez proxy
+                        yield ": ping\n\n"
+            finally:
+                hub.unsubscribe(user_id, subscriber)
+
+        response = Response(generate(), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
     # Pobieranie listy wiadomości odebranych dla zalogowanego użytkownika
     @app.route('/api/messages/inbox')
     @login_required
@@ -294,31 +835,54 @@ def init_routes(app, limiter):
         try:
             # ID użytkownika pobierane z sesji
             user_id = current_user.id
+
+            # Tryb listy metadanych - bez kolumn kryptograficznych
+            if request.args.get('view') == 'meta':
+                query = db.session.query(Message, User.username)\
+                .options(db.load_only(Message.id, Message.timestamp, Message.is_read, Message.payload_size))\
+                .join(User, Message.sender_id == User.id)\
+                .filter(Message.receiver_id == user_id)
+                return mailbox_response(query, lambda row: meta_entry(row, 'sender_username'), user_id, 'inbox')
             
-            messages = db.session.query(
+            query = db.session.query(
                 Message, User.username, User.pub_key_x25519, User.pub_key_ed25519
-            ).join(User, Message.sender_id == User.id)\
-            .filter(Message.receiver_id == user_id)\
-            .order_by(Message.timestamp.desc()).all()
+            ).options(db.undefer_group('payload'))\
+            .join(User, Message.sender_id == User.id)\
+            .filter(Message.receiver_id == user_id)
 
-            inbox_data = []
-            
-            for msg, s_name, s_key_x, s_key_ed in messages:
-                msg_entry = {
+            def inbox_entry(row):
+                msg, s_name, s_key_x, s_key_ed = row
+                return {
                     "id": msg.id,
                     "is_read": msg.is_read,
                     "sender_username": s_name,
                     "sender_pub_key": s_key_x,
                     "sender_pub_key_ed25519": s_key_ed,
-                    "encrypted_payload": msg.encrypted_payload,
+                    **payload_fields(msg),
                     "signature": msg.signature,
                     "iv": msg.iv,
                     "timestamp": msg.timestamp.strftime("%Y-%m-%d %H:%M")
                 }
-                inbox_data.append(msg_entry)
-                
-            return jsonify(inbox_data)
+
+            # Postać binarna: surowe bajty, klucze nadawców jako indeksy tablicy kluczy
+            def inbox_compact(row, keys):
+                msg, s_name, s_key_x, s_key_ed = row
+                return {
+                    "id": msg.id,
+                    "is_read": msg.is_read,
+                    "sender_username": s_name,
+                    "sender_pub_key": keys.ref(s_key_x),
+                    "sender_pub_key_ed25519": keys.ref(s_key_ed),
+                    **payload_fields(msg, payload_bytes),
+                    "signature": wire.raw(msg.signature),
+                    "iv": wire.raw(msg.iv),
+                    "timestamp": msg.timestamp.strftime("%Y-%m-%d %H:%M")
+                }
+
+            return mailbox_response(query, inbox_entry, user_id, 'inbox', compact=inbox_compact)
         
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             app.logger.error(f"Błąd pobierania skrzynki odbiorczej: {str(e)}")
             return jsonify({"error": "Nie udało się pobrać wiadomości"}), 500
@@ -330,38 +894,138 @@ def init_routes(app, limiter):
     def get_outbox():
         try:
             user_id = current_user.id
+
+            # Tryb listy metadanych - bez kolumn kryptograficznych
+            if request.args.get('view') == 'meta':
+                query = db.session.query(Message, User.username)\
+                .options(db.load_only(Message.id, Message.timestamp, Message.is_read, Message.payload_size))\
+                .join(User, Message.receiver_id == User.id)\
+                .filter(Message.sender_id == user_id)
+                return mailbox_response(query, lambda row: meta_entry(row, 'target_username'), user_id, 'outbox')
             
-            messages = db.session.query(
+            query = db.session.query(
                 Message, User.username, User.pub_key_x25519
-            ).join(User, Message.receiver_id == User.id)\
-            .filter(Message.sender_id == user_id)\
-            .order_by(Message.timestamp.desc()).all()
+            ).options(db.undefer_group('payload'))\
+            .join(User, Message.receiver_id == User.id)\
+            .filter(Message.sender_id == user_id)
 
-            me = User.query.get(user_id)
-            if not me:
-                return jsonify({"error": "Błąd autoryzacji"}), 401
+            # Klucz nadawcy z tożsamości sesji - bez ponownego zapytania o użytkownika
+            my_key_ed = current_user.pub_key_ed25519
 
-            outbox_data = []
-            
-            for msg, target_name, target_key_x in messages:
-                msg_entry = {
+            def outbox_entry(row):
+                msg, target_name, target_key_x = row
+                return {
                     "id": msg.id,
                     "target_username": target_name,
                     "target_pub_key": target_key_x,
-                    "sender_pub_key_ed25519": me.pub_key_ed25519,
-                    "encrypted_payload": msg.encrypted_payload,
+                    "sender_pub_key_ed25519": my_key_ed,
+                    **payload_fields(msg),
                     "signature": msg.signature,
                     "iv": msg.iv,
                     "timestamp": msg.timestamp.strftime("%Y-%m-%d %H:%M")
                 }
-                outbox_data.append(msg_entry)
-                
-            return jsonify(outbox_data)
+
+            def outbox_compact(row, keys):
+                msg, target_name, target_key_x = row
+                return {
+                    "id": msg.id,
+                    "target_username": target_name,
+                    "target_pub_key": keys.ref(target_key_x),
+                    "sender_pub_key_ed25519": keys.ref(my_key_ed),
+                    **payload_fields(msg, payload_bytes),
+                    "signature": wire.raw(msg.signature),
+                    "iv": wire.raw(msg.iv),
+                    "timestamp": msg.timestamp.strftime("%Y-%m-%d %H:%M")
+                }
+
+            return mailbox_response(query, outbox_entry, user_id, 'outbox', compact=outbox_compact)
         
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             app.logger.error(f"Błąd pobierania skrzynki nadawczej: {str(e)}")
             return jsonify({"error": "Nie udało się pobrać wysłanych wiadomości"}), 500
 
+    # Liczba nieprzeczytanych wiadomości (plakietka) - odczyt utrzymywanego licznika
+    @app.route('/api/messages/unread-count')
+    @login_required
+    @limiter.limit("120 per minute")
+    def get_unread_count():
+        try:
+            return jsonify({"unread": unread_count(current_user.id)})
+        except PoolTimeoutError:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Błąd pobierania licznika nieprzeczytanych: {str(e)}")
+            return jsonify({"error": "Błąd serwera"}), 500
+
+    # Pobieranie treści pojedynczej wiadomości (leniwe ładowanie z listy metadanych)
+    @app.route('/api/messages/<int:msg_id>')
+    @login_required
+    @limiter.limit("120 per minute")
+    def get_message(msg_id):
+        try:
+            msg = Message.query.options(db.undefer_group('payload')).get(msg_id)
+            if not msg:
+                return jsonify({"error": "Zasób nie istnieje"}), 404
+
+            # Weryfikacja czy użytkownik jest nadawcą lub odbiorcą
+            if current_user.id not in [msg.sender_id, msg.receiver_id]:
+                return jsonify({"error": "Brak uprawnień"}), 403
+
+            return jsonify({
+                "id": msg.id,
+                **payload_fields(msg),
+                "signature": msg.signature,
+                "iv": msg.iv
+            })
+
+        except PoolTimeoutError:
+            raise
+        except Exception as e:
+            app.logger.error(f"Błąd pobierania msg_{msg_id}: {str(e)}")
+            return jsonify({"error": "Nie udało się pobrać wiadomości"}), 500
+
+    # Pobieranie surowego szyfrogramu (bez Base64) - zero-copy przez nginx lub sendfile
+    @app.route('/api/messages/<int:msg_id>/payload')
+    @login_required
+    @limiter.limit("120 per minute")
+    def get_message_payload(msg_id):
+        try:
+            msg = Message.query.get(msg_id)
+            if not msg:
+                return jsonify({"error": "Zasób nie istnieje"}), 404
+
+            # Weryfikacja czy użytkownik jest nadawcą lub odbiorcą
+            if current_user.id not in [msg.sender_id, msg.receiver_id]:
+                return jsonify({"error": "Brak uprawnień"}), 403
+
+            # Wiadomość sprzed migracji - treść wciąż w wierszu
+            if not msg.payload_ref:
+                raw = base64.b64decode(payload_base64(msg))
+                return Response(raw, mimetype='application/octet-stream')
+
+            store = get_blob_store()
+            accel_prefix = app.config.get('BLOB_ACCEL_PREFIX')
+            if accel_prefix and hasattr(store, 'relative_path'):
+                # Plik wysyła nginx (lokalizacja internal), worker nie czyta treści
+                response = Response(mimetype='application/octet-stream')
+                response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + store.relative_path(msg.payload_ref)
+                return response
+
+            path = store.local_path(msg.payload_ref)
+            if path:
+                # send_file korzysta z wsgi.file_wrapper (sendfile w uWSGI)
+                return send_file(path, mimetype='application/octet-stream', max_age=0)
+            return Response(store.get(msg.payload_ref), mimetype='application/octet-stream')
+
+        except PoolTimeoutError:
+            raise
+        except Exception as e:
+            app.logger.error(f"Błąd pobierania paczki msg_{msg_id}: {str(e)}")
+            return jsonify({"error": "Nie udało się pobrać wiadomości"}), 500
+
     # Usuwanie wiadomości z weryfikacją właściciela
     @app.route('/api/messages/delete/<int:msg_id>', methods=['DELETE'])
     @login_required
@@ -376,10 +1040,26 @@ def init_routes(app, limiter):
             if current_user.id not in [msg.sender_id, msg.receiver_id]:
                 return jsonify({"error": "Brak uprawnień"}), 403
             
-            db.session.delete(msg)
+            # DELETE ... RETURNING - skutki uboczne tylko, jeśli to żądanie faktycznie usunęło wiersz
+            # (równoległe usunięcie tej samej wiadomości nie zmniejsza licznika drugi raz)
+            removed = db.session.execute(
+                delete(Message).where(Message.id == msg.id)
+                .returning(Message.sender_id, Message.receiver_id, Message.is_read, Message.payload_ref),
+                execution_options={"synchronize_session": False}
+            ).one_or_none()
+            if removed is None:
+                db.session.rollback()
+                return jsonify({"error": "Zasób nie istnieje"}), 404
+
+            record_deleted(removed.sender_id, removed.receiver_id, msg_id)
+            if not removed.is_read:
+                adjust_unread({removed.receiver_id: -1})
             db.session.commit()
+            release_blob(removed.payload_ref)
             return jsonify({"status": "deleted"}), 200
         
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             db.session.rollback()
             app.logger.error(f"Błąd usuwania msg_{msg_id}: {str(e)}")
@@ -399,12 +1079,282 @@ def init_routes(app, limiter):
                 return jsonify({"error": "Brak uprawnień"}), 403
             
             # PRZEŁĄCZNIK: Jeśli True to False, jeśli False to True
-            msg.is_read = not msg.is_read 
+            is_read = not msg.is_read
+            # Warunkowy UPDATE - przy równoległym przełączeniu na ten sam stan zmiana
+            # i korekta licznika są zapisywane tylko raz
+            changed = db.session.execute(
+                update(Message)
+                .where(Message.id == msg.id, Message.is_read != is_read)
+                .values(is_read=is_read)
+                .returning(Message.sender_id, Message.receiver_id),
+                execution_options={"synchronize_session": False}
+            ).one_or_none()
+            if changed is not None:
+                record_read(changed.sender_id, changed.receiver_id, msg_id)
+                adjust_unread({changed.receiver_id: -1 if is_read else 1})
             db.session.commit()
             
-            return jsonify({"status": "ok", "is_read": msg.is_read}), 200
+            return jsonify({"status": "ok", "is_read": is_read}), 200
             
+        except PoolTimeoutError:
+            raise
         except Exception as e:
             db.session.rollback()
             app.logger.error(f"Błąd zmiany statusu msg_{msg_id}: {str(e)}")
-            return jsonify({"error": "Błąd serwera"}), 500
\ No newline at end of file
+            return jsonify({"error": "Błąd serwera"}), 500
+
+
+    # === API WYSYŁKI PORCJOWANEJ (DUŻE ZAŁĄCZNIKI) ===
+
+    # Inicjalizacja wysyłki: rezerwacja identyfikatora i ustalenie podziału na porcje
+    @app.route('/api/uploads', methods=['POST'])
+    @login_required
+    @limiter.limit("30 per minute")
+    def upload_init():
+        try:
+            data = request.get_json() or {}
+
+            receiver_id = data.get('receiver_id')
+            if not isinstance(receiver_id, int):
+                return jsonify({"error": "Niepoprawny odbiorca"}), 400
+
+            total_size = data.get('total_size')
+            if not isinstance(total_size, int) or not (1 <= total_size <= MAX_UPLOAD_BYTES):
+                return jsonify({"error": "Niepoprawny rozmiar paczki"}), 400
+
+            if not utils.validate_base64(data.get('iv'), (16, 32)) or not utils.validate_base64(data.get('signature'), (64, 128)):
+                app.logger.error("Niepoprawny format IV lub podpisu")
+                return jsonify({"error": "Błąd paczki danych"}), 400
+
+            if not User.query.get(receiver_id):
+                return jsonify({"error": "Odbiorca nie istnieje"}), 404
+
+            upload = PendingUpload(
+                id=secrets.token_hex(16),
+                sender_id=current_user.id,
+                receiver_id=receiver_id,
+                iv=data['iv'],
+                signature=data['signature'],
+                total_size=total_size,
+                chunk_size=UPLOAD_CHUNK_SIZE,
+                chunk_count=chunk_count_for(total_size, UPLOAD_CHUNK_SIZE)
+            )
+            db.session.add(upload)
+            db.session.commit()
+
+            return jsonify({
+                "upload_id": upload.id,
+                "chunk_size": upload.chunk_size,
+                "chunk_count": upload.chunk_count
+            }), 201
+
+        except PoolTimeoutError:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Błąd inicjalizacji wysyłki: {str(e)}")
+            return jsonify({"error": "Błąd serwera"}), 500
+
+    # Stan wysyłki - lista odebranych porcji pozwala wznowić przerwany transfer
+    @app.route('/api/uploads/<upload_id>')
+    @login_required
+    @limiter.limit("120 per minute")
+    def upload_status(upload_id):
+        try:
+            upload = PendingUpload.query.get(upload_id)
+            if not upload or upload.sender_id != current_user.id:
+                return jsonify({"error": "Zasób nie istnieje"}), 404
+
+            return jsonify({
+                "upload_id": upload.id,
+                "chunk_size": upload.chunk_size,
+                "chunk_count": upload.chunk_count,
+                "received": get_chunk_staging().received(upload.id)
+            })
+
+        except PoolTimeoutError:
+            raise
+        except Exception as e:
+            app.logger.error(f"Błąd pobierania stanu wysyłki: {str(e)}")
+            return jsonify({"error": "Błąd serwera"}), 500
+
+    # Zapis porcji N - ciało strumieniowane na dysk, ponowienie nadpisuje porcję
+    @app.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+    @login_required
+    @limiter.limit("600 per minute")
+    def upload_chunk(upload_id, index):
+        try:
+            upload = PendingUpload.query.get(upload_id)
+            if not upload or upload.sender_id != current_user.id:
+                return jsonify({"error": "Zasób nie istnieje"}), 404
+
+            if not (0 <= index < upload.chunk_count):
+                return jsonify({"error": "Niepoprawny numer porcji"}), 400
+
+            expected = expected_chunk_size(upload.total_size, upload.chunk_size, index)
+            if request.content_length is not None and request.content_length != expected:
+                return jsonify({"error": "Niepoprawny rozmiar porcji"}), 400
+
+            try:
+                get_chunk_staging().write_chunk(upload.id, index, utils.iter_stream(request.stream), expected)
+            except ChunkSizeMismatch:
+                return jsonify({"error": "Niepoprawny rozmiar porcji"}), 400
+
+            return jsonify({"status": "ok", "index": index}), 200
+
+        except PoolTimeoutError:
+            raise
+        except Exception as e:
+            app.logger.error(f"Błąd zapisu porcji {index} wysyłki: {str(e)}")
+            return jsonify({"error": "Błąd serwera"}), 500
+
+    # Finalizacja - złożenie porcji w magazynie obiektów i utworzenie wiadomości
+    @app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+    @login_required
+    @limiter.limit("30 per minute")
+    def upload_finalize(upload_id):
+        try:
+            upload = PendingUpload.query.get(upload_id)
+            if not upload or upload.sender_id != current_user.id:
+                return jsonify({"error": "Zasób nie istnieje"}), 404
+
+            staging = get_chunk_staging()
+            received = staging.received(upload.id)
+            missing = sorted(set(range(upload.chunk_count)) - set(received))
+            if missing:
+                return jsonify({"error": "Brak części porcji", "missing": missing}), 409
+
+            # Zajęcie wysyłki warunkowym DELETE przed złożeniem pliku: równoległa finalizacja
+            # czeka na blokadę wiersza i nie znajduje go już po zatwierdzeniu pierwszej.
+            # Błąd składania wycofuje transakcję, więc wysyłka wraca do stanu sprzed finalizacji.
+            claimed = db.session.execute(
+                delete(PendingUpload).where(PendingUpload.id == upload.id).returning(PendingUpload.id),
+                execution_options={"synchronize_session": False}
+            ).first()
+            if claimed is None:
+                db.session.rollback()
+                return jsonify({"error": "Wysyłka została już sfinalizowana"}), 409
+
+            try:
+                payload_ref, payload_size = assemble_upload(get_blob_store(), upload)
+            except BlobTooLarge:
+                db.session.rollback()
+                return jsonify({"error": "Niepoprawny rozmiar paczki"}), 400
+
+            new_msg = Message(
+                sender_id=upload.sender_id,
+                receiver_id=upload.receiver_id,
+                payload_ref=payload_ref,
+                iv=upload.iv,
+                signature=upload.signature,
+                payload_size=payload_size
+            )
+            db.session.add(new_msg)
+            db.session.flush()
+            record_added(new_msg.sender_id, new_msg.receiver_id, new_msg.id)
+            adjust_unread({new_msg.receiver_id: 1})
+            db.session.commit()
+            staging.discard(upload_id)
+            notify_new_message(new_msg.receiver_id, new_msg.id)
+
+            return jsonify({"status": "sent", "id": new_msg.id}), 201
+
+        except PoolTimeoutError:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Błąd finalizacji wysyłki: {str(e)}")
+            return jsonify({"error": "Nie udało się wysłać wiadomości (Błąd serwera)"}), 500
+
+
+    # === API OPERACJI ZBIORCZYCH ===
+
+    # Zbiorcze oznaczanie jako przeczytane/nieprzeczytane - jeden UPDATE z kontrolą właściciela w SQL
+    @app.route('/api/messages/bulk/mark-read', methods=['POST'])
+    @login_required
+    @limiter.limit("20 per minute")
+    def bulk_mark_read():
+        try:
+            data = request.get_json() or {}
+            is_read = data.get('is_read', True)
+            if not isinstance(is_read, bool):
+                return jsonify({"error": "Niepoprawny status"}), 400
+
+            # Tylko odbiorca może zmieniać status; partia obejmuje tylko wiersze o innym statusie
+            condition, info = bulk_condition(
+                data, (Message.receiver_id == current_user.id) & (Message.is_read != is_read)
+            )
+            if condition is None:
+                return jsonify({"error": info}), 400
+
+            changed = db.session.execute(
+                update(Message)
+                .where(condition)
+                .values(is_read=is_read)
+                .returning(Message.id, Message.sender_id, Message.receiver_id),
+                execution_options={"synchronize_session": False}
+            ).all()
+            record_changes([(row.sender_id, row.receiver_id, row.id) for row in changed], 'read')
+            adjust_unread(unread_deltas((row.receiver_id for row in changed), -1 if is_read else 1))
+            has_more = bulk_has_more(info, len(changed))
+            db.session.commit()
+
+            return jsonify({
+                "status": "ok",
+                "is_read": is_read,
+                "ids": [row.id for row in changed],
+                "has_more": has_more
+            }), 200
+
+        except PoolTimeoutError:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Błąd zbiorczej zmiany statusu: {str(e)}")
+            return jsonify({"error": "Błąd serwera"}), 500
+
+    # Zbiorcze usuwanie - jeden DELETE ... RETURNING z kontrolą właściciela w SQL
+    @app.route('/api/messages/bulk/delete', methods=['POST'])
+    @login_required
+    @limiter.limit("20 per minute")
+    def bulk_delete():
+        try:
+            data = request.get_json() or {}
+            me = current_user.id
+
+            # Lista ids: nadawca lub odbiorca; filtr: wybrana skrzynka (domyślnie odbiorcza)
+            if data.get('ids') is not None:
+                owner_condition = or_(Message.sender_id == me, Message.receiver_id == me)
+            elif data.get('box', 'inbox') == 'outbox':
+                owner_condition = Message.sender_id == me
+            else:
+                owner_condition = Message.receiver_id == me
+
+            condition, info = bulk_condition(data, owner_condition)
+            if condition is None:
+                return jsonify({"error": info}), 400
+
+            removed = db.session.execute(
+                delete(Message)
+                .where(condition)
+                .returning(Message.id, Message.sender_id, Message.receiver_id, Message.payload_ref, Message.is_read),
+                execution_options={"synchronize_session": False}
+            ).all()
+            record_changes([(row.sender_id, row.receiver_id, row.id) for row in removed], 'deleted')
+            adjust_unread(unread_deltas((row.receiver_id for row in removed if not row.is_read), -1))
+            has_more = bulk_has_more(info, len(removed))
+            db.session.commit()
+            release_blobs(row.payload_ref for row in removed)
+
+            return jsonify({
+                "status": "deleted",
+                "ids": [row.id for row in removed],
+                "has_more": has_more
+            }), 200
+
+        except PoolTimeoutError:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Błąd zbiorczego usuwania: {str(e)}")
+            return jsonify({"error": "Błąd serwera"}), 500
@@ -0,0 +1,217 @@
+import time
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, DateTime, inspect, select, text
+from sqlalchemy.schema import CreateIndex
+from app.models import db
+
+# Wersja schematu bazy. Zmiana modeli = kolejny numer i wpis w MIGRATIONS.
+# Baza z tabelami, ale bez tabeli wersji, ma wersję 0 (schemat wyjściowy projektu).
+SCHEMA_VERSION = 4
+
+# Blokada doradcza PostgreSQL - równolegle startujące kontenery nie wykonują DDL jednocześnie
+ADVISORY_LOCK_ID = 0x0DA5
+
+# Tabela wersji poza metadanymi modeli (db.drop_all/create_all jej nie dotyczą)
+schema_metadata = MetaData()
+schema_version = Table(
+    'schema_version', schema_metadata,
+    Column('version', Integer, nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+# Zbyt nowy schemat (baza po wdrożeniu nowszej wersji aplikacji) - start przerywany
+class SchemaVersionError(Exception):
+    pass
+
+
+def current_version(connection):
+    if not inspect(connection).has_table('schema_version'):
+        return None
+    return connection.execute(select(schema_version.c.version)).scalar()
+
+
+# Tabele i indeksy z modeli, których brakuje (CREATE ... IF NOT EXISTS - istniejące bez zmian).
+# Indeksy tworzone osobno, bo create_all pomija indeksy tabel już istniejących (np. BRIN
+# na message.timestamp w bazie założonej przed jego dodaniem). Kolumn nie dodaje - po
+# migracjach, gdy wszystkie indeksowane kolumny już istnieją.
+def _create_missing(connection, partitioning=False):
+    postgres = connection.dialect.name == 'postgresql'
+    message_exists = inspect(connection).has_table('message')
+
+    partitions = []
+    if partitioning and postgres and not message_exists:
+        from app.retention import create_partitioned_schema
+        partitions = create_partitioned_schema(connection)
+    else:
+        db.metadata.create_all(connection)
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+
+    schema_metadata.create_all(connection)
+    return partitions
+
+
+# --- MIGRACJE ---
+
+def _columns(connection, table):
+    return {column['name'] for column in inspect(connection).get_columns(table)}
+
+# Wiersz bez czasu wysłania (kolumna była opcjonalna) dostaje czas migracji
+TIMESTAMP_FILL = 'coalesce("timestamp", CURRENT_TIMESTAMP)'
+
+# SQLite nie zmienia ograniczeń kolumn (ALTER COLUMN) - tabela message budowana od nowa
+# z modelu i wypełniana starymi wierszami; brakujące kolumny dostają wartości z `fill`,
+# timestamp przechodzi przez TIMESTAMP_FILL (w modelu NOT NULL)
+def _rebuild_sqlite_message(connection, fill):
+    old_columns = _columns(connection, 'message')
+    for index in inspect(connection).get_indexes('message'):
+        connection.execute(text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+    connection.execute(text('ALTER TABLE message RENAME TO message_old'))
+    db.metadata.tables['message'].create(connection)
+
+    names, values = [], []
+    for column in db.metadata.tables['message'].columns:
+        if column.name == 'timestamp' and column.name in old_columns:
+            names.append('"timestamp"')
+            values.append(TIMESTAMP_FILL)
+        elif column.name in old_columns:
+            names.append(f'"{column.name}"')
+            values.append(f'"{column.name}"')
+        elif column.name in fill:
+            names.append(f'"{column.name}"')
+            values.append(fill[column.name])
+    connection.execute(text(
+        f"INSERT INTO message ({', '.join(names)}) SELECT {', '.join(values)} FROM message_old"
+    ))
+    connection.execute(text('DROP TABLE message_old'))
+
+# Rozmiar paczki zapisanej jako Base64 w wierszu (3/4 długości bez dopełnienia '=')
+LEGACY_PAYLOAD_SIZE = (
+    "(length(encrypted_payload) / 4 * 3 - (length(encrypted_payload) - length(rtrim(encrypted_payload, '='))))"
+)
+
+# 0 -> 1: paczki w magazynie obiektów (payload_ref, payload_size, encrypted_payload opcjonalne).
+# Bezpieczna również dla baz zakładanych już z nowszych modeli (kolumny mogą istnieć).
+def _migrate_1(connection):
+    columns = _columns(connection, 'message')
+
+    if connection.dialect.name == 'sqlite':
+        nullable = {column['name']: column['nullable'] for column in inspect(connection).get_columns('message')}
+        if 'payload_ref' not in columns or 'payload_size' not in columns or not nullable['encrypted_payload']:
+            _rebuild_sqlite_message(connection, {
+                'payload_ref': 'NULL',
+                'payload_size': f"coalesce({LEGACY_PAYLOAD_SIZE}, 0)",
+            })
+            return
+    else:
+        connection.execute(text("ALTER TABLE message ADD COLUMN IF NOT EXISTS payload_ref VARCHAR(64)"))
+        connection.execute(text("ALTER TABLE message ADD COLUMN IF NOT EXISTS payload_size INTEGER NOT NULL DEFAULT 0"))
+        connection.execute(text("ALTER TABLE message ALTER COLUMN encrypted_payload DROP NOT NULL"))
+        if 'payload_size' not in columns:
+            connection.execute(text(
+                f"UPDATE message SET payload_size = {LEGACY_PAYLOAD_SIZE} WHERE encrypted_payload IS NOT NULL"
+            ))
+
+# 1 -> 2: wersje skrzynek zatwierdzane pod blokadą wiersza (mailbox_version) zamiast id
+# dziennika jako kursora. Dotychczasowe wpisy dostają wersję równą id, a skrzynki wersję
+# ostatniego wpisu - kursory zapamiętane przez klientów pozostają poprawne.
+def _migrate_2(connection):
+    if not inspect(connection).has_table('mailbox_change'):
+        return
+    if 'version' not in _columns(connection, 'mailbox_change'):
+        connection.execute(text("ALTER TABLE mailbox_change ADD COLUMN version BIGINT NOT NULL DEFAULT 0"))
+        connection.execute(text("UPDATE mailbox_change SET version = id"))
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text("ALTER TABLE mailbox_change ALTER COLUMN version DROP DEFAULT"))
+    connection.execute(text("DROP INDEX IF EXISTS ix_mailbox_change_user_box_id"))
+
+    if not inspect(connection).has_table('mailbox_version'):
+        db.metadata.tables['mailbox_version'].create(connection)
+        connection.execute(text(
+            "INSERT INTO mailbox_version (user_id, box, version) "
+            "SELECT user_id, box, max(version) FROM mailbox_change GROUP BY user_id, box"
+        ))
+
+# 2 -> 3: message.timestamp NOT NULL - kursor stronicowania (timestamp, id) i porządek
+# skrzynek nie obsługują wierszy bez czasu wysłania
+def _migrate_3(connection):
+    if connection.dialect.name == 'sqlite':
+        nullable = {column['name']: column['nullable'] for column in inspect(connection).get_columns('message')}
+        if nullable['timestamp']:
+            _rebuild_sqlite_message(connection, {})
+        return
+    connection.execute(text('UPDATE message SET "timestamp" = CURRENT_TIMESTAMP WHERE "timestamp" IS NULL'))
+    connection.execute(text('ALTER TABLE message ALTER COLUMN "timestamp" SET NOT NULL'))
+
+# 3 -> 4: SQLite przechowuje daty jako tekst; wiersze z CURRENT_TIMESTAMP (bez mikrosekund)
+# porównywane z kursorem 'YYYY-MM-DD HH:MM:SS.ffffff' zawsze wypadają przed nim i strona
+# zwraca w kółko te same wiersze. Dopisanie części ułamkowej ujednolica format.
+# PostgreSQL porównuje wartości typu timestamp - bez zmian.
+def _migrate_4(connection):
+    if connection.dialect.name != 'sqlite':
+        return
+    connection.execute(text(
+        'UPDATE message SET "timestamp" = "timestamp" || \'.000000\' WHERE length("timestamp") = 19'
+    ))
+
+# MIGRATIONS[n](connection) przeprowadza schemat z wersji n-1 do n (w transakcji startu);
+# brakujące tabele i indeksy zakładane są po ostatniej migracji
+MIGRATIONS = {
+    1: _migrate_1,
+    2: _migrate_2,
+    3: _migrate_3,
+    4: _migrate_4,
+}
+
+def _stamp(connection):
+    connection.execute(schema_version.delete())
+    connection.execute(schema_version.insert().values(version=SCHEMA_VERSION, applied_at=datetime.now()))
+
+
+# Idempotentna inicjalizacja schematu przy starcie. Bieżąca wersja - jedno zapytanie, bez blokad
+# i DDL. Inaczej w jednej transakcji pod blokadą: pusta baza - pełny schemat (opcjonalnie
+# z partycjonowaną tabelą message), starsza wersja (także 0 - tabele bez tabeli wersji) -
+# kolejne migracje, potem brakujące tabele i indeksy.
+# Zwraca {action, from_version, version, partitions, seconds}.
+def ensure_schema(partitioning=False):
+    start = time.perf_counter()
+    with db.engine.connect() as connection:
+        found = current_version(connection)
+    if found == SCHEMA_VERSION:
+        return {"action": "current", "from_version": found, "version": SCHEMA_VERSION,
+                "partitions": [], "seconds": time.perf_counter() - start}
+
+    partitions = []
+    with db.engine.begin() as connection:
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+        # Ponowny odczyt pod blokadą - inny proces mógł już zakończyć inicjalizację
+        found = current_version(connection)
+        if found is None and inspect(connection).has_table('message'):
+            found = 0
+
+        if found is not None and found > SCHEMA_VERSION:
+            raise SchemaVersionError(f"Schemat bazy w wersji {found}, aplikacja obsługuje {SCHEMA_VERSION}")
+        if found == SCHEMA_VERSION:
+            action = "current"
+        elif found is None:
+            action = "created"
+            partitions = _create_missing(connection, partitioning)
+            _stamp(connection)
+        else:
+            for version in range(found + 1, SCHEMA_VERSION + 1):
+                MIGRATIONS[version](connection)
+            _create_missing(connection)
+            action = "migrated"
+            _stamp(connection)
+
+    return {"action": action, "from_version": found, "version": SCHEMA_VERSION,
+            "partitions": partitions, "seconds": time.perf_counter() - start}
+
+# Usunięcie wszystkich tabel (łącznie z tabelą wersji) - wyłącznie na żądanie (init_db.py --reset)
+def drop_schema():
+    db.drop_all()
+    schema_metadata.drop_all(db.engine)
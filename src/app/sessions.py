@@ -0,0 +1,183 @@
+import secrets
+from flask.sessions import SessionInterface, SecureCookieSession, SecureCookieSessionInterface
+from flask.json.tag import TaggedJSONSerializer
+from app.cache import TTLCache, MISSING, redis_client
+
+# Serializacja jak w sesji ciasteczkowej Flaska (obsługa bytes, datetime, tuple)
+serializer = TaggedJSONSerializer()
+
+
+# --- MAGAZYNY SESJI ---
+
+# Sesje w pamięci procesu - testy i pojedynczy proces (workery uWSGI nie współdzielą danych,
+# dlatego create_session_interface odrzuca memory:// przy kilku procesach)
+class MemorySessionBackend:
+
+    def __init__(self, maxsize=100000):
+        self.cache = TTLCache(maxsize=maxsize)
+
+    # Odczyt z przedłużeniem ważności (wygasanie liczone od ostatniego użycia)
+    def load(self, sid, ttl):
+        raw = self.cache.get(sid)
+        if raw is MISSING:
+            return None
+        self.store(sid, raw, ttl)
+        return raw
+
+    def store(self, sid, raw, ttl):
+        self.cache.set(sid, raw, ttl)
+
+    def delete(self, sid):
+        self.cache.delete(sid)
+
+
+# Sesje w Redis wspólne dla wszystkich workerów; GETEX odczytuje i przedłuża TTL w jednym zapytaniu
+class RedisSessionBackend:
+
+    def __init__(self, uri, prefix='session:'):
+        self.client = redis_client(uri)
+        self.prefix = prefix
+
+    def load(self, sid, ttl):
+        raw = self.client.getex(self.prefix + sid, ex=ttl)
+        return raw.decode() if raw is not None else None
+
+    def store(self, sid, raw, ttl):
+        self.client.set(self.prefix + sid, raw, ex=ttl)
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+# Tworzy magazyn na podstawie URI (redis://... lub memory://)
+def create_session_backend(uri):
+    if uri and uri.startswith(('redis://', 'rediss://')):
+        return RedisSessionBackend(uri)
+    return MemorySessionBackend()
+
+# Liczba procesów workerów uWSGI (1 poza uWSGI)
+def _worker_processes():
+    try:
+        import uwsgi
+    except ImportError:
+        return 1
+    return uwsgi.numproc
+
+# Interfejs sesji dla URI: redis:// - sesje po stronie serwera, cookie:// (bez Redis) - podpisane
+# ciasteczko Flaska, memory:// - tylko w pojedynczym procesie
+def create_session_interface(uri, ttl=86400):
+    if not uri or uri == 'cookie://':
+        return CookieSessionInterface()
+    if not uri.startswith(('redis://', 'rediss://')) and _worker_processes() > 1:
+        raise RuntimeError(
+            f"SESSION_STORE_URI={uri} nie jest współdzielony między {_worker_processes()} procesami - "
+            "użyj redis:// albo cookie://"
+        )
+    return ServerSideSessionInterface(create_session_backend(uri), ttl=ttl)
+
+
+# --- SESJA ---
+
+# Śledzenie modyfikacji jak w sesji ciasteczkowej Flaska; dodatkowo identyfikator w magazynie
+class ServerSideSession(SecureCookieSession):
+
+    def __init__(self, initial=None, sid=None, new=False):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = new
+        self.rotate = False
+
+    # Nowy identyfikator przy zmianie poziomu uprawnień (logowanie, wylogowanie) - ochrona
+    # przed utrwaleniem sesji (session fixation); dane sesji są zachowywane
+    def regenerate(self):
+        self.rotate = True
+        self.modified = True
+
+
+# Sesja w podpisanym ciasteczku (domyślna sesja Flaska) z tym samym API co sesja serwerowa.
+# Nie ma identyfikatora do podmiany - zmiana danych przy logowaniu i wylogowaniu i tak
+# wysyła nowe ciasteczko.
+class CookieSession(SecureCookieSession):
+
+    def regenerate(self):
+        self.modified = True
+
+
+class CookieSessionInterface(SecureCookieSessionInterface):
+    session_class = CookieSession
+
+
+# Interfejs sesji Flaska: w ciasteczku wyłącznie losowy identyfikator, dane w magazynie z TTL
+class ServerSideSessionInterface(SessionInterface):
+
+    def __init__(self, backend, ttl=86400):
+        self.backend = backend
+        self.ttl = ttl
+
+    @staticmethod
+    def _new_sid():
+        return secrets.token_urlsafe(32)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or len(sid) > 64:
+            return ServerSideSession(sid=self._new_sid(), new=True)
+
+        try:
+            raw = self.backend.load(sid, self.ttl)
+        except Exception as e:
+            app.logger.error(f"Błąd odczytu sesji: {str(e)}")
+            raw = None
+
+        # Nieznany lub wygasły identyfikator nie jest przejmowany - zawsze nowy
+        if raw is None:
+            return ServerSideSession(sid=self._new_sid(), new=True)
+        try:
+            return ServerSideSession(serializer.loads(raw), sid=sid)
+        except Exception:
+            return ServerSideSession(sid=self._new_sid(), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        # Pusta sesja - usunięcie danych i ciasteczka
+        if not session:
+            if session.modified and not session.new:
+                self.backend.delete(session.sid)
+                response.delete_cookie(
+                    name, domain=domain, path=path,
+                    secure=self.get_cookie_secure(app),
+                    partitioned=self.get_cookie_partitioned(app),
+                    samesite=self.get_cookie_samesite(app),
+                    httponly=self.get_cookie_httponly(app)
+                )
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session.modified:
+            return
+
+        if session.rotate:
+            if not session.new:
+                self.backend.delete(session.sid)
+            session.sid = self._new_sid()
+            session.new = True
+            session.rotate = False
+
+        self.backend.store(session.sid, serializer.dumps(dict(session)), self.ttl)
+
+        # Ciasteczko wysyłane tylko przy nowym identyfikatorze - TTL przedłuża się po stronie serwera
+        if session.new:
+            response.set_cookie(
+                name, session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                partitioned=self.get_cookie_partitioned(app),
+                samesite=self.get_cookie_samesite(app)
+            )
@@ -1,7 +1,13 @@
 // Główny kontroler powłoki aplikacji SPA (Shell Controller)
 const App = {
+    // Widoki HTML pobrane jedną paczką przy starcie ({nazwa: html})
+    fragments: null,
+
     // Inicjalizacja stanu aplikacji i sprawdzanie sesji kryptograficznej
     async init() {
+        // Paczka wszystkich widoków - adres z wersją jest buforowany przez przeglądarkę
+        await this.loadFragments();
+
         // Weryfikacja zalogowania i sprawdzenie obecności kluczy w pamięci RAM
         if (window.sessionStorage.getItem('isLoggedIn') === 'true' && window.myPrivateKeyX) {
             // Załadowanie pulpitu nawigacyjnego dla zalogowanego użytkownika
@@ -22,17 +28,11 @@ const App = {
         }
 
         try {
-            const response = await App.apiFetch(`/get-fragment/${name}`);
-            if (!response) return; 
-            
-            if (!response.ok) {
-                // Wyodrębnienie komunikatu błędu z odpowiedzi
-                const errorText = await response.text();
-                throw new Error(errorText || `Błąd serwera: ${response.status}`);
-            }
+            const html = await App.getFragment(name);
+            if (html === null) return;
 
             // Wstawianie pobranego HTML do kontenera
-            shell.innerHTML = await response.text();
+            shell.innerHTML = html;
 
             // Inicjalizacja logiki modułu na podstawie nazwy
             if (name === 'login') this.initLoginLogic();
@@ -255,6 +255,39 @@ const App = {
         }
     },
 
+    // Wersja zestawu widoków z powłoki (main.html)
+    fragmentsVersion() {
+        const meta = document.querySelector('meta[name="fragments-version"]');
+        return meta ? meta.content : '';
+    },
+
+    // Pobranie paczki widoków; przy błędzie widoki ładowane są pojedynczo
+    async loadFragments() {
+        try {
+            const response = await fetch(`/get-fragments?v=${encodeURIComponent(this.fragmentsVersion())}`);
+            if (response.ok) this.fragments = await response.json();
+        } catch (e) {
+            console.warn("Nie udało się pobrać paczki widoków:", e);
+        }
+    },
+
+    // Zwraca HTML widoku z paczki lub z serwera; null przy utracie sesji
+    async getFragment(name) {
+        if (this.fragments && this.fragments[name] !== undefined) {
+            return this.fragments[name];
+        }
+
+        const response = await App.apiFetch(`/get-fragment/${name}?v=${encodeURIComponent(this.fragmentsVersion())}`);
+        if (!response) return null;
+
+        if (!response.ok) {
+            // Wyodrębnienie komunikatu błędu z odpowiedzi
+            const errorText = await response.text();
+            throw new Error(errorText || `Błąd serwera: ${response.status}`);
+        }
+        return await response.text();
+    },
+
     // Bezpieczny wrapper na fetch API.
     async apiFetch(url, options = {}) {
         // Flagę z options, żeby nie wysłać jej do fetch
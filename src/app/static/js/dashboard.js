@@ -6,14 +6,50 @@ const DashboardUI = {
         currentView: 'inbox'
     },
 
+    // Odstęp odpytywania skrzynki, gdy serwer nie udostępnia strumienia zdarzeń
+    POLL_INTERVAL_MS: 15000,
+
     // Inicjalizacja nasłuchiwania zdarzeń i ładowanie widoku domyślnego
     async init() {
         // Konfigurowanie obsługi zdarzeń dla przycisków nawigacji
         this.setupEventListeners();
+        // Subskrypcja powiadomień o nowych wiadomościach
+        this.openEventStream();
         // Wyświetlanie widoku skrzynki odbiorczej
         await this.switchSubView('inbox');
     },
 
+    // Synchronizacja skrzynki po zdarzeniu SSE zamiast cyklicznego odpytywania serwera.
+    // Serwer bez workera asynchronicznego odpowiada 204 - EventSource zamyka wtedy połączenie
+    // bez ponawiania (readyState CLOSED), a klient przechodzi na odpytywanie ?since=.
+    openEventStream() {
+        if (this.state.eventSource || this.state.pollTimer) return;
+        if (!window.EventSource) return this.startPolling();
+
+        const source = new EventSource('/api/messages/stream');
+        source.addEventListener('message', () => {
+            if (this.state.currentView === 'inbox') this.syncMessages('inbox');
+        });
+        // Zerwane połączenie EventSource wznawia sam (CONNECTING); CLOSED oznacza brak strumienia
+        source.addEventListener('error', () => {
+            if (source.readyState !== EventSource.CLOSED) return;
+            source.close();
+            this.state.eventSource = null;
+            this.startPolling();
+        });
+        this.state.eventSource = source;
+    },
+
+    // Cykliczna synchronizacja przyrostowa bieżącej skrzynki; karta w tle nie odpytuje serwera
+    startPolling() {
+        if (this.state.pollTimer) return;
+        this.state.pollTimer = setInterval(() => {
+            const view = this.state.currentView;
+            if (document.hidden || (view !== 'inbox' && view !== 'outbox')) return;
+            this.syncMessages(view);
+        }, this.POLL_INTERVAL_MS);
+    },
+
     // Podpinanie obsługi zdarzeń dla elementów nawigacji paska bocznego
     setupEventListeners() {
         // Pobieranie referencji do przycisków nawigacyjnych
@@ -54,18 +90,12 @@ const DashboardUI = {
         }
 
         try {
-            // Pobieranie fragmentu HTML dla wybranego widoku z serwera
-            const response = await App.apiFetch(`/get-fragment/${view}`);
-            if (!response) return;
+            // Fragment HTML wybranego widoku (z paczki pobranej przy starcie)
+            const html = await App.getFragment(view);
+            if (html === null) return;
 
-            if (!response.ok) {
-                // Obsługa błędu HTTP
-                const errorText = await response.text();
-                throw new Error(errorText || "Błąd pobierania widoku");
-            }
-            
             // Wstawianie pobranego HTML do kontenera
-            container.innerHTML = await response.text();
+            container.innerHTML = html;
             
             // Aktualizacja tytułu na podstawie wybranego widoku
             title.innerText = (view === 'send') ? "Nowa Wiadomość" : 
@@ -127,7 +157,8 @@ const DashboardUI = {
         }
     },
 
-    // Pobieranie i deszyfrowanie listy wiadomości
+    // Pobieranie i deszyfrowanie pierwszej strony listy wiadomości; kolejne strony
+    // doładowywane przy przewinięciu do końca listy (loadMoreMessages)
     async loadMessages(view) {
         // Pobieranie elementu listy wiadomości
         const list = document.getElementById('messagesList');
@@ -135,53 +166,27 @@ const DashboardUI = {
 
         // Resetowanie listy i pokazanie stanu ładowania
         list.innerHTML = '<p class="loading-text">Pobieranie i deszyfrowanie wiadomości...</p>';
-
-        // Wybór endpointu API na podstawie widoku
-        const apiPath = view === 'inbox' ? 'inbox' : 'outbox';
-        const endpoint = `/api/messages/${apiPath}`;
+        this.stopPaging();
+        this.state.pageView = view;
 
         try {
-            // Pobranie wiadomości z serwera
-            const response = await App.apiFetch(endpoint);
-            if (!response) return;
+            const page = await this.fetchMessagesPage(view, null);
+            if (!page || this.state.pageView !== view) return;
 
-            if (!response.ok) {
-                // Obsługa błędu HTTP z wyodrębnieniem komunikatu
-                let errorMsg = "Błąd pobierania";
-                try {
-                    const errData = await response.json();
-                    if (errData.error) errorMsg = errData.error;
-                } catch(e) {/* fallback */}
-                throw new Error(errorMsg);
-            }
-
-            // Parsowanie odpowiedzi JSON i wyczyszczenie listy
-            const messages = await response.json();
             list.innerHTML = "";
+            // Kursor dziennika zmian - kolejne odświeżenia pobierają tylko różnice
+            this.state.syncCursor = page.syncCursor;
+            this.state.syncView = view;
 
             // Sprawdzenie obecności wiadomości
-            if (messages.length === 0) {
+            if (page.messages.length === 0) {
                 list.innerHTML = "<p>Brak wiadomości.</p>";
                 return;
             }
 
-            // Przetwarzanie każdej wiadomości i jej deszyfrowanie
-            for (const msg of messages) {
-                // Wybór klucza publicznego na podstawie kierunku wiadomości
-                const pubKeyX = (view === 'inbox') ? msg.sender_pub_key : msg.target_pub_key;
-                const pubKeyEd = msg.sender_pub_key_ed25519;
-
-                try {
-                    // Deszyfranie danych wiadomości
-                    const data = await Messaging.decrypt(msg, pubKeyX, pubKeyEd);
-                    // Renderowanie karty wiadomości
-                    this.renderMessageCard(msg, data, list, view);
-                } catch (e) { 
-                    // Obsługa błędu deszyfracji i wyświetlenie komunikatu
-                    console.error("Decryption error for msg ID:", msg.id, e);
-                    this.renderCorruptedMessage(msg, list, view); 
-                }
-            }
+            await this.renderMessages(page.messages, list, view);
+            this.state.nextCursor = page.nextCursor;
+            if (page.nextCursor) this.startPaging(list, view);
         } catch (e) {
             // Logowanie i wyświetlenie błędu pobierania wiadomości
             console.error("LoadMessages Error:", e);
@@ -189,6 +194,186 @@ const DashboardUI = {
         }
     },
 
+    // Jedna strona skrzynki; kursor kolejnej strony w nagłówku X-Next-Cursor
+    async fetchMessagesPage(view, cursor) {
+        const apiPath = view === 'inbox' ? 'inbox' : 'outbox';
+        const endpoint = `/api/messages/${apiPath}`;
+        const pageUrl = cursor ? `${endpoint}?cursor=${encodeURIComponent(cursor)}` : endpoint;
+        const response = await App.apiFetch(pageUrl);
+        if (!response) return null;
+
+        if (!response.ok) {
+            // Obsługa błędu HTTP z wyodrębnieniem komunikatu
+            let errorMsg = "Błąd pobierania";
+            try {
+                const errData = await response.json();
+                if (errData.error) errorMsg = errData.error;
+            } catch(e) {/* fallback */}
+            throw new Error(errorMsg);
+        }
+
+        return {
+            messages: await response.json(),
+            nextCursor: response.headers.get('X-Next-Cursor'),
+            syncCursor: response.headers.get('X-Sync-Cursor')
+        };
+    },
+
+    // Deszyfrowanie i renderowanie wiadomości strony w podanym kontenerze
+    async renderMessages(messages, container, view) {
+        for (const msg of messages) {
+            // Wybór klucza publicznego na podstawie kierunku wiadomości
+            const pubKeyX = (view === 'inbox') ? msg.sender_pub_key : msg.target_pub_key;
+            const pubKeyEd = msg.sender_pub_key_ed25519;
+
+            try {
+                // Deszyfranie danych wiadomości
+                const data = await Messaging.decrypt(msg, pubKeyX, pubKeyEd);
+                // Renderowanie karty wiadomości
+                this.renderMessageCard(msg, data, container, view);
+            } catch (e) {
+                // Obsługa błędu deszyfracji i wyświetlenie komunikatu
+                console.error("Decryption error for msg ID:", msg.id, e);
+                this.renderCorruptedMessage(msg, container, view);
+            }
+        }
+    },
+
+    // Znacznik końca listy obserwowany przez IntersectionObserver - jego pojawienie się
+    // w widoku (z wyprzedzeniem) doładowuje kolejną stronę
+    startPaging(list, view) {
+        const sentinel = document.createElement('div');
+        sentinel.className = 'list-end';
+        list.appendChild(sentinel);
+        this.state.pageSentinel = sentinel;
+
+        if (!window.IntersectionObserver) {
+            // Bez IntersectionObserver - przycisk zamiast doładowania przy przewijaniu
+            const moreBtn = document.createElement('button');
+            moreBtn.textContent = "Pokaż starsze";
+            moreBtn.onclick = () => this.loadMoreMessages(view);
+            sentinel.appendChild(moreBtn);
+            return;
+        }
+        this.state.pageObserver = new IntersectionObserver((entries) => {
+            if (entries.some(entry => entry.isIntersecting)) this.loadMoreMessages(view);
+        }, { rootMargin: '400px' });
+        this.state.pageObserver.observe(sentinel);
+    },
+
+    stopPaging() {
+        if (this.state.pageObserver) this.state.pageObserver.disconnect();
+        if (this.state.pageSentinel) this.state.pageSentinel.remove();
+        this.state.pageObserver = null;
+        this.state.pageSentinel = null;
+        this.state.nextCursor = null;
+    },
+
+    // Doładowanie kolejnej strony przed znacznikiem końca listy
+    async loadMoreMessages(view) {
+        const sentinel = this.state.pageSentinel;
+        const cursor = this.state.nextCursor;
+        if (!sentinel || !cursor || this.state.loadingMore || this.state.pageView !== view) return;
+
+        this.state.loadingMore = true;
+        try {
+            const page = await this.fetchMessagesPage(view, cursor);
+            // Widok przełączony lub lista przeładowana w trakcie pobierania
+            if (!page || this.state.pageSentinel !== sentinel) return;
+
+            const fresh = document.createElement('div');
+            await this.renderMessages(page.messages, fresh, view);
+            if (this.state.pageSentinel !== sentinel) return;
+            sentinel.before(...fresh.children);
+
+            this.state.nextCursor = page.nextCursor;
+            if (!page.nextCursor) {
+                this.stopPaging();
+            } else if (this.state.pageObserver) {
+                // Ponowna obserwacja - znacznik wciąż widoczny (krótka strona) doładuje kolejną
+                this.state.pageObserver.unobserve(sentinel);
+                this.state.pageObserver.observe(sentinel);
+            }
+        } catch (e) {
+            // Kolejna próba przy następnym przewinięciu
+            console.error("LoadMore Error:", e);
+        } finally {
+            this.state.loadingMore = false;
+        }
+    },
+
+    // Odświeżenie przyrostowe (?since=): nowe wiadomości na górze listy, zmiana statusu
+    // i usunięcia bez ponownego pobierania i deszyfrowania całej skrzynki
+    async syncMessages(view) {
+        const list = document.getElementById('messagesList');
+        if (!list || this.state.syncing) return;
+        if (!this.state.syncCursor || this.state.syncView !== view) return this.loadMessages(view);
+
+        this.state.syncing = true;
+        try {
+            let hasMore = true;
+            while (hasMore) {
+                const endpoint = `/api/messages/${view}?since=${encodeURIComponent(this.state.syncCursor)}`;
+                const response = await App.apiFetch(endpoint);
+                if (!response) return;
+                if (!response.ok) throw new Error("Błąd synchronizacji");
+
+                const changes = await response.json();
+                // Kursor starszy niż dziennik zmian (retencja) - skrzynka pobierana od nowa
+                if (changes.reset) {
+                    await this.loadMessages(view);
+                    return;
+                }
+                // Komunikat pustej skrzynki ustępuje pierwszym wiadomościom
+                if (changes.added.length && list.querySelector('.message-card') === null) list.innerHTML = "";
+
+                // Nowe wiadomości renderowane poza listą i wstawiane przed dotychczasowe
+                const fresh = document.createElement('div');
+                for (const msg of changes.added) {
+                    const pubKeyX = (view === 'inbox') ? msg.sender_pub_key : msg.target_pub_key;
+                    try {
+                        const data = await Messaging.decrypt(msg, pubKeyX, msg.sender_pub_key_ed25519);
+                        this.renderMessageCard(msg, data, fresh, view);
+                    } catch (e) {
+                        console.error("Decryption error for msg ID:", msg.id, e);
+                        this.renderCorruptedMessage(msg, fresh, view);
+                    }
+                }
+                list.prepend(...Array.from(fresh.children).reverse());
+
+                for (const change of changes.updated) {
+                    const card = document.getElementById(`msg-${change.id}`);
+                    if (card) this.applyReadState(card, change.is_read);
+                }
+                for (const id of changes.deleted) {
+                    document.getElementById(`msg-${id}`)?.remove();
+                }
+
+                this.state.syncCursor = changes.cursor;
+                hasMore = changes.has_more;
+            }
+        } catch (e) {
+            // Niespójny stan listy - pełne przeładowanie
+            console.error("Sync Error:", e);
+            await this.loadMessages(view);
+        } finally {
+            this.state.syncing = false;
+        }
+    },
+
+    // Wygląd karty odpowiadający statusowi przeczytania zmienionemu w innym oknie
+    applyReadState(card, isRead) {
+        card.classList.toggle('read', isRead);
+        card.classList.toggle('unread-bg', !isRead);
+        const statusInd = card.querySelector('.status-indicator');
+        if (statusInd) statusInd.innerHTML = isRead ? "✔️" : "🔵 <small>Nowa</small>";
+        const readBtn = card.querySelector('.btn-read');
+        if (readBtn && !readBtn.disabled) {
+            readBtn.innerText = isRead ? "Mark Unread" : "Mark Read";
+            readBtn.title = isRead ? "Oznacz jako nieprzeczytane" : "Oznacz jako przeczytane";
+        }
+    },
+
     // Metoda do renderowania uszkodzonych wiadomości
     renderCorruptedMessage(msg, container, view) {
         const card = document.createElement('div');
@@ -107,16 +107,22 @@ const Messaging = {
             encrypted
         );
 
+        // Duże paczki (załączniki) wysyłane są porcjami z możliwością wznowienia
+        if (encrypted.byteLength > this.MAX_SINGLE_UPLOAD) {
+            return await this.uploadChunked(recipient.id, encrypted, iv, signature);
+        }
+
         // Wysłanie zaszyfrowanej i podpisanej wiadomości na serwer
+        // (surowy szyfrogram w ciele, metadane w nagłówkach - bez narzutu Base64)
         const sendResponse = await App.apiFetch('/api/messages/send', {
             method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({
-                receiver_id: recipient.id,
-                encrypted_payload: arrayBufferToBase64(encrypted),
-                iv: arrayBufferToBase64(iv),
-                signature: arrayBufferToBase64(signature)
-            })
+            headers: {
+                'Content-Type': 'application/octet-stream',
+                'X-Receiver-Id': String(recipient.id),
+                'X-IV': arrayBufferToBase64(iv),
+                'X-Signature': arrayBufferToBase64(signature)
+            },
+            body: encrypted
         });
         if (!sendResponse) return;
 
@@ -132,13 +138,74 @@ const Messaging = {
         return sendResponse;
     },
 
+    // Limit pojedynczego żądania wysyłki (odpowiada MAX_PAYLOAD_BYTES na serwerze)
+    MAX_SINGLE_UPLOAD: 750000,
+
+    // Wysyłka porcjowana: inicjalizacja, porcje z ponawianiem, finalizacja
+    async uploadChunked(recipientId, encrypted, iv, signature) {
+        const initResponse = await App.apiFetch('/api/uploads', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                receiver_id: recipientId,
+                total_size: encrypted.byteLength,
+                iv: arrayBufferToBase64(iv),
+                signature: arrayBufferToBase64(signature)
+            })
+        });
+        if (!initResponse) return;
+        if (!initResponse.ok) throw new Error("Nie udało się rozpocząć wysyłki załącznika.");
+
+        const { upload_id, chunk_size, chunk_count } = await initResponse.json();
+
+        for (let index = 0; index < chunk_count; index++) {
+            const chunk = encrypted.slice(index * chunk_size, (index + 1) * chunk_size);
+
+            // Ponowienie porcji po zerwanym połączeniu - serwer nadpisuje niekompletną próbę
+            let sent = false;
+            for (let attempt = 0; attempt < 3 && !sent; attempt++) {
+                try {
+                    const chunkResponse = await App.apiFetch(`/api/uploads/${upload_id}/chunks/${index}`, {
+                        method: 'PUT',
+                        headers: {'Content-Type': 'application/octet-stream'},
+                        body: chunk
+                    });
+                    if (!chunkResponse) return;
+                    sent = chunkResponse.ok;
+                } catch (e) {
+                    console.warn(`Ponawianie porcji ${index}:`, e);
+                }
+            }
+            if (!sent) throw new Error("Przerwano wysyłkę załącznika.");
+        }
+
+        const finalizeResponse = await App.apiFetch(`/api/uploads/${upload_id}/finalize`, { method: 'POST' });
+        if (!finalizeResponse) return;
+        if (!finalizeResponse.ok) throw new Error("Nie udało się zakończyć wysyłki załącznika.");
+        return finalizeResponse;
+    },
+
+    // Pobranie surowego szyfrogramu dużej wiadomości (/api/messages/<id>/payload)
+    async fetchPayload(url) {
+        const response = await App.apiFetch(url);
+        if (!response || !response.ok) {
+            throw new Error("Nie udało się pobrać treści wiadomości.");
+        }
+        return response.arrayBuffer();
+    },
+
     // Weryfikacja integralności i deszyfracja otrzymanej wiadomości
     async decrypt(msg, pubKeyXBase64, pubKeyEdBase64) {
         // Walidacja kompletności danych wiadomości
-        if (!msg || !msg.encrypted_payload || !msg.signature || !msg.iv || !pubKeyXBase64 || !pubKeyEdBase64) {
+        if (!msg || !(msg.encrypted_payload || msg.payload_url) || !msg.signature || !msg.iv || !pubKeyXBase64 || !pubKeyEdBase64) {
             throw new Error("Otrzymano niekompletną paczkę danych.");
         }
 
+        // Duże paczki nie są osadzane w odpowiedzi - szyfrogram pobierany osobno jako surowe bajty
+        const payload = msg.encrypted_payload
+            ? base64ToArrayBuffer(msg.encrypted_payload)
+            : await this.fetchPayload(msg.payload_url);
+
         // Odblokowanie kluczy prywatnych jeśli są zaszyfrowane
         await this.ensureKeys();
 
@@ -152,7 +219,7 @@ const Messaging = {
             { name: "Ed25519" }, 
             pubEd, 
             base64ToArrayBuffer(msg.signature), 
-            base64ToArrayBuffer(msg.encrypted_payload)
+            payload
         );
 
         if (!isSignatureValid) {
@@ -169,7 +236,7 @@ const Messaging = {
         const decBuffer = await window.crypto.subtle.decrypt(
             { name: "AES-GCM", iv: base64ToArrayBuffer(msg.iv) }, 
             sharedKey, 
-            base64ToArrayBuffer(msg.encrypted_payload)
+            payload
         );
 
         // Dekodowanie i parsowanie wyniku do formatu JSON
@@ -0,0 +1,107 @@
+import os
+import re
+import shutil
+import tempfile
+import time
+from flask import current_app
+
+# Identyfikator wysyłki to 32 znaki hex (secrets.token_hex(16))
+_UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+# Niezgodność rozmiaru porcji z zadeklarowanym podziałem pliku
+class ChunkSizeMismatch(ValueError):
+    pass
+
+
+# Katalog roboczy wysyłek porcjowanych: <root>/<upload_id>/<index>.part
+# Każda porcja zapisywana jest atomowo, więc ponowienie po zerwanym połączeniu
+# po prostu nadpisuje niekompletną próbę.
+class ChunkStaging:
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def upload_dir(self, upload_id):
+        if not isinstance(upload_id, str) or not _UPLOAD_ID_PATTERN.match(upload_id):
+            raise ValueError("Niepoprawny identyfikator wysyłki")
+        return os.path.join(self.root, upload_id)
+
+    def chunk_path(self, upload_id, index):
+        return os.path.join(self.upload_dir(upload_id), f"{int(index)}.part")
+
+    # Zapisuje porcję z iteratora bajtów; rozmiar musi być dokładnie równy expected_size
+    def write_chunk(self, upload_id, index, chunks, expected_size):
+        directory = self.upload_dir(upload_id)
+        os.makedirs(directory, exist_ok=True)
+
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > expected_size:
+                        raise ChunkSizeMismatch()
+                    tmp.write(chunk)
+            if size != expected_size:
+                raise ChunkSizeMismatch()
+            os.replace(tmp_path, self.chunk_path(upload_id, index))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    # Indeksy porcji zapisanych w całości (podstawa wznawiania)
+    def received(self, upload_id):
+        directory = self.upload_dir(upload_id)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(int(name[:-5]) for name in os.listdir(directory) if name.endswith('.part'))
+
+    # Odczytuje złożony plik porcja po porcji, w kawałkach o stałym rozmiarze
+    def iter_assembled(self, upload_id, chunk_count, read_size=65536):
+        for index in range(chunk_count):
+            with open(self.chunk_path(upload_id, index), 'rb') as part:
+                while True:
+                    data = part.read(read_size)
+                    if not data:
+                        break
+                    yield data
+
+    def discard(self, upload_id):
+        shutil.rmtree(self.upload_dir(upload_id), ignore_errors=True)
+
+    # Usuwa katalogi wysyłek nieaktywnych dłużej niż max_age sekund; zwraca ich liczbę
+    def purge_stale(self, max_age):
+        removed = 0
+        threshold = time.time() - max_age
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if _UPLOAD_ID_PATTERN.match(name) and os.path.getmtime(path) < threshold:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+
+
+# Rozmiar porcji i-tej przy podziale total_size na porcje chunk_size
+def expected_chunk_size(total_size, chunk_size, index):
+    chunk_count = chunk_count_for(total_size, chunk_size)
+    if index < chunk_count - 1:
+        return chunk_size
+    return total_size - chunk_size * (chunk_count - 1)
+
+def chunk_count_for(total_size, chunk_size):
+    return (total_size + chunk_size - 1) // chunk_size
+
+# Katalog roboczy skonfigurowany dla bieżącej aplikacji
+def get_chunk_staging() -> ChunkStaging:
+    return current_app.extensions['chunk_staging']
+
+# Składa kompletną wysyłkę w magazynie obiektów; zwraca (klucz, rozmiar)
+def assemble_upload(store, upload):
+    staging = get_chunk_staging()
+    return store.put_stream(
+        staging.iter_assembled(upload.id, upload.chunk_count), max_size=upload.total_size
+    )
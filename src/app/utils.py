@@ -1,6 +1,7 @@
 import base64
-import re
+import binascii
 import os
+from datetime import datetime
 from cryptography.fernet import Fernet
 
 _key = os.environ.get("TOTP_ENCRYPTION_KEY")
@@ -53,11 +54,61 @@ def arrayBufferToBase64(buffer):
     # Dekodowanie base64.b64encode do stringa utf-8, aby móc go wysłać w JSON 
     return base64.b64encode(buffer).decode('utf-8')
 
-# Weryfikacja czy ciąg jest poprawnym Base64 i mieści się w limitach długości
-def validate_base64(data, length_range=(10, 5000)):
+# Dekoduje ciąg Base64 mieszczący się w limitach długości; None, gdy ciąg jest niepoprawny
+# (także przy złym dopełnieniu "=", które przepuszcza samo wyrażenie regularne)
+def decode_base64(data, length_range=(10, 5000)):
     if not isinstance(data, str):
-        return False
+        return None
     if not (length_range[0] <= len(data) <= length_range[1]):
-        return False
-    pattern = re.compile(r'^[A-Za-z0-9+/]*={0,2}$')
-    return bool(pattern.match(data))
\ No newline at end of file
+        return None
+    try:
+        return base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+# Weryfikacja czy ciąg jest poprawnym Base64 i mieści się w limitach długości
+def validate_base64(data, length_range=(10, 5000)):
+    return decode_base64(data, length_range) is not None
+
+
+# Czyta strumień (np. ciało żądania) porcjami o stałym rozmiarze
+def iter_stream(stream, chunk_size=65536):
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+# --- PAGINACJA KURSOROWA ---
+
+# Domyślny i maksymalny rozmiar strony skrzynki
+PAGE_DEFAULT_LIMIT = 50
+PAGE_MAX_LIMIT = 200
+
+# Koduje pozycję (timestamp, id) ostatniego elementu strony do nieprzezroczystego kursora
+def encode_cursor(timestamp, msg_id):
+    raw = f"{timestamp.isoformat()}|{int(msg_id)}"
+    return base64.urlsafe_b64encode(raw.encode()).decode('ascii')
+
+# Dekoduje kursor do krotki (timestamp, id); None przy niepoprawnym formacie
+def decode_cursor(cursor):
+    if not isinstance(cursor, str) or not (1 <= len(cursor) <= 128):
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode()
+        ts_part, id_part = raw.split('|', 1)
+        return datetime.fromisoformat(ts_part), int(id_part)
+    except Exception:
+        return None
+
+# Parsuje parametr limit z zapytania; None przy wartości spoza zakresu
+def parse_page_limit(value):
+    if value is None:
+        return PAGE_DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return None
+    if not (1 <= limit <= PAGE_MAX_LIMIT):
+        return None
+    return limit
\ No newline at end of file
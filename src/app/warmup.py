@@ -0,0 +1,133 @@
+import gc
+import os
+import time
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
+from sqlalchemy.pool import NullPool
+from app import utils
+from app.models import db
+
+
+# --- POMIARY PROCESU ---
+
+# Czas od uruchomienia procesu (s) z /proc - obejmuje start interpretera i importy
+def process_age(pid='self'):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+# Pamięć procesu (bajty): RSS, PSS (strony współdzielone podzielone między procesy)
+# i USS (strony wyłącznie tego procesu). Po forku z preloadem PSS i USS są dużo niższe niż RSS.
+def memory_usage(pid='self'):
+    usage = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    usage[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    except OSError:
+        return {}
+    return {
+        "rss_bytes": usage.get('Rss', 0),
+        "pss_bytes": usage.get('Pss', 0),
+        "uss_bytes": usage.get('Private_Clean', 0) + usage.get('Private_Dirty', 0),
+    }
+
+
+# --- ROZGRZEWANIE ---
+
+# Etap wspólny, przed forkiem workerów (master uWSGI): wszystko, co powstaje tutaj,
+# workery dziedziczą jako strony współdzielone (copy-on-write). Hash referencyjny Argon2
+# (HashingPool.dummy_hash) i fragmenty HTML są już przygotowane przez create_app.
+def warm_up(app):
+    timings = {}
+
+    start = time.perf_counter()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    timings["templates"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    configure_mappers()
+    timings["orm_mappers"] = time.perf_counter() - start
+
+    # Pierwsze użycie Fernet ładuje wiązania OpenSSL
+    start = time.perf_counter()
+    if utils.cipher_suite:
+        utils.decrypt_secret(utils.encrypt_secret('warm-up'))
+    timings["fernet"] = time.perf_counter() - start
+
+    # Obiekty z rozgrzewania poza zasięgiem GC - przeglądanie ich w workerach (liczniki
+    # odwołań, nagłówki GC) kopiowałoby współdzielone strony pamięci
+    gc.collect()
+    gc.freeze()
+    return timings
+
+# Etap każdego workera, po forku: połączenia z bazą i pula procesów Argon2 są per proces
+def warm_worker(app):
+    timings = {}
+
+    # Połączenia otwarte przed forkiem należą do mastera - tylko porzucane, nie zamykane
+    start = time.perf_counter()
+    with app.app_context():
+        engine = db.engine
+        engine.dispose(close=False)
+        count = 0 if isinstance(engine.pool, NullPool) else app.config['DB_WARM_CONNECTIONS']
+        connections = []
+        try:
+            for _ in range(count):
+                connection = engine.connect()
+                connections.append(connection)
+                connection.execute(text("SELECT 1"))
+        except Exception as e:
+            app.logger.error(f"Błąd rozgrzewania puli połączeń: {str(e)}")
+        finally:
+            for connection in connections:
+                connection.close()
+    timings["db_connections"] = time.perf_counter() - start
+
+    # Start procesów puli Argon2 i jedna weryfikacja hasha referencyjnego
+    start = time.perf_counter()
+    try:
+        app.extensions['hashing_pool'].verify_dummy('warm-up')
+    except Exception as e:
+        app.logger.error(f"Błąd rozgrzewania puli Argon2: {str(e)}")
+    timings["argon2_pool"] = time.perf_counter() - start
+    return timings
+
+
+# Rozgrzewanie pod uWSGI. Preload (domyślnie, bez --lazy-apps): wspólny etap w masterze,
+# etap workera w hooku postfork. Z --lazy-apps aplikacja powstaje już w workerze - oba etapy
+# od razu. Poza uWSGI (CLI flask, init_db.py, testy) nic się nie dzieje.
+def init_warmup(app):
+    try:
+        import uwsgi
+    except ImportError:
+        return
+
+    startup = app.extensions['startup'] = {"preload": uwsgi.worker_id() == 0}
+    startup["warm_up"] = warm_up(app)
+    startup["app_ready_seconds"] = process_age()
+    print(f"Aplikacja gotowa po {startup['app_ready_seconds']:.2f} s od startu procesu "
+          f"(preload: {'tak' if startup['preload'] else 'nie'}).", flush=True)
+
+    def on_worker_start():
+        started = time.perf_counter()
+        startup["worker"] = warm_worker(app)
+        startup["worker_ready_seconds"] = time.perf_counter() - started
+        memory = memory_usage()
+        print(f"Worker {uwsgi.worker_id()} (pid {os.getpid()}) gotowy w {startup['worker_ready_seconds']:.2f} s, "
+              f"RSS {memory.get('rss_bytes', 0) // 1024} KiB, PSS {memory.get('pss_bytes', 0) // 1024} KiB, "
+              f"USS {memory.get('uss_bytes', 0) // 1024} KiB.", flush=True)
+
+    if startup["preload"]:
+        from uwsgidecorators import postfork
+        postfork(on_worker_start)
+    else:
+        on_worker_start()
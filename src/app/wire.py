@@ -0,0 +1,102 @@
+import base64
+import struct
+from flask import request, Response
+
+# Zwarty format binarny list wiadomości (RFC 8949) - surowe bajty zamiast Base64
+CBOR_MIMETYPE = 'application/cbor'
+JSON_MIMETYPE = 'application/json'
+
+
+# --- KODER CBOR ---
+
+def _head(out, major, value):
+    if value < 24:
+        out.append((major << 5) | value)
+    elif value < 0x100:
+        out.append((major << 5) | 24)
+        out.append(value)
+    elif value < 0x10000:
+        out.append((major << 5) | 25)
+        out += struct.pack('>H', value)
+    elif value < 0x100000000:
+        out.append((major << 5) | 26)
+        out += struct.pack('>I', value)
+    else:
+        out.append((major << 5) | 27)
+        out += struct.pack('>Q', value)
+
+def _encode(out, value):
+    if value is None:
+        out.append(0xf6)
+    elif value is True:
+        out.append(0xf5)
+    elif value is False:
+        out.append(0xf4)
+    elif isinstance(value, int):
+        if value >= 0:
+            _head(out, 0, value)
+        else:
+            _head(out, 1, -1 - value)
+    elif isinstance(value, float):
+        out.append(0xfb)
+        out += struct.pack('>d', value)
+    elif isinstance(value, str):
+        data = value.encode('utf-8')
+        _head(out, 3, len(data))
+        out += data
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        _head(out, 2, len(value))
+        out += value
+    elif isinstance(value, (list, tuple)):
+        _head(out, 4, len(value))
+        for item in value:
+            _encode(out, item)
+    elif isinstance(value, dict):
+        _head(out, 5, len(value))
+        for key, item in value.items():
+            _encode(out, key)
+            _encode(out, item)
+    else:
+        raise TypeError(f"Nieobsługiwany typ CBOR: {type(value).__name__}")
+
+# Serializacja struktur JSON-podobnych (dict, list, str, int, float, bool, None) oraz bytes
+def cbor_dumps(value):
+    out = bytearray()
+    _encode(out, value)
+    return bytes(out)
+
+
+# --- NEGOCJACJA ---
+
+# Format odpowiedzi z nagłówka Accept; JSON, o ile klient wprost nie preferuje CBOR
+def wire_format():
+    best = request.accept_mimetypes.best_match([JSON_MIMETYPE, CBOR_MIMETYPE], default=JSON_MIMETYPE)
+    return 'cbor' if best == CBOR_MIMETYPE else 'json'
+
+def cbor_response(value):
+    return Response(cbor_dumps(value), mimetype=CBOR_MIMETYPE)
+
+
+# --- TABLICA KLUCZY ---
+
+# Tablica kluczy publicznych jednej odpowiedzi: każdy różny klucz zapisany raz (surowe bajty),
+# wiersze odwołują się do niego indeksem
+class KeyTable:
+
+    def __init__(self):
+        self._index = {}
+        self.keys = []
+
+    def ref(self, key_base64):
+        if key_base64 is None:
+            return None
+        index = self._index.get(key_base64)
+        if index is None:
+            index = self._index[key_base64] = len(self.keys)
+            self.keys.append(base64.b64decode(key_base64))
+        return index
+
+
+# Pola Base64 wiersza jako surowe bajty
+def raw(value_base64):
+    return base64.b64decode(value_base64) if value_base64 is not None else None
@@ -0,0 +1,72 @@
+import base64
+import os
+import sys
+import pytest
+from flask import g
+
+BASE_DIR = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(BASE_DIR, 'src'))
+sys.path.insert(0, BASE_DIR)
+
+
+def b64(size):
+    return base64.b64encode(os.urandom(size)).decode()
+
+
+# Aplikacja na pliku SQLite w katalogu tymczasowym testu, z lokalnym magazynem paczek
+# i bez limitów żądań; schemat bazy nie jest zakładany (testy migracji)
+@pytest.fixture
+def bare_app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('BLOB_STORE_URI', str(tmp_path / 'blobs'))
+    monkeypatch.setenv('UPLOAD_STAGING_PATH', str(tmp_path / 'uploads'))
+    monkeypatch.setenv('HASH_POOL_WORKERS', '0')
+    from app import create_app, limiter
+
+    monkeypatch.setattr(limiter, 'enabled', False)
+    app = create_app()
+    app.config['TESTING'] = True
+
+    # Kontekst aplikacji trwa przez cały test (dostęp do bazy), a żądania klienta testowego
+    # go współdzielą - użytkownik zapamiętany w g przez Flask-Login nie może przejść
+    # do kolejnego żądania innego klienta
+    @app.before_request
+    def forget_login():
+        g.pop('_login_user', None)
+
+    with app.app_context():
+        yield app
+
+
+# Aplikacja z bieżącym schematem. Testy wymagające PostgreSQL definiują własną fixturę `app`.
+@pytest.fixture
+def app(bare_app):
+    from app.schema import ensure_schema
+
+    ensure_schema()
+    return bare_app
+
+
+@pytest.fixture
+def make_user(app):
+    from app.models import db, User
+
+    def make(name):
+        user = User(username=name, password_hash='x', pub_key_x25519=b64(32), pub_key_ed25519=b64(32),
+                    wrapped_priv_key_x25519=b64(48), wrapped_priv_key_ed25519=b64(48), kdf_salt=b64(16))
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+    return make
+
+
+# Klient testowy z sesją zalogowanego użytkownika
+@pytest.fixture
+def login(app):
+    def client_for(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+    return client_for
@@ -0,0 +1,145 @@
+import base64
+import hashlib
+import os
+import tempfile
+import pytest
+from app.blobstore import LocalBlobStore, get_blob_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalBlobStore(str(tmp_path / 'blobs'))
+
+
+def _leftovers(store):
+    return [name for _, _, names in os.walk(store.root) for name in names if name.startswith('.tmp-')]
+
+
+def test_put_many_deduplicates_and_keeps_order(store):
+    existing = store.put(b'a')
+    keys = store.put_many([b'b', b'a', b'b', b'c'])
+
+    assert keys == [hashlib.sha256(data).hexdigest() for data in (b'b', b'a', b'b', b'c')]
+    assert keys[1] == existing
+    assert [store.get(key) for key in keys] == [b'b', b'a', b'b', b'c']
+    assert _leftovers(store) == []
+
+
+# Synchronizacja po zapisie całej partii: żaden fsync nie przeplata się z zapisem obiektów
+def test_put_many_syncs_after_writing_all_objects(store, monkeypatch):
+    events = []
+    real_fsync, real_mkstemp = os.fsync, tempfile.mkstemp
+
+    def fsync(fd):
+        events.append('fsync')
+        real_fsync(fd)
+
+    def mkstemp(**kwargs):
+        events.append('write')
+        return real_mkstemp(**kwargs)
+
+    monkeypatch.setattr(os, 'fsync', fsync)
+    monkeypatch.setattr(tempfile, 'mkstemp', mkstemp)
+
+    store.put_many([os.urandom(16) for _ in range(5)])
+
+    assert events[:5] == ['write'] * 5
+    assert set(events[5:]) == {'fsync'}
+
+
+def test_send_batch_stores_every_payload(app, make_user, login):
+    from app.models import db, Message
+
+    sender, receiver = make_user('sender'), make_user('receiver')
+    payloads = [os.urandom(32) for _ in range(3)]
+    items = [{"receiver_id": receiver, "encrypted_payload": base64.b64encode(payload).decode(),
+              "iv": base64.b64encode(os.urandom(12)).decode(), "signature": base64.b64encode(os.urandom(64)).decode()}
+             for payload in payloads]
+
+    response = login(sender).post('/api/messages/send-batch', json={"messages": items})
+    assert response.status_code == 200
+    ids = [result['id'] for result in response.get_json()['results']]
+    stored = [get_blob_store().get(db.session.get(Message, msg_id).payload_ref) for msg_id in ids]
+    assert stored == payloads
+
+
+def _legacy_messages(sender, receiver, payloads):
+    from app.models import db, Message
+
+    messages = [Message(sender_id=sender, receiver_id=receiver, signature=base64.b64encode(os.urandom(64)).decode(),
+                        iv=base64.b64encode(os.urandom(12)).decode(), encrypted_payload=payload, payload_size=0)
+                for payload in payloads]
+    db.session.add_all(messages)
+    db.session.commit()
+    return [message.id for message in messages]
+
+
+# Wiersz z uszkodzonym Base64 zostaje w tabeli i nie blokuje migracji kolejnych wierszy
+def test_migrate_blobs_skips_malformed_legacy_rows(app, make_user):
+    from app.models import db, Message
+
+    sender, receiver = make_user('sender'), make_user('receiver')
+    good = base64.b64encode(b'legacy payload').decode()
+    broken_id, good_id = _legacy_messages(sender, receiver, ['abcde', good])
+
+    for _ in range(2):
+        result = app.test_cli_runner().invoke(args=['migrate-blobs', '--batch-size', '1'])
+        assert result.exit_code == 0, result.output
+        db.session.expire_all()
+
+    broken, migrated = db.session.get(Message, broken_id), db.session.get(Message, good_id)
+    assert broken.payload_ref is None and broken.encrypted_payload == 'abcde'
+    assert migrated.encrypted_payload is None
+    assert get_blob_store().get(migrated.payload_ref) == b'legacy payload'
+
+
+def test_cbor_inbox_tolerates_malformed_legacy_row(app, make_user, login):
+    sender, receiver = make_user('sender'), make_user('receiver')
+    _legacy_messages(sender, receiver, ['abcde', base64.b64encode(b'legacy payload').decode()])
+
+    response = login(receiver).get('/api/messages/inbox', headers={'Accept': 'application/cbor'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/cbor'
+    assert b'legacy payload' in response.data
+
+
+def _age(store, key, seconds):
+    path = store.local_path(key)
+    past = os.path.getmtime(path) - seconds
+    os.utime(path, (past, past))
+
+
+# Obiekt zwolniony w okresie karencji zostaje (może należeć do niezatwierdzonej wysyłki);
+# ponowny zapis odświeża go, a gc_blobs usuwa dopiero osierocone obiekty starsze niż karencja
+def test_release_respects_grace_period(app):
+    from app.blobstore import release_blobs
+
+    store = get_blob_store()
+    key = store.put(b'orphan')
+    assert release_blobs([key], grace=60) == 0
+    assert store.exists(key)
+
+    _age(store, key, 120)
+    store.put(b'orphan')
+    assert release_blobs([key], grace=60) == 0
+
+    _age(store, key, 120)
+    assert release_blobs([key], grace=60) == 1
+    assert not store.exists(key)
+
+
+def test_gc_removes_only_stale_orphans(app, make_user):
+    from app.models import db, Message
+    from app.blobstore import gc_blobs
+
+    sender, receiver = make_user('sender'), make_user('receiver')
+    store = get_blob_store()
+    fresh_orphan, old_orphan, kept = store.put(b'fresh'), store.put(b'old'), store.put(b'kept')
+    db.session.add(Message(sender_id=sender, receiver_id=receiver, signature='s', iv='i', payload_ref=kept, payload_size=4))
+    db.session.commit()
+    _age(store, old_orphan, 120)
+    _age(store, kept, 120)
+
+    assert gc_blobs(grace=60) == 1
+    assert store.exists(fresh_orphan) and store.exists(kept)
+    assert not store.exists(old_orphan)
@@ -0,0 +1,57 @@
+import pytest
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    from app import routes
+
+    monkeypatch.setattr(routes, 'BULK_LIMIT', 2)
+
+
+def _inbox(sender_id, receiver_id, count):
+    from app.models import db, Message
+
+    messages = [Message(sender_id=sender_id, receiver_id=receiver_id, signature='s', iv='i',
+                        encrypted_payload='cGF5bG9hZA==', payload_size=7) for _ in range(count)]
+    db.session.add_all(messages)
+    db.session.commit()
+    return [message.id for message in messages]
+
+
+# Filtr przetwarzany partiami po BULK_LIMIT; has_more dokładnie wskazuje pozostałe wiersze
+def test_mark_read_filter_reports_has_more(app, make_user, login, small_batches):
+    sender, receiver = make_user('sender'), make_user('receiver')
+    ids = _inbox(sender, receiver, 5)
+    client = login(receiver)
+
+    seen, pages = [], []
+    while True:
+        body = client.post('/api/messages/bulk/mark-read', json={"filter": {"is_read": False}}).get_json()
+        seen += body['ids']
+        pages.append((len(body['ids']), body['has_more']))
+        if not body['has_more']:
+            break
+    assert pages == [(2, True), (2, True), (1, False)]
+    assert sorted(seen) == ids
+    assert client.get('/api/messages/unread-count').get_json()['unread'] == 0
+
+
+# Pełna ostatnia partia bez pozostałych wierszy - has_more fałszywe, bez pustego żądania
+def test_bulk_delete_exact_batch_has_no_more(app, make_user, login, small_batches):
+    sender, receiver = make_user('sender'), make_user('receiver')
+    ids = _inbox(sender, receiver, 2)
+    other = _inbox(receiver, sender, 1)
+
+    body = login(receiver).post('/api/messages/bulk/delete', json={"filter": {"is_read": False}}).get_json()
+    assert (sorted(body['ids']), body['has_more']) == (ids, False)
+
+    # Lista ids - wiadomości innych użytkowników pomijane
+    body = login(make_user('stranger')).post('/api/messages/bulk/delete', json={"ids": other}).get_json()
+    assert body['ids'] == []
+
+
+def test_bulk_rejects_invalid_input(app, make_user, login):
+    client = login(make_user('receiver'))
+    assert client.post('/api/messages/bulk/mark-read', json={}).status_code == 400
+    assert client.post('/api/messages/bulk/mark-read', json={"ids": ["1"]}).status_code == 400
+    assert client.post('/api/messages/bulk/delete', json={"filter": {"older_than": "wczoraj"}}).status_code == 400
@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from app.database import init_pool_events, pool_stats, pool_status
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=QueuePool,
+                           pool_size=1, max_overflow=2, pool_timeout=0.2)
+    init_pool_events(engine)
+    yield engine
+    engine.dispose()
+
+
+# Oczekiwanie na zajętą pulę liczone jako czas oczekiwania, a jego koniec jako timeout
+def test_wait_time_and_timeouts(engine):
+    held = [engine.connect() for _ in range(3)]
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+    for connection in held:
+        connection.close()
+
+    stats = pool_stats(engine).snapshot()
+    assert stats['timeouts'] == 1
+    assert stats['wait_seconds_max'] >= 0.2
+    assert stats['checkouts'] == 3
+
+
+# Kolejne pobrania w trakcie jednego przepełnienia to jedno zdarzenie
+def test_overflow_counted_once_per_episode(engine):
+    def burst():
+        connections = [engine.connect() for _ in range(3)]
+        for connection in connections:
+            connection.close()
+
+    burst()
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    burst()
+
+    assert pool_stats(engine).snapshot()['overflow_events'] == 2
+    assert pool_status(engine)['overflow'] == 0
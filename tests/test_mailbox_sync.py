@@ -0,0 +1,105 @@
+import base64
+import os
+import sys
+import threading
+import pytest
+
+# Przeplot transakcji wymaga prawdziwych blokad wierszy - SQLite szereguje zapisujących
+DATABASE_URL = os.environ.get('TEST_DATABASE_URL', '')
+pytestmark = pytest.mark.skipif(
+    not DATABASE_URL.startswith('postgresql'), reason="TEST_DATABASE_URL (PostgreSQL) nie ustawiony"
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+# Czas oczekiwania na kroki przeplotu (s)
+STEP_TIMEOUT = 10
+
+
+def _b64(size):
+    return base64.b64encode(os.urandom(size)).decode()
+
+
+@pytest.fixture
+def app():
+    os.environ['DATABASE_URL'] = DATABASE_URL
+    os.environ['HASH_POOL_WORKERS'] = '0'
+    from app import create_app
+    from app.schema import ensure_schema, drop_schema
+
+    app = create_app()
+    with app.app_context():
+        drop_schema()
+        ensure_schema()
+    yield app
+    with app.app_context():
+        drop_schema()
+
+
+@pytest.fixture
+def conversation(app):
+    from app.models import db, User, Message
+
+    with app.app_context():
+        users = []
+        for name in ('sender', 'receiver'):
+            user = User(username=name, password_hash='x', pub_key_x25519=_b64(32), pub_key_ed25519=_b64(32),
+                        wrapped_priv_key_x25519=_b64(48), wrapped_priv_key_ed25519=_b64(48), kdf_salt=_b64(16))
+            db.session.add(user)
+            users.append(user)
+        db.session.flush()
+        messages = [Message(sender_id=users[0].id, receiver_id=users[1].id, signature='s', iv='i', payload_size=0)
+                    for _ in range(2)]
+        db.session.add_all(messages)
+        db.session.commit()
+        return users[0].id, users[1].id, [message.id for message in messages]
+
+
+# Dwie transakcje zmieniają tę samą skrzynkę; pierwsza rozpoczęta zatwierdza się później.
+# Czytelnik synchronizujący się w trakcie nie może przeskoczyć kursorem zmiany pierwszej.
+def test_interleaved_transactions_do_not_lose_changes(app, conversation):
+    from app.models import db
+    from app.mailbox import record_added, changes_since
+
+    sender_id, receiver_id, (first_id, second_id) = conversation
+    first_recorded = threading.Event()
+    release_first = threading.Event()
+    errors = []
+
+    def record(message_id, recorded=None, release=None):
+        try:
+            with app.app_context():
+                record_added(sender_id, receiver_id, message_id)
+                if recorded is not None:
+                    recorded.set()
+                    release.wait(STEP_TIMEOUT)
+                db.session.commit()
+        except Exception as e:
+            errors.append(e)
+
+    def read(since):
+        with app.app_context():
+            touched, cursor, _, _ = changes_since(receiver_id, 'inbox', since)
+            db.session.rollback()
+            return set(touched), cursor
+
+    first = threading.Thread(target=record, args=(first_id, first_recorded, release_first))
+    first.start()
+    assert first_recorded.wait(STEP_TIMEOUT)
+
+    second = threading.Thread(target=record, args=(second_id,))
+    second.start()
+    # Druga transakcja czeka na blokadę wersji skrzynki, zamiast zatwierdzić się przed pierwszą
+    second.join(1.0)
+    assert second.is_alive()
+
+    seen, cursor = read(0)
+    assert seen == set()
+
+    release_first.set()
+    first.join(STEP_TIMEOUT)
+    second.join(STEP_TIMEOUT)
+    assert not errors
+
+    later, _ = read(cursor)
+    assert seen | later == {first_id, second_id}
@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+from app.metrics import Metrics
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def _write_worker(directory, pid, start, requests):
+    snapshot = {"pid": pid, "start": start, "counters": [["requests_total", [], requests]],
+                "histograms": [], "gauges": [["up", [], 1]]}
+    filename = f"metrics-{pid}-{start}.json"
+    with open(os.path.join(directory, filename), 'w') as f:
+        json.dump(snapshot, f)
+    return filename
+
+
+def _metrics(directory):
+    metrics = Metrics(str(directory))
+    metrics.counter('requests_total', 'Żądania')
+    metrics.gauge('up', 'Worker działa', lambda: 1)
+    metrics.inc('requests_total', 1)
+    return metrics
+
+
+def _total(text):
+    return next(int(line.split()[1]) for line in text.splitlines() if line.startswith('requests_total'))
+
+
+# Zakończony worker i proces, który dostał pid zakończonego workera (inny czas startu):
+# ich liczniki trafiają do trwałej sumy, pliki są usuwane, a suma nie maleje
+def test_dead_workers_fold_into_totals(tmp_path):
+    metrics = _metrics(tmp_path)
+    dead = _write_worker(tmp_path, _dead_pid(), 1, 5)
+    reused = _write_worker(tmp_path, os.getppid(), 1, 7)
+
+    first = metrics.render()
+    assert _total(first) == 1 + 5 + 7
+    assert not (tmp_path / dead).exists() and not (tmp_path / reused).exists()
+    assert 'pid="' in first and first.count('up{') == 1
+
+    assert _total(metrics.render()) == 13
+
+
+# Plik już doliczony, ale nieusunięty (przerwanie po zapisie sumy), nie jest liczony drugi raz
+def test_folded_file_is_not_counted_twice(tmp_path):
+    metrics = _metrics(tmp_path)
+    pid = _dead_pid()
+    dead = _write_worker(tmp_path, pid, 1, 5)
+    metrics.render()
+
+    _write_worker(tmp_path, pid, 1, 5)
+    totals = json.loads((tmp_path / 'dead-workers.json').read_text())
+    totals['folded'] = [dead]
+    (tmp_path / 'dead-workers.json').write_text(json.dumps(totals))
+
+    assert _total(metrics.render()) == 6
+    assert not (tmp_path / dead).exists()
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+
+def _page_through(client, url, limit=4):
+    seen, cursor = [], None
+    # Ograniczenie liczby stron - kursor, który nie przesuwa się, kończy test zamiast pętli
+    for _ in range(50):
+        response = client.get(url, query_string={'limit': limit, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        seen.extend(entry['id'] for entry in response.get_json())
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            return seen
+    raise AssertionError("Kursor stronicowania nie przesuwa się")
+
+
+def _send(sender_id, receiver_id, count, **fields):
+    from app.models import db, Message
+    from app.blobstore import get_blob_store
+
+    ref = get_blob_store().put(b'payload')
+    messages = [Message(sender_id=sender_id, receiver_id=receiver_id, signature='s', iv='i',
+                        payload_ref=ref, payload_size=7, **fields) for _ in range(count)]
+    db.session.add_all(messages)
+    db.session.commit()
+    return [message.id for message in messages]
+
+
+def test_cursor_pages_cover_inbox_once(app, make_user, login):
+    sender, receiver = make_user('sender'), make_user('receiver')
+    ids = _send(sender, receiver, 10)
+    # Remisy czasu w obrębie sekundy i wiersze z kolejnych sekund
+    base = datetime.now() - timedelta(seconds=5)
+    for second in range(3):
+        ids += _send(sender, receiver, 3, timestamp=base + timedelta(seconds=second))
+
+    seen = _page_through(login(receiver), '/api/messages/inbox')
+    assert sorted(seen) == sorted(ids)
+    assert len(seen) == len(set(seen))
+
+
+# Wiersze zapisane domyślną wartością bazy (CURRENT_TIMESTAMP, bez mikrosekund) - po
+# migracji 4 kursor SQLite przesuwa się także w obrębie tej samej sekundy
+def test_cursor_pages_cover_server_default_rows(app, make_user, login):
+    from app.models import db
+    from app.blobstore import get_blob_store
+    from app.schema import MIGRATIONS
+
+    sender, receiver = make_user('sender'), make_user('receiver')
+    ref = get_blob_store().put(b'payload')
+    for second in range(3):
+        for _ in range(3):
+            db.session.execute(text(
+                "INSERT INTO message (sender_id, receiver_id, signature, iv, payload_ref, payload_size, is_read, \"timestamp\") "
+                "VALUES (:sender, :receiver, 's', 'i', :ref, 7, 0, datetime('now', :shift))"
+            ), {"sender": sender, "receiver": receiver, "ref": ref, "shift": f"-{second} seconds"})
+    db.session.commit()
+    with db.engine.begin() as connection:
+        MIGRATIONS[4](connection)
+    ids = db.session.execute(text("SELECT id FROM message")).scalars().all()
+
+    seen = _page_through(login(receiver), '/api/messages/inbox')
+    assert sorted(seen) == sorted(ids)
+    assert len(seen) == len(set(seen))
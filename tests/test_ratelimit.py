@@ -0,0 +1,64 @@
+from limits import parse
+from limits.strategies import FixedWindowRateLimiter
+from app.ratelimit import HybridRedisStorage
+from benchmarks.ratelimit import FakeRedis
+
+
+def _storage(server, overshoot=0.02):
+    return HybridRedisStorage('hybrid+redis://test', overshoot=overshoot, sync_interval=60, client=server)
+
+
+def _hits(limiter, item, count, client='10.0.0.1'):
+    return sum(limiter.hit(item, 'test', client) for _ in range(count))
+
+
+# Limit z przydziałem < 1 liczony w Redis przy każdym trafieniu - dokładnie
+def test_small_limit_is_exact():
+    server = FakeRedis(latency=0)
+    limiter = FixedWindowRateLimiter(_storage(server))
+    item = parse('5 per minute')
+
+    assert _hits(limiter, item, 8) == 5
+    assert server.round_trips >= 5
+
+
+# Duży limit: decyzje lokalne w obrębie przydziału, trafienia wysyłane zbiorczo
+def test_large_limit_batches_hits():
+    server = FakeRedis(latency=0)
+    storage = _storage(server)
+    limiter = FixedWindowRateLimiter(storage)
+    item = parse('1000 per minute')
+
+    assert _hits(limiter, item, 200) == 200
+    assert server.round_trips <= 200 / 10
+    assert storage.local_hits > 0
+
+    storage.flush()
+    key = f"LIMITS:{item.key_for('test', '10.0.0.1')}"
+    assert int(server.get(key)) == 200
+
+
+# Workery ze wspólnym Redis: przepuszczone ponad limit najwyżej po przydziale na worker
+def test_workers_share_window():
+    server = FakeRedis(latency=0)
+    storages = [_storage(server) for _ in range(4)]
+    limiters = [FixedWindowRateLimiter(storage) for storage in storages]
+    item = parse('500 per minute')
+    allowance = int(500 * 0.02)
+
+    admitted = sum(limiters[i % 4].hit(item, 'test', '10.0.0.1') for i in range(800))
+    assert 500 <= admitted <= 500 + 4 * allowance
+    for storage in storages:
+        storage.flush()
+    assert int(server.get(f"LIMITS:{item.key_for('test', '10.0.0.1')}")) == 800
+
+
+def test_reset_clears_local_and_shared_counters():
+    server = FakeRedis(latency=0)
+    storage = _storage(server)
+    limiter = FixedWindowRateLimiter(storage)
+    item = parse('5 per minute')
+
+    assert _hits(limiter, item, 6) == 5
+    storage.reset()
+    assert limiter.hit(item, 'test', '10.0.0.1')
@@ -0,0 +1,99 @@
+import base64
+import os
+import pytest
+from sqlalchemy import inspect, text
+
+# Schemat wyjściowy projektu (wersja 0, bez tabeli wersji) z dziennikiem zmian skrzynek
+# sprzed wersjonowania (id jako kursor)
+BASELINE_DDL = [
+    """CREATE TABLE user (
+        id INTEGER PRIMARY KEY, username VARCHAR(32) NOT NULL UNIQUE, password_hash VARCHAR(255) NOT NULL,
+        pub_key_x25519 TEXT NOT NULL, pub_key_ed25519 TEXT NOT NULL,
+        wrapped_priv_key_x25519 TEXT NOT NULL, wrapped_priv_key_ed25519 TEXT NOT NULL,
+        kdf_salt TEXT NOT NULL, totp_secret VARCHAR(32))""",
+    """CREATE TABLE message (
+        id INTEGER PRIMARY KEY, sender_id INTEGER NOT NULL REFERENCES user (id),
+        receiver_id INTEGER NOT NULL REFERENCES user (id), encrypted_payload TEXT NOT NULL,
+        signature TEXT NOT NULL, iv TEXT NOT NULL, "timestamp" DATETIME DEFAULT (CURRENT_TIMESTAMP), is_read BOOLEAN)""",
+    """CREATE TABLE mailbox_change (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, box VARCHAR(8) NOT NULL, kind VARCHAR(8) NOT NULL,
+        message_id INTEGER NOT NULL, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP))""",
+    "CREATE INDEX ix_mailbox_change_user_box_id ON mailbox_change (user_id, box, id)",
+]
+
+
+def _b64(size):
+    return base64.b64encode(os.urandom(size)).decode()
+
+
+def _create_baseline(connection):
+    for statement in BASELINE_DDL:
+        connection.execute(text(statement))
+    connection.execute(text(
+        "INSERT INTO user (id, username, password_hash, pub_key_x25519, pub_key_ed25519, "
+        "wrapped_priv_key_x25519, wrapped_priv_key_ed25519, kdf_salt) VALUES (1, 'alice', 'x', 'k', 'k', 'w', 'w', 's')"
+    ))
+    for size, timestamp in ((10, "2024-01-01 10:00:00"), (11, None), (12, "2024-01-01 10:00:01")):
+        connection.execute(text(
+            'INSERT INTO message (sender_id, receiver_id, encrypted_payload, signature, iv, "timestamp", is_read) '
+            "VALUES (1, 1, :payload, 's', 'i', :timestamp, 0)"
+        ), {"payload": _b64(size), "timestamp": timestamp})
+    for change_id in (1, 2, 3):
+        connection.execute(text(
+            "INSERT INTO mailbox_change (id, user_id, box, kind, message_id) VALUES (:id, 1, 'inbox', 'added', :id)"
+        ), {"id": change_id})
+
+
+def test_fresh_database_is_created_and_stamped(bare_app):
+    from app.schema import ensure_schema, SCHEMA_VERSION
+
+    report = ensure_schema()
+    assert (report['action'], report['version']) == ('created', SCHEMA_VERSION)
+    assert ensure_schema()['action'] == 'current'
+
+
+def test_baseline_database_migrates_to_current_version(bare_app):
+    from app.models import db
+    from app.schema import ensure_schema, current_version, SCHEMA_VERSION
+
+    with db.engine.begin() as connection:
+        _create_baseline(connection)
+
+    report = ensure_schema()
+    assert (report['action'], report['from_version'], report['version']) == ('migrated', 0, SCHEMA_VERSION)
+
+    with db.engine.connect() as connection:
+        assert current_version(connection) == SCHEMA_VERSION
+        columns = {column['name']: column for column in inspect(connection).get_columns('message')}
+        indexes = {index['name'] for index in inspect(connection).get_indexes('message')}
+        rows = connection.execute(text(
+            'SELECT payload_ref, payload_size, length(encrypted_payload), "timestamp" FROM message ORDER BY id'
+        )).all()
+        changes = connection.execute(text("SELECT id, version FROM mailbox_change ORDER BY id")).all()
+        versions = connection.execute(text("SELECT user_id, box, version FROM mailbox_version")).all()
+
+    # 1: paczki w magazynie obiektów - rozmiar wyliczony z długości Base64
+    assert columns['encrypted_payload']['nullable']
+    assert [(ref, size) for ref, size, _, _ in rows] == [(None, 10), (None, 11), (None, 12)]
+    # 2: wersje skrzynek równe dotychczasowym id dziennika
+    assert changes == [(1, 1), (2, 2), (3, 3)]
+    assert versions == [(1, 'inbox', 3)]
+    # 3: timestamp NOT NULL, 4: format z mikrosekundami (zgodny z kursorem)
+    assert not columns['timestamp']['nullable']
+    assert all(len(timestamp) == 26 for _, _, _, timestamp in rows)
+    assert rows[0][3] == '2024-01-01 10:00:00.000000'
+    assert {'ix_message_receiver_ts_id', 'ix_message_sender_ts_id', 'ix_message_timestamp'} <= indexes
+
+    assert ensure_schema()['action'] == 'current'
+
+
+def test_newer_schema_is_refused(bare_app):
+    from app.models import db
+    from app.schema import ensure_schema, schema_version, SchemaVersionError, SCHEMA_VERSION
+
+    ensure_schema()
+    with db.engine.begin() as connection:
+        connection.execute(schema_version.update().values(version=SCHEMA_VERSION + 1))
+
+    with pytest.raises(SchemaVersionError):
+        ensure_schema()
@@ -0,0 +1,87 @@
+import base64
+import os
+import pytest
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    from app import routes
+
+    monkeypatch.setattr(routes, 'UPLOAD_CHUNK_SIZE', 8)
+
+
+def _init(client, receiver_id, total_size):
+    return client.post('/api/uploads', json={
+        "receiver_id": receiver_id, "total_size": total_size,
+        "iv": base64.b64encode(os.urandom(12)).decode(), "signature": base64.b64encode(os.urandom(64)).decode(),
+    })
+
+
+def test_chunked_upload_resumes_and_finalizes(app, make_user, login, small_chunks):
+    from app.models import db, Message, PendingUpload
+    from app.blobstore import get_blob_store
+
+    sender, receiver = make_user('sender'), make_user('receiver')
+    client = login(sender)
+    payload = os.urandom(20)
+
+    response = _init(client, receiver, len(payload))
+    assert response.status_code == 201
+    upload = response.get_json()
+    assert (upload['chunk_size'], upload['chunk_count']) == (8, 3)
+    url = f"/api/uploads/{upload['upload_id']}"
+
+    assert client.put(f"{url}/chunks/0", data=payload[:8]).status_code == 200
+    assert client.put(f"{url}/chunks/2", data=payload[16:]).status_code == 200
+    # Porcja o złym rozmiarze odrzucona, brakująca porcja blokuje finalizację
+    assert client.put(f"{url}/chunks/1", data=payload[8:12]).status_code == 400
+    response = client.post(f"{url}/finalize")
+    assert response.status_code == 409
+    assert response.get_json()['missing'] == [1]
+
+    # Wznowienie: stan wysyłki wskazuje brakujące porcje
+    assert client.get(url).get_json()['received'] == [0, 2]
+    assert client.put(f"{url}/chunks/1", data=payload[8:16]).status_code == 200
+
+    response = client.post(f"{url}/finalize")
+    assert response.status_code == 201
+    message = db.session.get(Message, response.get_json()['id'])
+    assert message.payload_size == len(payload)
+    assert get_blob_store().get(message.payload_ref) == payload
+    assert db.session.get(PendingUpload, upload['upload_id']) is None
+    assert not os.path.exists(os.path.join(app.config['UPLOAD_STAGING_PATH'], upload['upload_id']))
+
+
+def test_upload_is_private_to_sender(app, make_user, login, small_chunks):
+    sender, receiver = make_user('sender'), make_user('receiver')
+    upload = _init(login(sender), receiver, 4).get_json()
+
+    other = login(receiver)
+    assert other.get(f"/api/uploads/{upload['upload_id']}").status_code == 404
+    assert other.put(f"/api/uploads/{upload['upload_id']}/chunks/0", data=b'abcd').status_code == 404
+
+
+# Druga finalizacja tej samej wysyłki (przegrana w wyścigu) dostaje 409, a nie błąd serwera
+def test_concurrent_finalize_conflicts(app, make_user, login, small_chunks, monkeypatch):
+    from sqlalchemy import text
+    from app.models import db, Message
+    from app.uploads import ChunkStaging
+
+    sender, receiver = make_user('sender'), make_user('receiver')
+    client = login(sender)
+    upload = _init(client, receiver, 4).get_json()
+    url = f"/api/uploads/{upload['upload_id']}"
+    assert client.put(f"{url}/chunks/0", data=b'abcd').status_code == 200
+
+    # Równoległa finalizacja zatwierdza się między odczytem wysyłki a jej zajęciem
+    received = ChunkStaging.received
+
+    def finalized_meanwhile(self, upload_id):
+        with db.engine.begin() as connection:
+            connection.execute(text("DELETE FROM pending_upload WHERE id = :id"), {"id": upload_id})
+        return received(self, upload_id)
+
+    monkeypatch.setattr(ChunkStaging, 'received', finalized_meanwhile)
+    response = client.post(f"{url}/finalize")
+    assert response.status_code == 409
+    assert Message.query.count() == 0
@@ -0,0 +1,38 @@
+import pytest
+from app import wire
+
+
+# Wektory z RFC 8949, dodatek A
+@pytest.mark.parametrize('value, encoded', [
+    (0, '00'), (23, '17'), (24, '1818'), (100, '1864'), (1000, '1903e8'),
+    (1000000, '1a000f4240'), (1000000000000, '1b000000e8d4a51000'),
+    (-1, '20'), (-1000, '3903e7'),
+    (1.1, 'fb3ff199999999999a'),
+    (False, 'f4'), (True, 'f5'), (None, 'f6'),
+    (b'', '40'), (b'\x01\x02\x03\x04', '4401020304'),
+    ('', '60'), ('IETF', '6449455446'), ('ü', '62c3bc'),
+    ([], '80'), ([1, [2, 3], [4, 5]], '8301820203820405'),
+    ({}, 'a0'), ({"a": 1, "b": [2, 3]}, 'a26161016162820203'),
+])
+def test_cbor_rfc_vectors(value, encoded):
+    assert wire.cbor_dumps(value).hex() == encoded
+
+
+def test_cbor_rejects_unsupported_types():
+    with pytest.raises(TypeError):
+        wire.cbor_dumps({1, 2})
+
+
+def test_key_table_stores_each_key_once():
+    keys = wire.KeyTable()
+    assert [keys.ref('AAEC'), keys.ref('AwQF'), keys.ref('AAEC'), keys.ref(None)] == [0, 1, 0, None]
+    assert keys.keys == [b'\x00\x01\x02', b'\x03\x04\x05']
+
+
+def test_cbor_only_when_preferred(app):
+    with app.test_request_context(headers={'Accept': 'application/cbor'}):
+        assert wire.wire_format() == 'cbor'
+    with app.test_request_context(headers={'Accept': 'application/json, application/cbor;q=0.5'}):
+        assert wire.wire_format() == 'json'
+    with app.test_request_context():
+        assert wire.wire_format() == 'json'
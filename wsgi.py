@@ -1,7 +1,11 @@
 # wsgi.py
 from app import create_app
+from app.warmup import init_warmup
 
 app = create_app()
 
+# Pod uWSGI: rozgrzanie przed forkiem (master) i w każdym workerze przed przyjęciem ruchu
+init_warmup(app)
+
 if __name__ == "__main__":
-    app.run()
\ No newline at end of file
+    app.run()